@@ -0,0 +1,395 @@
+'''
+Synthetic mod library generator and loader benchmark for ComMod.
+
+Generates distribution dir with a configurable number of mods, options, install settings,
+translations, screenshots, changelogs and archived (zip and 7z) mods, all following
+the manifest schema checked by Mod.validate_install_config, and then times the loading pipeline.
+Results are written as JSON so different revisions can be compared:
+
+    python benchmark.py -mods 200 -options 4 -settings 2 -output results_new.json
+    python benchmark.py -compare results_old.json results_new.json
+'''
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import py7zr
+
+from game.data import OWN_VERSION
+from game.environment import GameCopy, InstallationContext
+from game.mod import Mod
+from helpers.file_ops import dump_yaml, extract_from_to, read_yaml
+
+# smallest valid png (1x1, transparent), enough for image path checks
+PNG_STUB = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+CHANGELOG_STUB = (
+    '<a name="top"></a>\n'
+    "# Changelog\n\n"
+    "{entries}\n"
+    '<a href="#top">Наверх</a>\n')
+
+
+class BenchmarkConfig:
+    '''Shape of synthetic library and benchmark run parameters'''
+    def __init__(self, options: argparse.Namespace) -> None:
+        self.mods = options.mods
+        self.options = options.options
+        self.settings = options.settings
+        self.translations = options.translations
+        self.screenshots = options.screenshots
+        self.data_files = options.data_files
+        self.file_size = options.file_size
+        self.archives = options.archives
+        self.repeat = options.repeat
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def get_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_manifest(index: int, config: BenchmarkConfig, language: str = "eng",
+                  translations: list[str] | None = None) -> dict:
+    '''Manifest of synthetic mod, every third mod is vanilla (without prerequisites),
+       others require ComRem and some of the previous mods'''
+    name = f"synthetic_mod_{index:05d}"
+    manifest = {
+        "name": name,
+        "display_name": f"Synthetic mod {index} [{language}]",
+        "version": f"1.{index % 10}.{index % 3}",
+        "build": f"{index:04d}",
+        "description": f"Synthetic mod #{index} generated for benchmarking. " * 4,
+        "authors": "Bench Author, Other Author",
+        "language": language,
+        "installment": "exmachina",
+        "patcher_version_requirement": [f">={OWN_VERSION}"],
+        "release_date": "01.01.2024",
+        "tags": ["GAMEPLAY", "VISUAL"],
+        "logo": "logo.png",
+        "install_banner": "banner.png",
+        "change_log": "changelog.md",
+        "other_info": "other_info.md",
+        "link": "https://example.com",
+        "screenshots": [{"img": f"screenshots/screen_{screen}.png",
+                         "text": f"Screenshot {screen}",
+                         "compare": f"screenshots/screen_{screen}_compare.png" if screen % 2 else ""}
+                        for screen in range(config.screenshots)],
+    }
+    if index % 3 == 0:
+        manifest["prerequisites"] = []
+    else:
+        manifest["prerequisites"] = [{"name": "community_remaster",
+                                      "versions": [">=1.14"]}]
+        if index > 1:
+            manifest["prerequisites"].append({"name": f"synthetic_mod_{index - 1:05d}",
+                                              "versions": [">=1.0", "<2.0"],
+                                              "optional_content": ["option_0"]})
+        manifest["incompatible"] = [{"name": f"synthetic_mod_{index + 1:05d}",
+                                     "versions": ["<=1.0.0"]}]
+        manifest["patcher_options"] = {"gravity": -19.62, "skins_in_shop": 16}
+    if translations:
+        manifest["translations"] = translations
+
+    optional_content = []
+    for option_index in range(config.options):
+        option = {"name": f"option_{option_index}",
+                  "display_name": f"Option {option_index}",
+                  "description": f"Optional content #{option_index}"}
+        if config.settings > 1 and option_index % 2:
+            option["install_settings"] = [{"name": f"setting_{setting}",
+                                           "description": f"Install setting #{setting}"}
+                                          for setting in range(config.settings)]
+            option["default_option"] = "setting_0"
+        optional_content.append(option)
+    if optional_content:
+        manifest["optional_content"] = optional_content
+    return manifest
+
+
+def write_data_dir(data_path: Path, config: BenchmarkConfig, seed: int) -> None:
+    game_dirs = ["gamedata/models", "gamedata/textures", "gamedata/cfg"]
+    for file_index in range(config.data_files):
+        file_dir = data_path / game_dirs[file_index % len(game_dirs)]
+        file_dir.mkdir(parents=True, exist_ok=True)
+        content = (f"{seed}:{file_index}".encode() * (config.file_size // 8 + 1))[:config.file_size]
+        (file_dir / f"file_{file_index}.bin").write_bytes(content)
+
+
+def generate_mod(mod_root: Path, index: int, config: BenchmarkConfig) -> None:
+    langs = ["eng", "ru", "ua", "de", "pl"][:config.translations + 1]
+    main_lang, translations = langs[0], langs[1:]
+
+    mod_root.mkdir(parents=True, exist_ok=True)
+    dump_yaml(make_manifest(index, config, main_lang, translations), mod_root / "manifest.yaml",
+              sort_keys=False)
+    for lang in translations:
+        dump_yaml(make_manifest(index, config, lang), mod_root / f"manifest_{lang}.yaml",
+                  sort_keys=False)
+
+    entries = "\n".join(f"* Fixed <b>issue</b> #{entry} &amp; improved [link](https://example.com)"
+                        for entry in range(50))
+    (mod_root / "changelog.md").write_text(CHANGELOG_STUB.format(entries=entries), encoding="utf-8")
+    (mod_root / "other_info.md").write_text(CHANGELOG_STUB.format(entries=entries[:500]),
+                                            encoding="utf-8")
+    (mod_root / "logo.png").write_bytes(PNG_STUB)
+    (mod_root / "banner.png").write_bytes(PNG_STUB)
+    (mod_root / "screenshots").mkdir(exist_ok=True)
+    for screen in range(config.screenshots):
+        (mod_root / "screenshots" / f"screen_{screen}.png").write_bytes(PNG_STUB)
+        if screen % 2:
+            (mod_root / "screenshots" / f"screen_{screen}_compare.png").write_bytes(PNG_STUB)
+
+    write_data_dir(mod_root / "data", config, index)
+    for option_index in range(config.options):
+        option_root = mod_root / f"option_{option_index}"
+        if config.settings > 1 and option_index % 2:
+            for setting in range(config.settings):
+                write_data_dir(option_root / f"setting_{setting}" / "data", config, index)
+        else:
+            write_data_dir(option_root / "data", config, index)
+
+
+def pack_zip(source_dir: Path, archive_path: Path) -> None:
+    '''Zip with explicit dir entries, as produced by most archivers'''
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for root, dirs, files in os.walk(source_dir):
+            root_path = Path(root)
+            arc_root = root_path.relative_to(source_dir.parent).as_posix()
+            archive.writestr(f"{arc_root}/", b"")
+            for file in files:
+                archive.write(root_path / file, f"{arc_root}/{file}")
+
+
+def pack_7z(source_dir: Path, archive_path: Path) -> None:
+    with py7zr.SevenZipFile(archive_path, "w") as archive:
+        archive.writeall(source_dir, source_dir.name)
+
+
+def generate_library(root: Path, config: BenchmarkConfig) -> tuple[Path, list[Path]]:
+    '''Creates distribution dir with "mods" folder, returns its path and list of archives'''
+    distro = root / "distro"
+    mods_dir = distro / "mods"
+    mods_dir.mkdir(parents=True, exist_ok=True)
+    for index in range(config.mods):
+        # some of mods are nested as they usually are after extraction of archives
+        if index % 4 == 0:
+            mod_root = mods_dir / f"synthetic_{index:05d}" / f"synthetic_mod_{index:05d}"
+        else:
+            mod_root = mods_dir / f"synthetic_mod_{index:05d}"
+        generate_mod(mod_root, index, config)
+
+    archives = []
+    archives_dir = root / "archives"
+    archives_dir.mkdir(exist_ok=True)
+    for index in range(config.archives):
+        source = root / "archive_sources" / f"archived_mod_{index:05d}"
+        generate_mod(source, config.mods + index, config)
+        if index % 2:
+            archive_path = archives_dir / f"archived_mod_{index:05d}.7z"
+            pack_7z(source, archive_path)
+        else:
+            archive_path = archives_dir / f"archived_mod_{index:05d}.zip"
+            pack_zip(source, archive_path)
+        archives.append(archive_path)
+    shutil.rmtree(root / "archive_sources", ignore_errors=True)
+    return distro, archives
+
+
+def timed(func, repeat: int) -> dict:
+    '''Runs sync or async callable multiple times, returns timings in seconds'''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "max": max(timings),
+            "runs": repeat}
+
+
+def new_context(distro: Path) -> InstallationContext:
+    context = InstallationContext(str(distro), can_skip_adding_distro=True)
+    context.logger = logging.getLogger('dem')
+    return context
+
+
+def run_benchmarks(root: Path, config: BenchmarkConfig) -> dict:
+    results = {}
+    distro, archives = generate_library(root, config)
+
+    def load_mods():
+        return new_context(distro).load_mods_async()
+    results["load_mods_async"] = timed(load_mods, config.repeat)
+
+    # manifests are read once, object construction is measured separately
+    context = new_context(distro)
+    asyncio.run(context.load_mods_async())
+    manifests = list(context.validated_mod_configs.items())
+    results["validated_manifests"] = len(manifests)
+
+    def init_mods():
+        for manifest_path, manifest in manifests:
+            Mod(manifest, Path(manifest_path).parent)
+    results["mod_init"] = timed(init_mods, config.repeat)
+
+    mods = [Mod(manifest, Path(manifest_path).parent) for manifest_path, manifest in manifests]
+
+    def load_translations():
+        for mod in mods:
+            mod.load_translations()
+    results["load_translations"] = timed(load_translations, config.repeat)
+
+    def load_translations_full():
+        for mod in mods:
+            mod.translations_loaded.clear()
+            mod.load_translations()
+            for lang in mod.languages:
+                mod.get_translation(lang)
+    results["load_translations_full"] = timed(load_translations_full, config.repeat)
+
+    def load_translations_gui():
+        for mod in mods:
+            mod.translations_loaded.clear()
+            mod.load_translations(load_gui_info=True)
+            for lang in mod.languages:
+                mod.get_translation(lang).load_gui_info()
+    results["load_translations_gui"] = timed(load_translations_gui, config.repeat)
+
+    try:
+        from gui.app_widgets import App
+    except ImportError as ex:
+        results["load_distro_async"] = {"skipped": f"GUI is not available: {ex}"}
+    else:
+        def load_distro():
+            context = new_context(distro)
+            app = App(context, GameCopy())
+            app.logger = context.logger
+            return app.load_distro_async()
+        results["load_distro_async"] = timed(load_distro, config.repeat)
+
+    zip_archives = [path for path in archives if path.suffix == ".zip"]
+    sevenzip_archives = [path for path in archives if path.suffix == ".7z"]
+
+    async def read_manifests(archive_paths, method_name):
+        context = new_context(distro)
+        method = getattr(context, method_name)
+        for archive_path in archive_paths:
+            await method(str(archive_path), ignore_cache=True)
+
+    if zip_archives:
+        results["get_zip_manifest_async"] = timed(
+            lambda: read_manifests(zip_archives, "get_zip_manifest_async"), config.repeat)
+    if sevenzip_archives:
+        results["get_7z_manifest_async"] = timed(
+            lambda: read_manifests(sevenzip_archives, "get_7z_manifest_async"), config.repeat)
+
+    async def extract_all():
+        target = root / "extracted"
+        shutil.rmtree(target, ignore_errors=True)
+        for archive_path in archives:
+            await extract_from_to(str(archive_path), str(target / archive_path.stem))
+    if archives:
+        results["extract_from_to"] = timed(extract_all, config.repeat)
+
+    return results
+
+
+def compare_results(old_path: str, new_path: str) -> None:
+    old = read_yaml(old_path)
+    new = read_yaml(new_path)
+    print(f'{"benchmark":<28}{old["revision"]:>12}{new["revision"]:>12}{"change":>10}')
+    for name, new_timing in new["results"].items():
+        old_timing = old["results"].get(name)
+        if not isinstance(new_timing, dict) or not isinstance(old_timing, dict):
+            continue
+        if "median" not in new_timing or "median" not in old_timing:
+            continue
+        change = (new_timing["median"] / old_timing["median"] - 1) * 100 if old_timing["median"] else 0
+        print(f'{name:<28}{old_timing["median"]:>11.3f}s{new_timing["median"]:>11.3f}s{change:>+9.1f}%')
+
+
+def _init_input_parser():
+    parser = argparse.ArgumentParser(description='ComMod synthetic library benchmark')
+    parser.add_argument('-mods', help='number of mods in library', type=int, default=100)
+    parser.add_argument('-options', help='number of optional content entries per mod', type=int, default=3)
+    parser.add_argument('-settings', help='install settings per complex option', type=int, default=2)
+    parser.add_argument('-translations', help='translations per mod', type=int, default=1)
+    parser.add_argument('-screenshots', help='screenshots per mod', type=int, default=4)
+    parser.add_argument('-data_files', help='files per data dir', type=int, default=6)
+    parser.add_argument('-file_size', help='size of each data file in bytes', type=int, default=4096)
+    parser.add_argument('-archives', help='number of archived mods (zip and 7z)', type=int, default=4)
+    parser.add_argument('-repeat', help='runs per benchmark', type=int, default=3)
+    parser.add_argument('-workdir', help='where to generate library, temp dir by default', required=False)
+    parser.add_argument('-keep', help='keep generated library', action="store_true", default=False)
+    parser.add_argument('-output', help='path to JSON results', required=False)
+    parser.add_argument('-compare', help='compare two JSON results', nargs=2, required=False)
+    return parser
+
+
+def main(options: argparse.Namespace) -> int:
+    if options.compare:
+        compare_results(*options.compare)
+        return 0
+
+    config = BenchmarkConfig(options)
+    root = Path(options.workdir or tempfile.mkdtemp(prefix="commod_bench_"))
+    root.mkdir(parents=True, exist_ok=True)
+
+    # logging to file as in regular GUI run, as it's a considerable part of the load time
+    logger = logging.getLogger('dem')
+    logger.propagate = False
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.FileHandler(root / "benchmark.log", encoding="utf-8"))
+
+    try:
+        results = run_benchmarks(root, config)
+    finally:
+        logging.getLogger('dem').handlers.clear()
+        if not options.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {"revision": get_revision(),
+              "commod_version": OWN_VERSION,
+              "date": datetime.now().isoformat(timespec="seconds"),
+              "python": sys.version.split()[0],
+              "platform": platform.platform(),
+              "config": config.as_dict(),
+              "results": results}
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as fh:
+            fh.write(report_json)
+    print(report_json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(_init_input_parser().parse_args()))
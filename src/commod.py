@@ -6,7 +6,7 @@ import ctypes
 #from ctypes import windll
 from helpers.get_system_fonts import get_fonts
 from helpers.get_system_fonts import getmember
-from console import commod_console
+from console import commod_console, headless
 from gui import commod_flet
 
 
@@ -18,6 +18,10 @@ def main_console(options: argparse.Namespace) -> None:
     commod_console.main(options)
 
 
+def main_headless(options: argparse.Namespace) -> int:
+    return headless.main(options)
+
+
 def _init_input_parser():
     parser = argparse.ArgumentParser(description='DEM Community Mod Manager')
     parser.add_argument('-target_dir', help='path to game directory', required=False)
@@ -33,6 +37,20 @@ def _init_input_parser():
                                      action="store_true", default=False)
     installation_option.add_argument('-comremaster', help='base ComRemaster, no console interaction required',
                                      action="store_true", default=False)
+    parser.add_argument('-profile', help='path to YAML install profile, installs it without any interaction',
+                        required=False)
+    parser.add_argument('-result', help='path to JSON file for headless run result, stdout by default',
+                        required=False)
+    parser.add_argument('-capture_snapshot', help='save game state as a named snapshot after the profile',
+                        required=False)
+    parser.add_argument('-restore_snapshot', help='restore game from a named snapshot before the profile',
+                        required=False)
+    parser.add_argument('-list_snapshots', help='list snapshots of game copy in headless run result',
+                        action="store_true", default=False, required=False)
+    parser.add_argument('-uninstall', help='remove installed mod, restoring the files from install ledger',
+                        required=False)
+    parser.add_argument('-dedup_library', help='store extracted mods once by content, using hardlinks',
+                        action="store_true", default=False, required=False)
 
     return parser
 
@@ -42,7 +60,10 @@ if __name__ == '__main__':
     if "Windows" in platform.system():
         windll = getmember(ctypes,"windll")
         windll.shcore.SetProcessDpiAwareness(2)
-    if options.console:
+    if (options.profile or options.capture_snapshot or options.restore_snapshot or options.list_snapshots
+            or options.dedup_library or options.uninstall):
+        sys.exit(main_headless(options))
+    elif options.console:
         sys.exit(main_console(options))
     else:
         sys.exit(main_gui())
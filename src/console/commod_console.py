@@ -8,7 +8,11 @@ import console.console_ui as console_ui
 from console.color import bcolors, fconsole
 from game import data
 from game.environment import GameCopy, InstallationContext
+from game.batch import BatchInstaller
+from game.compatibility import Verdict
+from game.ledger import InstallLedger
 from game.mod import Mod
+from game.resolver import DependencyResolver
 from helpers import file_ops
 from helpers.errors import (CorruptedRemasterFiles, DistributionNotFound,
                             DXRenderDllNotFound, ExeIsRunning, ExeNotFound,
@@ -247,10 +251,13 @@ def main(options: argparse.Namespace) -> None:
         if version_choice == "patch":
             logger.info("- Starting installation of ComPatch -")
             logger.info(session.content_in_processing)
+            ledger = InstallLedger(game)
+            ledger.begin(plan_base_install(version_choice, game, context))
             console.copy_patch_files(context.distribution_dir, game.game_root_path)
             patch_description = [tr(line) for line in install_base(version_choice, game, context)]
             patch_description.append("")  # separator
             file_ops.rename_effects_bps(game.game_root_path)
+            ledger.commit()
             console.final_screen_print(patch_description)
             # session.installed_content_description.append("")  # separator
 
@@ -270,6 +277,9 @@ def main(options: argparse.Namespace) -> None:
             exe_options = remaster_mod.patcher_options
 
             console.switch_header("remaster")
+            ledger = InstallLedger(game)
+            ledger.begin(plan_base_install(version_choice, game, context,
+                                           remaster_mod, installed_remaster_settings))
             console.copy_patch_files(context.distribution_dir, game.game_root_path)
             logger.info("***")
             logger.info(f"Starting {remaster_mod.name} {remaster_mod.version} installation"
@@ -303,6 +313,7 @@ def main(options: argparse.Namespace) -> None:
                 logger.error("Status of mod installation is not ok")
                 print(fconsole(f"\n{tr('installation_error')}: Community Remaster!", bcolors.RED))
             else:
+                ledger.commit()
                 session.installed_content_description.extend(
                     remaster_mod.get_install_description(installed_remaster_settings))
                 console.print_lines(session.installed_content_description)
@@ -346,6 +357,18 @@ def main(options: argparse.Namespace) -> None:
         console.simple_end("failed_and_cleaned", err_msg=er)
 
 
+def plan_base_install(version_choice: str, game: GameCopy, context: InstallationContext,
+                      remaster_mod: Mod | None = None,
+                      remaster_settings: dict | None = None) -> file_ops.CopyPlan:
+    '''Files of base install for the install ledger: patch and libs, ComRemaster files over them'''
+    plan = file_ops.CopyPlan()
+    plan.add([os.path.join(context.distribution_dir, "patch")], game.data_path, "community_patch")
+    plan.add([os.path.join(context.distribution_dir, "libs")], game.game_root_path, "community_patch")
+    if version_choice == "remaster":
+        remaster_mod.plan_install(game.data_path, remaster_settings, plan)
+    return plan
+
+
 def install_base(version_choice: str, game: GameCopy, context: InstallationContext,
                  exe_options: dict = {}) -> list[str]:
     if version_choice == "remaster":
@@ -367,20 +390,79 @@ def install_base(version_choice: str, game: GameCopy, context: InstallationConte
     return changes_description
 
 
+def install_batch(console: console_ui.ConsoleUX, game: GameCopy, context: InstallationContext,
+                  requested: list[tuple[Mod, dict]]) -> None:
+    '''Installs all the configured mods in one pass, manifest is written once'''
+    logger = logging.getLogger('dem')
+    session = context.current_session
+    installer = BatchInstaller(game, context.commod_version)
+    plan = installer.resolve(requested)
+    copy_plan = installer.plan_copy(plan)
+
+    logger.info("***")
+    if console.auto_clear:
+        os.system('cls')
+    print(console.header)
+    install_estimate, _ = Mod.describe_install_plan(copy_plan)
+    print(fconsole(install_estimate, bcolors.GRAY) + "\n")
+    print(fconsole(tr("copying_base_files_please_wait"), bcolors.RED) + "\n")
+    try:
+        result = installer.install(plan, console=True, copy_plan=copy_plan)
+    except KeyboardInterrupt:
+        console.switch_header("mod_manager")
+        console.simple_end("installation_aborted_by_user")
+        sys.exit()
+
+    if not result:
+        logger.error(f"mod errors: {result.errors}")
+        session.mod_installation_errors.append(f"\n{tr('installation_error')}: "
+                                               f"{', '.join(mod.display_name for mod, _ in requested)}")
+        session.mod_installation_errors.extend(result.errors)
+
+    installed_descriptions = []
+    for mod, install_settings in plan.steps:
+        if mod not in result.installed:
+            continue
+        installed_mod_description = mod.get_install_description(install_settings)
+        mod_info = console.format_mod_info(mod)
+
+        description_ends_with_new_line = False
+        if installed_mod_description:
+            if isinstance(installed_mod_description[-1], str):
+                description_ends_with_new_line = installed_mod_description[-1][-1:] == "\n"
+        if not description_ends_with_new_line:
+            mod_info = "\n" + mod_info
+
+        installed_mod_description.append(mod_info)
+        installed_descriptions.extend(installed_mod_description)
+        logger.info(f"Mod {mod.name} has been installed")
+
+    if installed_descriptions:
+        session.installed_content_description.extend(installed_descriptions)
+        description = (console.format_lines(installed_descriptions)
+                       + fconsole(tr("installation_finished"), bcolors.OKGREEN) + "\n")
+        console.prompt_for(accept_enter=True, description=description)
+
+
 def mod_manager_console(console: console_ui.ConsoleUX, game: GameCopy, context: InstallationContext) -> None:
     logger = logging.getLogger('dem')
     session = context.current_session
 
     logger.info("Starting mod manager")
-    for mod_manifest in context.validated_mod_configs:
-        mod_config = context.validated_mod_configs[mod_manifest]
-        mod = Mod(mod_config, Path(mod_manifest).parent)
-
+    mods = [Mod(mod_config, Path(mod_manifest).parent)
+            for mod_manifest, mod_config in context.validated_mod_configs.items()]
+    # prerequisites are offered first, so a chain of new mods can be installed in one session
+    resolver = DependencyResolver(game.installed_content, game.installed_descriptions)
+    # all the configured mods are installed together at the end, mods queued earlier
+    # count as installed for the requirements of the later ones
+    requested = []
+    pending_content = dict(game.installed_content)
+    for mod in resolver.install_order(mods):
         compatible_with_commod, commod_compat_error = mod.compatible_with_mod_manager(context.commod_version)
 
-        prevalidated, prevalidation_errors = mod.check_requirements(game.installed_content,
+        prevalidated, prevalidation_errors = mod.check_requirements(pending_content,
                                                                     game.installed_descriptions)
-        compatible, incompatible_errors = mod.check_incompatibles(game.installed_content,
+        compatible, incompatible_errors = mod.check_incompatibles(pending_content,
                                                                   game.installed_descriptions)
         if not prevalidated or not compatible or not compatible_with_commod:
             errors_info = console.format_mod_title(mod.display_name, mod.version, incompatible=True)
@@ -389,83 +471,34 @@ def mod_manager_console(console: console_ui.ConsoleUX, game: GameCopy, context:
             errors_to_notify = []
             if commod_compat_error:
                 errors_to_notify.append(commod_compat_error)
-            if prevalidation_errors:
-                errors_to_notify.extend(prevalidation_errors)
-            if incompatible_errors:
-                errors_to_notify.extend(incompatible_errors)
+            errors_to_notify.extend(Verdict.render_all(prevalidation_errors))
+            errors_to_notify.extend(Verdict.render_all(incompatible_errors))
 
             console.notify_on_mod_with_errors(mod, errors_to_notify)
             continue
 
+        if not mod.validate_files():
+            errors_info = console.format_mod_title(mod.display_name, mod.version, incompatible=True)
+            console.switch_header("mod_install_custom", additional_string=errors_info)
+            console.notify_on_mod_with_errors(mod, [tr("not_validated_mod_manifest")])
+            continue
+
         mod_install_settings = console.configure_mod_install(mod, game=game)
         if not mod_install_settings:
             continue
 
         if (mod_install_settings.get("base") == "yes"
            or (mod_install_settings.get("base") == "no" and len(mod_install_settings) > 1)):
-            logger.info("***")
-            if console.auto_clear:
-                os.system('cls')
-            logger.info(f"Starting mod {mod.name} {mod.version} installation "
+            logger.info(f"Mod {mod.name} {mod.version} is queued for installation "
                         f"with config {mod_install_settings}")
-
-            try:
-                print(console.header)
-                status_ok, mod_error_msgs = mod.install(game.data_path,
-                                                        mod_install_settings,
-                                                        game.installed_content,
-                                                        game.installed_descriptions,
-                                                        console=True)
-            except KeyboardInterrupt:
-                console.switch_header("mod_manager")
-                console.simple_end("installation_aborted_by_user")
-                sys.exit()
-
-            if not status_ok:
-                session.mod_installation_errors.append(f"\n{tr('installation_error')}: "
-                                                       f"{mod.display_name}")
-            else:
-                session.content_in_processing[mod.name] = mod_install_settings.copy()
-                session.content_in_processing[mod.name]["version"] = mod.version
-                session.content_in_processing[mod.name]["build"] = mod.build
-                session.content_in_processing[mod.name]["language"] = mod.language
-                session.content_in_processing[mod.name]["installment"] = mod.installment
-                session.content_in_processing[mod.name]["display_name"] = mod.display_name
-                if mod.patcher_options is not None:
-                    file_ops.patch_configurables(game.target_exe, mod.patcher_options)
-                    if mod.patcher_options.get('gravity') is not None:
-                        file_ops.correct_damage_coeffs(game.game_root_path,
-                                                       mod.patcher_options.get('gravity'))
-            if mod_error_msgs:
-                session.mod_installation_errors.extend(mod_error_msgs)
-                logger.error(f"mod errors: {mod_error_msgs}")
-                console.notify_on_mod_with_errors(mod, mod_error_msgs)
-            else:
-                installed_mod_description = mod.get_install_description(mod_install_settings)
-                mod_info = console.format_mod_info(mod)
-
-                description_ends_with_new_line = False
-                if installed_mod_description:
-                    if isinstance(installed_mod_description[-1], str):
-                        description_ends_with_new_line = installed_mod_description[-1][-1:] == "\n"
-                if not description_ends_with_new_line:
-                    mod_info = "\n" + mod_info
-
-                installed_mod_description.append(mod_info)
-                session.installed_content_description.extend(installed_mod_description)
-
-                description = (console.format_lines(installed_mod_description)
-                               + fconsole(tr("installation_finished"),
-                                          bcolors.OKGREEN) + "\n")
-                console.finilize_manifest(game, session)
-                logger.info(f"Mod {mod.name} has been installed")
-                console.prompt_for(accept_enter=True,
-                                   description=description)
+            requested.append((mod, mod_install_settings))
+            pending_content[mod.name] = DependencyResolver.get_entry(mod, mod_install_settings)
         else:
             logger.info(f"Skipping installation of mod '{mod.name} - install manifest: "
                         f"{str(mod_install_settings)}")
 
-    console.finilize_manifest(game, session)
+    if requested:
+        install_batch(console, game, context, requested)
 
     console.final_screen_mod_manager_print(session.installed_content_description,
                                            session.mod_installation_errors,
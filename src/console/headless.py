@@ -0,0 +1,525 @@
+'''
+Headless mode, installs the content described by YAML install profile without any interaction.
+Result is written as JSON and the process exits with one of the ExitCode values, so game copies
+can be provisioned from scripts. Game copy can be restored from a snapshot before the profile is installed
+and captured to a snapshot after it, snapshot options also work without profile.
+Mods library can be converted to the deduplicated store layout, with or without profile.
+Mod can be uninstalled before the profile is installed, files recorded in install ledger are restored.
+Interrupted install of the same mods is resumed, files copied before the interruption are not copied again.
+
+Install profile example:
+
+    game_path: D:/Games/Ex Machina
+    game_paths:                       # instead of game_path, same content is deployed to every copy
+      - D:/Games/Ex Machina 1
+      - E:/Games/Ex Machina 2
+    distribution_dir: D:/ComMod       # optional, same as -distribution_dir
+    base: remaster                    # remaster | patch | none
+    base_options:                     # ComRemaster optional content, defaults are used for the rest
+      new_ui: yes
+      cinematics: skip
+    exe_options:                      # configurable exe fixes
+      gravity: -9.8
+      skins_in_shop: 16
+    mods:                             # installed together in one pass in dependency order
+      - name: improved_storyline
+        version: "1.14"               # optional, checked against the mod in the library
+        language: eng                 # optional, mod translation to install
+        options:
+          music: skip
+'''
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+from enum import IntEnum
+from pathlib import Path
+from typing import Any
+
+from game.batch import BatchInstaller
+from game.deploy import MultiTargetDeployer
+from game.environment import GameCopy, InstallationContext
+from game.ledger import InstallLedger
+from game.mod import Mod
+from game.snapshots import SnapshotStore
+from helpers import file_ops
+from helpers.errors import (CorruptedRemasterFiles, DistributionNotFound,
+                            DXRenderDllNotFound, ExeIsRunning, ExeNotFound,
+                            ExeNotSupported, FileLoggingSetupError,
+                            HasManifestButUnpatched, InvalidExistingManifest,
+                            InvalidGameDirectory, InvalidInstallProfile,
+                            LayerNotInLedger, ModsDirMissing, NoModsFound,
+                            PatchedButDoesntHaveManifest, SnapshotNotFound,
+                            WrongGameDirectoryPath)
+
+from .commod_console import install_base, plan_base_install
+
+logger = logging.getLogger('dem')
+
+
+class ExitCode(IntEnum):
+    OK = 0
+    UNHANDLED_ERROR = 1
+    INVALID_PROFILE = 2
+    ENVIRONMENT_ERROR = 3
+    GAME_COPY_ERROR = 4
+    BASE_INSTALL_FAILED = 5
+    MODS_REJECTED = 6
+    MODS_INSTALL_FAILED = 7
+    TARGETS_FAILED = 8
+    SNAPSHOT_FAILED = 9
+    UNINSTALL_FAILED = 10
+
+
+class HeadlessRunFailed(Exception):
+    def __init__(self, exit_code: ExitCode, message: str) -> None:
+        self.exit_code = exit_code
+        self.message = message
+        super().__init__(self.message)
+
+
+class InstallProfile:
+    '''Validated content of install profile'''
+    BASE_CHOICES = ("remaster", "patch", "none")
+    EXE_OPTIONS = ("gravity", "skins_in_shop", "blast_damage_friendly_fire", "game_font")
+
+    def __init__(self, profile_path: str, profile: Any) -> None:
+        self.path = profile_path
+        if not isinstance(profile, dict):
+            raise InvalidInstallProfile(profile_path, "Install profile should be a mapping")
+
+        self.game_path = profile.get("game_path")
+        self.game_paths = profile.get("game_paths") or ([self.game_path] if self.game_path else [])
+        self.distribution_dir = profile.get("distribution_dir")
+        self.base = str(profile.get("base", "none")).lower()
+        self.base_options = profile.get("base_options") or {}
+        self.exe_options = profile.get("exe_options") or {}
+        self.mods = profile.get("mods") or []
+
+        if self.base not in InstallProfile.BASE_CHOICES:
+            raise InvalidInstallProfile(profile_path,
+                                        f"'base' should be one of {InstallProfile.BASE_CHOICES}")
+        if not isinstance(self.base_options, dict):
+            raise InvalidInstallProfile(profile_path, "'base_options' should be a mapping")
+        if not isinstance(self.exe_options, dict):
+            raise InvalidInstallProfile(profile_path, "'exe_options' should be a mapping")
+        unknown_exe_options = set(self.exe_options) - set(InstallProfile.EXE_OPTIONS)
+        if unknown_exe_options:
+            raise InvalidInstallProfile(profile_path, f"Unknown exe options {sorted(unknown_exe_options)}")
+        if self.exe_options and self.base == "none":
+            raise InvalidInstallProfile(profile_path, "'exe_options' are applied only with base install")
+        if (not isinstance(self.game_paths, list)
+                or not all(isinstance(path, str) for path in self.game_paths)):
+            raise InvalidInstallProfile(profile_path, "'game_paths' should be a list of paths")
+        if not isinstance(self.mods, list):
+            raise InvalidInstallProfile(profile_path, "'mods' should be a list")
+        for entry in self.mods:
+            if not isinstance(entry, dict) or not entry.get("name"):
+                raise InvalidInstallProfile(profile_path, f"Mod entry should have a name: {entry}")
+            if not isinstance(entry.get("options") or {}, dict):
+                raise InvalidInstallProfile(profile_path, f"'options' of {entry['name']} should be a mapping")
+
+    @staticmethod
+    def load(profile_path: str) -> InstallProfile:
+        try:
+            profile = file_ops.read_yaml(profile_path)
+        except Exception as ex:
+            raise InvalidInstallProfile(profile_path, f"Couldn't read install profile ({ex})")
+        return InstallProfile(profile_path, profile)
+
+    @staticmethod
+    def normalize_choice(value: Any) -> str:
+        # 'yes' and 'no' are parsed by yaml as booleans
+        if isinstance(value, bool):
+            return "yes" if value else "skip"
+        choice = str(value).strip()
+        return "skip" if choice.lower() == "no" else choice
+
+    def get_install_settings(self, mod: Mod, selections: dict) -> dict:
+        '''Install settings of the mod with options selected in profile, defaults are used for the rest'''
+        install_settings = mod.get_full_install_settings()
+        options = mod.options_dict if mod.optional_content else {}
+        unknown = set(selections) - set(options)
+        if unknown:
+            raise InvalidInstallProfile(self.path, f"Unknown options {sorted(unknown)} for mod {mod.name}")
+
+        for name, option in options.items():
+            if name in selections:
+                choice = InstallProfile.normalize_choice(selections[name])
+                if option.install_settings is not None:
+                    allowed = [setting["name"] for setting in option.install_settings]
+                else:
+                    allowed = ["yes"]
+                if not option.forced_option:
+                    allowed.append("skip")
+                if choice not in allowed:
+                    raise InvalidInstallProfile(self.path, f"Option {name} of mod {mod.name} "
+                                                           f"should be one of {allowed}, got '{choice}'")
+                install_settings[name] = choice
+            elif option.install_settings is not None and option.default_option is None:
+                raise InvalidInstallProfile(self.path,
+                                            f"Option {name} of mod {mod.name} requires a selection")
+        return install_settings
+
+
+class HeadlessRunner:
+    '''Runs install profile end-to-end, every stage adds its outcome to the JSON result'''
+    def __init__(self, options: argparse.Namespace) -> None:
+        self.options = options
+        self.context = None
+        self.game = None
+        self.result = {"profile": options.profile,
+                       "status": "failed",
+                       "exit_code": int(ExitCode.UNHANDLED_ERROR),
+                       "game_path": None,
+                       "exe_version": None,
+                       "base": None,
+                       "mods": {"requested": [], "installed": [], "conflicts": []},
+                       "installed_content": {},
+                       "errors": []}
+
+    def run(self) -> ExitCode:
+        try:
+            if self.options.profile:
+                profile = InstallProfile.load(self.options.profile)
+            else:
+                profile = InstallProfile(None, {})
+            self.prepare_context(profile)
+            if self.options.dedup_library:
+                self.dedup_library()
+            if self.options.profile or self.uses_snapshots or self.options.uninstall:
+                self.install_profile(profile)
+            exit_code = ExitCode.OK
+        except InvalidInstallProfile as er:
+            self.result["errors"].append(str(er))
+            exit_code = ExitCode.INVALID_PROFILE
+        except HeadlessRunFailed as er:
+            self.result["errors"].append(er.message)
+            exit_code = er.exit_code
+        except Exception as er:
+            logger.exception(f"Encountered unhandled error: {er}")
+            self.result["errors"].append(f"{er!r}")
+            exit_code = ExitCode.UNHANDLED_ERROR
+
+        if self.game is not None:
+            self.result["exe_version"] = self.game.exe_version
+            self.result["installed_content"] = self.game.installed_content
+        self.result["exit_code"] = int(exit_code)
+        self.result["status"] = "ok" if exit_code == ExitCode.OK else "failed"
+        logger.info(f"Headless run finished with exit code {int(exit_code)} ({exit_code.name})")
+        self.write_result()
+        return exit_code
+
+    def install_profile(self, profile: InstallProfile) -> None:
+        if len(profile.game_paths) > 1 and not self.options.target_dir:
+            if self.uses_snapshots or self.options.uninstall:
+                raise InvalidInstallProfile(profile.path,
+                                            "Snapshots and uninstall are supported for a single game copy")
+            self.deploy(profile)
+        else:
+            self.prepare_game(profile)
+            self.restore_snapshot()
+            self.uninstall()
+            self.install_base(profile)
+            self.install_mods(profile)
+            self.capture_snapshot()
+
+    @property
+    def uses_snapshots(self) -> bool:
+        return bool(self.options.restore_snapshot or self.options.capture_snapshot
+                    or self.options.list_snapshots)
+
+    def dedup_library(self) -> None:
+        '''Enables deduplicated store for the mods library, mods extracted later are stored the same way'''
+        store = self.context.distribution_store
+        try:
+            report = store.convert(os.path.join(self.context.distribution_dir, "mods"))
+            report["freed_bytes"] = store.collect_garbage()
+        except OSError as er:
+            raise HeadlessRunFailed(ExitCode.ENVIRONMENT_ERROR, f"Couldn't deduplicate mods library: {er}")
+        self.result["library_store"] = report
+
+    def restore_snapshot(self) -> None:
+        if not self.options.restore_snapshot:
+            return
+        try:
+            restored = SnapshotStore(self.game).restore(self.options.restore_snapshot)
+        except (SnapshotNotFound, OSError) as er:
+            raise HeadlessRunFailed(ExitCode.SNAPSHOT_FAILED, str(er))
+        self.result["snapshot_restored"] = restored.report()
+        # exe and manifest come from the snapshot
+        self.game = self.open_game(self.game.game_root_path)
+
+    def capture_snapshot(self) -> None:
+        store = SnapshotStore(self.game)
+        if self.options.capture_snapshot:
+            try:
+                store.capture(self.options.capture_snapshot)
+            except (ValueError, OSError) as er:
+                raise HeadlessRunFailed(ExitCode.SNAPSHOT_FAILED, str(er))
+            self.result["snapshot_captured"] = self.options.capture_snapshot
+        if self.options.list_snapshots:
+            self.result["snapshots"] = store.list_snapshots()
+
+    def uninstall(self) -> None:
+        '''Removes the mod files recorded in install ledger, mods which require the mod block the removal'''
+        name = self.options.uninstall
+        if not name:
+            return
+        mod = None
+        dependents = []
+        for manifest_path, mod_config in self.context.validated_mod_configs.items():
+            if mod_config["name"] not in self.game.installed_content:
+                continue
+            installed_mod = Mod(mod_config, Path(manifest_path).parent)
+            if installed_mod.name == name:
+                mod = installed_mod
+            elif any(name in requirement.name_set for requirement in installed_mod.requirements):
+                dependents.append(installed_mod.name)
+        if dependents:
+            raise HeadlessRunFailed(ExitCode.UNINSTALL_FAILED, f"Mod {name} is required by {dependents}")
+
+        try:
+            uninstalled = InstallLedger(self.game).uninstall(name)
+        except (LayerNotInLedger, OSError) as er:
+            raise HeadlessRunFailed(ExitCode.UNINSTALL_FAILED, str(er))
+        self.result["uninstalled"] = uninstalled.report()
+        if mod is not None and (mod.patcher_options or mod.config_options or mod.vanilla_mod):
+            self.result["uninstalled"]["exe_changes_kept"] = True
+            logger.warning(f"Exe and config changes of {name} are not reverted by uninstall")
+        if not uninstalled:
+            raise HeadlessRunFailed(ExitCode.UNINSTALL_FAILED, "\n".join(uninstalled.errors))
+        self.game.load_installed_descriptions(self.context.validated_mod_configs)
+
+    def write_result(self) -> None:
+        dumped = json.dumps(self.result, indent=2, ensure_ascii=False, default=str)
+        if self.options.result:
+            with open(self.options.result, "w", encoding="utf-8") as f:
+                f.write(dumped)
+        else:
+            sys.stdout.write(dumped + "\n")
+
+    def prepare_context(self, profile: InstallProfile) -> None:
+        distribution_dir = self.options.distribution_dir or profile.distribution_dir
+        try:
+            self.context = InstallationContext(distribution_dir, dev_mode=self.options.dev)
+            self.context.setup_logging_folder()
+            self.context.setup_loggers()
+            self.context.load_system_info()
+            self.context.validate_remaster()
+        except (DistributionNotFound, FileLoggingSetupError, CorruptedRemasterFiles) as er:
+            raise HeadlessRunFailed(ExitCode.ENVIRONMENT_ERROR, str(er))
+        logger.info(f"Running install profile: {profile.path}")
+
+        try:
+            self.context.load_mods()
+        except (ModsDirMissing, NoModsFound):
+            logger.info("No mods found")
+
+    def open_game(self, target_dir: str) -> GameCopy:
+        game = GameCopy()
+        try:
+            game.process_game_install(target_dir)
+        except (WrongGameDirectoryPath, InvalidGameDirectory, ExeNotFound,
+                ExeIsRunning, InvalidExistingManifest) as er:
+            raise HeadlessRunFailed(ExitCode.GAME_COPY_ERROR, f"{type(er).__name__}: {er}")
+        except ExeNotSupported as er:
+            raise HeadlessRunFailed(ExitCode.GAME_COPY_ERROR,
+                                    f"Exe version is not supported: {er.exe_version}")
+        except (HasManifestButUnpatched, PatchedButDoesntHaveManifest) as er:
+            logger.warning(f"Game copy has leftovers of previous install, exe version: {er.exe_version}")
+        logger.info(f"Target exe [{game.exe_version}]: {game.target_exe}")
+        game.load_installed_descriptions(self.context.validated_mod_configs)
+        return game
+
+    def prepare_game(self, profile: InstallProfile) -> None:
+        target_dir = self.options.target_dir or next(iter(profile.game_paths), None)
+        if target_dir is None:
+            target_dir = self.context.distribution_dir
+        target_dir = os.path.normpath(target_dir)
+        self.result["game_path"] = target_dir
+        self.game = self.open_game(target_dir)
+
+    def get_version_choice(self, profile: InstallProfile) -> str:
+        if self.options.comremaster:
+            return "remaster"
+        if self.options.compatch:
+            return "patch"
+        return profile.base
+
+    def install_base(self, profile: InstallProfile) -> None:
+        version_choice = self.get_version_choice(profile)
+        if version_choice == "patch" and "ComRemaster" in self.game.exe_version:
+            raise InvalidInstallProfile(profile.path, "ComPatch can't be installed over ComRemaster")
+        if version_choice == "none":
+            return
+
+        context = self.context
+        game = self.game
+        session = context.current_session
+        remaster_mod = Mod(context.remaster_config, context.remaster_path)
+        compatible, compat_error = remaster_mod.compatible_with_mod_manager(context.commod_version)
+        if not compatible:
+            raise HeadlessRunFailed(ExitCode.ENVIRONMENT_ERROR, compat_error)
+
+        session.content_in_processing["community_patch"] = {"base": "yes",
+                                                            "version": remaster_mod.version,
+                                                            "installment": remaster_mod.installment,
+                                                            "build": remaster_mod.build,
+                                                            "language": remaster_mod.language,
+                                                            "display_name": "Community Patch"}
+        self.result["base"] = {"choice": version_choice, "version": remaster_mod.version}
+        exe_options = {}
+        remaster_settings = None
+        if version_choice == "remaster":
+            remaster_settings = profile.get_install_settings(remaster_mod, profile.base_options)
+            session.content_in_processing["community_remaster"] = remaster_settings | {
+                "version": remaster_mod.version,
+                "build": remaster_mod.build,
+                "language": remaster_mod.language,
+                "installment": remaster_mod.installment,
+                "display_name": remaster_mod.display_name}
+            self.result["base"]["install_settings"] = remaster_settings
+            exe_options = dict(remaster_mod.patcher_options or {})
+        exe_options.update(profile.exe_options)
+
+        logger.info(f"- Starting headless installation of {version_choice} -")
+        ledger = InstallLedger(game)
+        ledger.begin(plan_base_install(version_choice, game, context, remaster_mod, remaster_settings))
+        file_ops.copy_from_to([os.path.join(context.distribution_dir, "patch")], game.data_path)
+        file_ops.copy_from_to([os.path.join(context.distribution_dir, "libs")], game.game_root_path)
+        if version_choice == "remaster":
+            status_ok, error_messages = remaster_mod.install(game.data_path,
+                                                             remaster_settings,
+                                                             session.content_in_processing,
+                                                             game.installed_descriptions)
+            if not status_ok:
+                raise HeadlessRunFailed(ExitCode.BASE_INSTALL_FAILED,
+                                        "\n".join(["Community Remaster install failed", *error_messages]))
+        try:
+            self.result["base"]["changes"] = install_base(version_choice, game, context, exe_options)
+        except DXRenderDllNotFound:
+            raise HeadlessRunFailed(ExitCode.BASE_INSTALL_FAILED, "dxrender9.dll is not found")
+        file_ops.rename_effects_bps(game.game_root_path)
+        ledger.commit()
+
+        game.installed_content = game.installed_content | session.content_in_processing
+        if not file_ops.dump_yaml(game.installed_content, game.installed_manifest_path):
+            raise HeadlessRunFailed(ExitCode.BASE_INSTALL_FAILED,
+                                    f"Couldn't dump install manifest to '{game.installed_manifest_path}'!")
+        game.load_installed_descriptions(context.validated_mod_configs)
+
+    def find_mod(self, profile: InstallProfile, entry: dict, library: dict[str, list[Mod]]) -> Mod:
+        name = str(entry["name"])
+        candidates = library.get(name)
+        if not candidates:
+            raise InvalidInstallProfile(profile.path, f"Mod {name} is not found in the library")
+        if entry.get("version") is not None:
+            candidates = [mod for mod in candidates if str(mod.version) == str(entry["version"])]
+            if not candidates:
+                raise InvalidInstallProfile(profile.path,
+                                            f"Mod {name} of version {entry['version']} is not found")
+        mod = candidates[0]
+        language = entry.get("language")
+        if language is not None and language != mod.language:
+            mod.load_translations()
+            translation = mod.get_translation(language)
+            if translation is None:
+                raise InvalidInstallProfile(profile.path, f"Mod {name} doesn't have '{language}' translation")
+            mod = translation
+        return mod
+
+    def get_requested(self, profile: InstallProfile) -> list[tuple[Mod, dict]]:
+        '''Mods of the profile with their install settings, in the order of profile'''
+        library = {}
+        for manifest_path, mod_config in self.context.validated_mod_configs.items():
+            mod = Mod(mod_config, Path(manifest_path).parent)
+            library.setdefault(mod.name, []).append(mod)
+
+        requested = []
+        for entry in profile.mods:
+            mod = self.find_mod(profile, entry, library)
+            install_settings = profile.get_install_settings(mod, entry.get("options") or {})
+            requested.append((mod, install_settings))
+            self.result["mods"]["requested"].append({"name": mod.name,
+                                                     "version": mod.version,
+                                                     "language": mod.language,
+                                                     "install_settings": install_settings})
+
+        invalid_files = [mod.name for mod, _ in requested if not mod.validate_files()]
+        if invalid_files:
+            raise HeadlessRunFailed(ExitCode.MODS_REJECTED, f"Mod files are invalid: {invalid_files}")
+
+        return requested
+
+    def install_mods(self, profile: InstallProfile) -> None:
+        if not profile.mods:
+            return
+        requested = self.get_requested(profile)
+        installer = BatchInstaller(self.game, self.context.commod_version)
+        plan = installer.resolve(requested)
+        self.result["mods"]["conflicts"] = [conflict.render() for conflict in plan.conflicts]
+        if not plan:
+            raise HeadlessRunFailed(ExitCode.MODS_REJECTED,
+                                    "Install plan has conflicts, nothing was installed")
+
+        batch_result = installer.install(plan)
+        self.result["mods"]["installed"] = [mod.name for mod in batch_result.installed]
+        if batch_result.copy_plan is not None:
+            self.result["mods"]["bytes_copied"] = batch_result.copy_plan.bytes_final
+        self.result["mods"]["files_resumed"] = batch_result.files_resumed
+        if not batch_result:
+            raise HeadlessRunFailed(ExitCode.MODS_INSTALL_FAILED, "\n".join(batch_result.errors))
+
+    def deploy(self, profile: InstallProfile) -> None:
+        '''Same base and mods are installed into all the game copies of profile, copies which
+           can't be opened are reported and skipped'''
+        games = []
+        failed_to_open = []
+        for game_path in profile.game_paths:
+            game_path = os.path.normpath(game_path)
+            try:
+                games.append(self.open_game(game_path))
+            except HeadlessRunFailed as er:
+                failed_to_open.append({"game_path": game_path, "status": "failed", "errors": [er.message]})
+        if not games:
+            raise HeadlessRunFailed(ExitCode.GAME_COPY_ERROR, "None of the game copies can be opened")
+
+        deployer = MultiTargetDeployer(games, self.context)
+        version_choice = self.get_version_choice(profile)
+        remaster_settings = None
+        if version_choice != "none":
+            compatible, compat_error = deployer.remaster_mod.compatible_with_mod_manager(
+                self.context.commod_version)
+            if not compatible:
+                raise HeadlessRunFailed(ExitCode.ENVIRONMENT_ERROR, compat_error)
+            self.result["base"] = {"choice": version_choice, "version": deployer.remaster_mod.version}
+            if version_choice == "remaster":
+                remaster_settings = profile.get_install_settings(deployer.remaster_mod, profile.base_options)
+                self.result["base"]["install_settings"] = remaster_settings
+        requested = self.get_requested(profile) if profile.mods else []
+
+        deployer.prepare(requested, version_choice, remaster_settings, profile.exe_options)
+        logged_steps = {}
+
+        def log_progress(game_path: str, files_done: int, files_count: int) -> None:
+            # every target is logged at each quarter of the copy
+            step = files_done * 4 // max(1, files_count)
+            if logged_steps.get(game_path) != step:
+                logged_steps[game_path] = step
+                logger.info(f"Deploying to '{game_path}': {files_done} of {files_count} files")
+
+        report = deployer.deploy(log_progress)
+        report["targets"].extend(failed_to_open)
+        report["targets_failed"] += len(failed_to_open)
+        self.result["targets"] = report
+        if report["targets_failed"]:
+            raise HeadlessRunFailed(ExitCode.TARGETS_FAILED,
+                                    f"{report['targets_failed']} of {len(profile.game_paths)} targets failed")
+
+
+def main(options: argparse.Namespace) -> int:
+    return int(HeadlessRunner(options).run())
@@ -0,0 +1,166 @@
+'''
+Batch install of several mods in one pass. File layers of all the mods are merged into one overlay,
+so every game file is copied once with its final content. Exe and config patches are applied once
+with merged values and the install manifest is written once at the end.
+'''
+from __future__ import annotations
+
+import logging
+import typing
+
+from helpers import file_ops
+
+from .ledger import InstallLedger
+from .mod import Mod
+from .resolver import DependencyResolver, InstallPlan, PlanConflict
+
+if typing.TYPE_CHECKING:
+    from .environment import GameCopy
+
+logger = logging.getLogger('dem')
+
+
+class BatchResult:
+    '''Outcome of batch install, evaluates to bool - True only when all the planned mods were installed'''
+    __slots__ = ("plan", "copy_plan", "installed", "errors", "changes_description", "files_resumed")
+
+    def __init__(self, plan: InstallPlan) -> None:
+        self.plan = plan
+        self.copy_plan = None
+        self.installed = []
+        self.errors = [conflict.render() for conflict in plan.conflicts]
+        self.changes_description = []
+        self.files_resumed = 0
+
+    def __bool__(self) -> bool:
+        return not self.errors
+
+    def __repr__(self) -> str:
+        return f"BatchResult(installed={[mod.name for mod in self.installed]}, errors={self.errors})"
+
+
+class BatchInstaller:
+    '''Installs ordered (mod, install_settings) pairs into the game copy'''
+    def __init__(self, game: GameCopy, commod_version: str | None = None) -> None:
+        self.game = game
+        self.commod_version = commod_version
+
+    def resolve(self, requested: list[tuple[Mod, dict]],
+                installed_content: dict | None = None) -> InstallPlan:
+        '''Orders and checks the batch against the installed content of the game copy,
+           or against the given content which will be installed by the time the batch is copied'''
+        batchable = []
+        rejected = []
+        for mod, install_settings in requested:
+            # ComPatch and ComRemaster patch the exe in their own way and are installed by themselves
+            if mod.name == "community_remaster":
+                rejected.append(PlanConflict("not_batchable", mod.name,
+                                             details="base game patch is installed separately"))
+            else:
+                batchable.append((mod, install_settings))
+        if installed_content is None:
+            installed_content = self.game.installed_content
+        resolver = DependencyResolver(installed_content, self.game.installed_descriptions,
+                                      self.commod_version, self.game.installment)
+        plan = resolver.resolve(batchable)
+        plan.conflicts[:0] = rejected
+        plan.log(logger)
+        return plan
+
+    def plan_copy(self, plan: InstallPlan, copy_plan: file_ops.CopyPlan | None = None) -> file_ops.CopyPlan:
+        '''Overlay of all the file layers, files of the later mods replace the files of earlier ones'''
+        if copy_plan is None:
+            copy_plan = file_ops.CopyPlan()
+        for mod, install_settings in plan.steps:
+            mod.plan_install(self.game.data_path, install_settings, copy_plan)
+        return copy_plan
+
+    def get_checkpoint(self, plan: InstallPlan) -> file_ops.Checkpoint:
+        '''Interrupted install of the same batch is resumed from this checkpoint'''
+        return file_ops.Checkpoint(self.game.install_checkpoint_path,
+                                   {"kind": "batch",
+                                    "display_name": ", ".join(mod.display_name for mod, _ in plan.steps),
+                                    "mods": [[mod.name, str(mod.version), mod.language, install_settings]
+                                             for mod, install_settings in plan.steps]})
+
+    @staticmethod
+    def merge_patcher_options(plan: InstallPlan) -> dict:
+        '''Values set by the later mods override the ones set by the earlier mods'''
+        merged = {}
+        for mod, _ in plan.steps:
+            if mod.patcher_options is not None and not mod.vanilla_mod:
+                merged.update(mod.patcher_options)
+        return merged
+
+    @staticmethod
+    def merge_config_options(plan: InstallPlan) -> dict:
+        merged = {}
+        for mod, _ in plan.steps:
+            if mod.config_options:
+                merged.update(mod.config_options)
+        return merged
+
+    def install(self, plan: InstallPlan, console: bool = False,
+                copy_plan: file_ops.CopyPlan | None = None) -> BatchResult:
+        '''Installs the plan if it has no conflicts, nothing is written otherwise'''
+        result = BatchResult(plan)
+        if not plan or not plan.steps:
+            return result
+
+        result.copy_plan = copy_plan if copy_plan is not None else self.plan_copy(plan)
+        logger.info(f"Batch copy plan: {result.copy_plan}")
+        _, space_error = Mod.describe_install_plan(result.copy_plan)
+        if space_error:
+            result.errors.append(space_error)
+            return result
+
+        checkpoint = self.get_checkpoint(plan)
+        result.files_resumed = len(checkpoint.load())
+        ledger = InstallLedger(self.game)
+        ledger.begin(result.copy_plan, checkpoint=checkpoint)
+        try:
+            file_ops.copy_planned(result.copy_plan, console, checkpoint)
+            result.changes_description = self.apply_patches(plan)
+        except Exception as ex:
+            logger.error(f"Batch install failed: {ex!r}")
+            result.errors.append(str(ex))
+            return result
+        finally:
+            # interrupted or failed install is resumed by the next install of the same batch
+            checkpoint.save()
+
+        ledger.commit()
+        checkpoint.finish()
+        self.write_manifest(plan, result)
+        return result
+
+    def apply_patches(self, plan: InstallPlan) -> list[str]:
+        '''Exe and config changes of the whole batch, applied after all the files are copied'''
+        changes_description = []
+        patcher_options = self.merge_patcher_options(plan)
+        vanilla_batch = any(mod.vanilla_mod for mod, _ in plan.steps)
+        if patcher_options or vanilla_batch:
+            # all the exe changes of the batch are written in one pass
+            with file_ops.ExePatchSession(self.game.target_exe) as session:
+                if patcher_options:
+                    file_ops.patch_configurables(self.game.target_exe, patcher_options, session)
+                if vanilla_batch:
+                    changes_description = file_ops.patch_memory(self.game.target_exe, session)
+        if patcher_options.get("gravity") is not None:
+            file_ops.correct_damage_coeffs(self.game.game_root_path, patcher_options["gravity"])
+
+        config_options = self.merge_config_options(plan)
+        if config_options:
+            self.game.change_config_values_sync(config_options)
+        return changes_description
+
+    def write_manifest(self, plan: InstallPlan, result: BatchResult,
+                       base_content: dict | None = None) -> None:
+        '''Adds the installed batch and optionally the base content installed with it to the manifest'''
+        installed_entries = {mod.name: DependencyResolver.get_entry(mod, install_settings)
+                             for mod, install_settings in plan.steps}
+        self.game.installed_content = self.game.installed_content | (base_content or {}) | installed_entries
+        if not file_ops.dump_yaml(self.game.installed_content, self.game.installed_manifest_path):
+            result.errors.append(f"Couldn't dump install manifest to '{self.game.installed_manifest_path}'!")
+        result.installed = [mod for mod, _ in plan.steps]
+        logger.info(f"Batch installed: {[mod.name for mod in result.installed]}")
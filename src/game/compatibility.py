@@ -0,0 +1,185 @@
+'''
+Compatibility of mods with installed content of the game copy, cached per mod by the part
+of installed content which the mod checks depend on. When installed content changes
+or another game copy is selected only the rows which depend on changed content are recomputed.
+'''
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .mod import Mod
+
+# every translation keeps results for this many different states of installed content,
+# usually one per known game copy
+ROWS_PER_MOD = 8
+
+# content which is checked for every mod: ComPatch-only mods can't be installed over ComRemaster
+BASE_CONTENT = ("community_patch", "community_remaster")
+
+
+class Verdict:
+    '''Result of a single compatibility check. Keeps only the facts found by the check,
+       localised label and message lines are rendered from them on first access'''
+    __slots__ = ("ok", "render_func", "facts", "_label", "_lines")
+
+    def __init__(self, ok: bool, render_func: typing.Callable[[Verdict], tuple[str, list[str]]] | None = None,
+                 **facts) -> None:
+        self.ok = ok
+        self.render_func = render_func
+        self.facts = facts
+        self._label = None
+        self._lines = None
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def __repr__(self) -> str:
+        return f"Verdict(ok={self.ok}, facts={list(self.facts)})"
+
+    def render(self) -> None:
+        if self._lines is None:
+            if self.render_func is not None:
+                self._label, self._lines = self.render_func(self)
+            else:
+                self._label = self.facts.get("label", "")
+                self._lines = self.facts.get("lines", [])
+
+    @property
+    def label(self) -> str:
+        self.render()
+        return self._label
+
+    @property
+    def lines(self) -> list[str]:
+        self.render()
+        return self._lines
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+    @property
+    def mention_versions(self) -> bool:
+        return self.facts.get("mention_versions", True)
+
+    @staticmethod
+    def render_all(verdicts: list[Verdict]) -> list[str]:
+        lines = []
+        for verdict in verdicts:
+            lines.extend(verdict.lines)
+        return lines
+
+
+# shared result for checks which passed without anything to report
+PASSED = Verdict(True)
+
+
+class InstalledIndex:
+    '''Installed content indexed by service name, every entry is reduced to a comparable fingerprint'''
+    __slots__ = ("installed_content", "installed_descriptions", "fingerprints", "digest")
+
+    def __init__(self, installed_content: dict, installed_descriptions: dict) -> None:
+        self.installed_content = installed_content
+        self.installed_descriptions = installed_descriptions
+        self.fingerprints = {name: InstalledIndex.get_fingerprint(entry, installed_descriptions.get(name))
+                             for name, entry in installed_content.items()}
+        self.digest = tuple(sorted(self.fingerprints.items()))
+
+    @staticmethod
+    def get_fingerprint(entry: dict, description: str | None) -> str:
+        return repr((sorted(entry.items(), key=lambda item: str(item[0])), description))
+
+
+class CompatibilityMatrix:
+    '''Session compatibility results of mods by installed content'''
+    def __init__(self) -> None:
+        # (mod id, distribution dir) -> {row key: stored compatibility}
+        self.rows = {}
+        self.dependencies = {}
+        self.computed = 0
+        self.reused = 0
+
+    @staticmethod
+    def get_mod_key(translation: Mod) -> tuple[str, str]:
+        return translation.id, str(translation.distribution_dir)
+
+    def get_dependencies(self, translation: Mod) -> tuple[tuple[str, ...], bool, bool]:
+        '''Names of installed content which affect the result, whether the names of all the installed
+           content matter and whether the whole content matters'''
+        mod_key = CompatibilityMatrix.get_mod_key(translation)
+        dependencies = self.dependencies.get(mod_key)
+        if dependencies is None:
+            names = {translation.name, *BASE_CONTENT}
+            for constraint in (*translation.requirements, *translation.incompatibilities):
+                names |= constraint.name_set
+            # strict requirements check only the names of all the installed content,
+            # ComRemaster is always reinstalled over ComPatch
+            dependencies = (tuple(sorted(names)),
+                            bool(translation.strict_requirements),
+                            translation.name == "community_remaster")
+            self.dependencies[mod_key] = dependencies
+        return dependencies
+
+    def get_row_key(self, translation: Mod, index: InstalledIndex) -> tuple:
+        names, depends_on_names, depends_on_all = self.get_dependencies(translation)
+        # reinstallation checks the list of all the installed content
+        if depends_on_all or translation.name in index.fingerprints:
+            return index.digest
+        row_key = tuple(index.fingerprints.get(name) for name in names)
+        if depends_on_names:
+            return frozenset(index.fingerprints), row_key
+        return row_key
+
+    def load_session_compatibility(self, mod: Mod, index: InstalledIndex) -> None:
+        '''Same as Mod.load_session_compatibility, but reuses results computed for the same content'''
+        mod.compatibility_context["session"] = (index.installed_content, index.installed_descriptions)
+        for translation in mod.translations_loaded.values():
+            mod_key = CompatibilityMatrix.get_mod_key(translation)
+            row_key = self.get_row_key(translation, index)
+            mod_rows = self.rows.setdefault(mod_key, {})
+            stored = mod_rows.get(row_key)
+            if stored is None:
+                mod.load_session_compatibility(index.installed_content, index.installed_descriptions,
+                                               [translation])
+                stored = CompatibilityMatrix.store(translation)
+                if len(mod_rows) >= ROWS_PER_MOD:
+                    mod_rows.pop(next(iter(mod_rows)))
+                mod_rows[row_key] = stored
+                self.computed += 1
+            else:
+                CompatibilityMatrix.restore(translation, stored)
+                self.reused += 1
+
+    def update(self, mods: typing.Iterable[Mod],
+               installed_content: dict, installed_descriptions: dict) -> None:
+        '''Loads session compatibility for all the mods, installed content is indexed once'''
+        index = InstalledIndex(installed_content, installed_descriptions)
+        for mod in mods:
+            self.load_session_compatibility(mod, index)
+
+    def forget(self, mod: Mod) -> None:
+        '''Drops stored results for mod, needed when its manifest is changed without version change'''
+        for translation in mod.translations_loaded.values():
+            mod_key = CompatibilityMatrix.get_mod_key(translation)
+            self.rows.pop(mod_key, None)
+            self.dependencies.pop(mod_key, None)
+
+    @staticmethod
+    def store(translation: Mod) -> tuple:
+        return (translation.compatible, translation.requirement_verdicts,
+                translation.prevalidated, translation.incompatible_verdicts,
+                translation.is_reinstall, translation.can_be_reinstalled,
+                translation.reinstall_verdict, translation.existing_version,
+                list(translation.individual_require_status), list(translation.individual_incomp_status))
+
+    @staticmethod
+    def restore(translation: Mod, stored: tuple) -> None:
+        (translation.compatible, translation.requirement_verdicts,
+         translation.prevalidated, translation.incompatible_verdicts,
+         translation.is_reinstall, translation.can_be_reinstalled,
+         translation.reinstall_verdict, translation.existing_version,
+         require_status, incomp_status) = stored
+        translation.individual_require_status[:] = require_status
+        translation.individual_incomp_status[:] = incomp_status
+        translation.update_can_install()
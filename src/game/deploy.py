@@ -0,0 +1,223 @@
+'''
+Multi-target deployment, installs the same base patch and mods into several game copies.
+Distribution is walked and every source file is read once, writes are fanned out to all the targets
+with one writer per target device. Exe patching, config changes and manifests are done per target
+in parallel, every target keeps its own copy journal and the combined report lists all of them.
+'''
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import os
+import time
+import typing
+
+from helpers import file_ops
+from helpers.errors import DXRenderDllNotFound
+
+from .batch import BatchInstaller, BatchResult
+from .ledger import InstallLedger
+from .mod import Mod
+from .resolver import PlanConflict
+
+if typing.TYPE_CHECKING:
+    from .environment import GameCopy, InstallationContext
+
+logger = logging.getLogger('dem')
+
+
+class DeployTarget:
+    '''Single game copy of deployment with its own install plan, progress and errors'''
+    __slots__ = ("game", "installer", "ledger", "plan", "copy_plan", "result", "journal_path",
+                 "changes_description", "errors", "files_done")
+
+    def __init__(self, game: GameCopy, commod_version: str | None) -> None:
+        self.game = game
+        self.installer = BatchInstaller(game, commod_version)
+        self.ledger = InstallLedger(game)
+        self.plan = None
+        self.copy_plan = None
+        self.result = None
+        self.journal_path = os.path.join(game.data_path, MultiTargetDeployer.JOURNAL_NAME)
+        self.changes_description = []
+        self.errors = []
+        self.files_done = 0
+
+    def __bool__(self) -> bool:
+        return not self.errors
+
+    def __repr__(self) -> str:
+        return f"DeployTarget({self.game.game_root_path!r}, errors={self.errors})"
+
+    def report(self) -> dict:
+        return {"game_path": self.game.game_root_path,
+                "status": "ok" if self else "failed",
+                "files_written": self.files_done,
+                "installed": [] if self.result is None else [mod.name for mod in self.result.installed],
+                "changes": self.changes_description,
+                "journal": self.journal_path,
+                "errors": self.errors}
+
+
+class MultiTargetDeployer:
+    '''Installs base patch and the batch of mods into every game copy, only the targets
+       for which the same install plan is resolved share the copy'''
+    JOURNAL_NAME = "deploy_journal.yaml"
+    # exe and config patching is small and mostly waits for disk
+    PATCH_WORKERS = 8
+
+    def __init__(self, games: list[GameCopy], context: InstallationContext) -> None:
+        self.context = context
+        self.targets = [DeployTarget(game, context.commod_version) for game in games]
+        self.version_choice = "none"
+        self.remaster_mod = Mod(context.remaster_config, context.remaster_path)
+        self.remaster_settings = None
+        self.base_content = {}
+        self.exe_options = {}
+        self.files_count = 0
+        self.duration = 0.0
+
+    @property
+    def ready_targets(self) -> list[DeployTarget]:
+        return [target for target in self.targets if target]
+
+    def get_base_content(self) -> dict:
+        '''Manifest entries of the base patch installed by this deployment'''
+        if self.version_choice == "none":
+            return {}
+        remaster_mod = self.remaster_mod
+        base_content = {"community_patch": {"base": "yes",
+                                            "version": remaster_mod.version,
+                                            "installment": remaster_mod.installment,
+                                            "build": remaster_mod.build,
+                                            "language": remaster_mod.language,
+                                            "display_name": "Community Patch"}}
+        if self.version_choice == "remaster":
+            base_content["community_remaster"] = self.remaster_settings | {
+                "version": remaster_mod.version,
+                "build": remaster_mod.build,
+                "language": remaster_mod.language,
+                "installment": remaster_mod.installment,
+                "display_name": remaster_mod.display_name}
+        return base_content
+
+    def plan_base(self, game: GameCopy, copy_plan: file_ops.CopyPlan) -> None:
+        '''Same layers as the console base install: patch, libs and ComRemaster files'''
+        if self.version_choice == "none":
+            return
+        distribution_dir = self.context.distribution_dir
+        copy_plan.add([os.path.join(distribution_dir, "patch")], game.data_path, "community_patch")
+        copy_plan.add([os.path.join(distribution_dir, "libs")], game.game_root_path, "community_patch")
+        if self.version_choice == "remaster":
+            self.remaster_mod.plan_install(game.data_path, self.remaster_settings, copy_plan)
+
+    def prepare(self, requested: list[tuple[Mod, dict]], version_choice: str = "none",
+                remaster_settings: dict | None = None, exe_options: dict | None = None) -> None:
+        '''Resolves the batch for every target and plans the shared copy. Targets with conflicts
+           or with the plan which differs from the first valid one are excluded from deployment'''
+        self.version_choice = version_choice
+        self.remaster_settings = remaster_settings
+        self.base_content = self.get_base_content()
+        self.exe_options = exe_options or {}
+
+        reference = None
+        for target in self.targets:
+            if version_choice == "patch" and "ComRemaster" in target.game.exe_version:
+                target.errors.append("ComPatch can't be installed over ComRemaster")
+                continue
+            target.plan = target.installer.resolve(requested,
+                                                   target.game.installed_content | self.base_content)
+            if not target.plan:
+                target.errors.extend(conflict.render() for conflict in target.plan.conflicts)
+            elif reference is None:
+                reference = target
+            elif target.plan.order != reference.plan.order:
+                target.errors.append(PlanConflict("plan_differs", target.game.game_root_path,
+                                                  reference.game.game_root_path,
+                                                  f"install order {target.plan.order}").render())
+        if reference is None:
+            return
+
+        reference.copy_plan = file_ops.CopyPlan()
+        self.plan_base(reference.game, reference.copy_plan)
+        reference.installer.plan_copy(reference.plan, reference.copy_plan)
+        self.files_count = len(reference.copy_plan.sources)
+        for target in self.ready_targets:
+            if target is not reference:
+                target.copy_plan = reference.copy_plan.retarget(
+                    {reference.game.game_root_path: target.game.game_root_path,
+                     reference.game.data_path: target.game.data_path})
+            _, space_error = Mod.describe_install_plan(target.copy_plan)
+            if space_error:
+                target.errors.append(space_error)
+        logger.info(f"Deployment to {len(self.ready_targets)} of {len(self.targets)} targets: "
+                    f"{reference.copy_plan}")
+
+    def patch_target(self, target: DeployTarget) -> None:
+        '''Everything which follows the copy for a single target, runs in the worker thread'''
+        game = target.game
+        try:
+            if self.version_choice != "none":
+                if self.version_choice == "remaster":
+                    target_dll = os.path.join(game.game_root_path, "dxrender9.dll")
+                    if not os.path.exists(target_dll):
+                        raise DXRenderDllNotFound
+                    file_ops.patch_render_dll(target_dll)
+                exe_options = dict(self.remaster_mod.patcher_options or {}) | self.exe_options
+                target.changes_description = file_ops.patch_game_exe(game.target_exe,
+                                                                     self.version_choice,
+                                                                     self.context.remaster_config["build"],
+                                                                     self.context.monitor_res,
+                                                                     exe_options,
+                                                                     self.context.under_windows)
+                file_ops.rename_effects_bps(game.game_root_path)
+            target.changes_description.extend(target.installer.apply_patches(target.plan))
+        except DXRenderDllNotFound:
+            target.errors.append(f"dxrender9.dll is not found in '{game.game_root_path}'")
+            return
+        except Exception as ex:
+            logger.error(f"Patching of '{game.game_root_path}' failed: {ex!r}")
+            target.errors.append(str(ex))
+            return
+
+        target.result = BatchResult(target.plan)
+        target.ledger.commit()
+        target.installer.write_manifest(target.plan, target.result, self.base_content)
+        target.errors.extend(target.result.errors)
+
+    def deploy(self, progress: typing.Callable[[str, int, int], None] | None = None) -> dict:
+        '''Copies the planned files to all the ready targets and patches them, returns combined report.
+           Progress callback receives game path, files done and files count'''
+        start = time.perf_counter()
+        targets = self.ready_targets
+        if targets:
+            # sources are hashed once for all the ledgers, replaced files are backed up in every target
+            hash_cache = {}
+            with concurrent.futures.ThreadPoolExecutor(min(self.PATCH_WORKERS, len(targets))) as pool:
+                list(pool.map(lambda target: target.ledger.begin(target.copy_plan, hash_cache), targets))
+            fan_out = file_ops.FanOutCopy([target.copy_plan for target in targets],
+                                          [target.journal_path for target in targets])
+
+            def copy_progress(index: int, files_done: int, files_count: int) -> None:
+                targets[index].files_done = files_done
+                if progress is not None:
+                    progress(targets[index].game.game_root_path, files_done, files_count)
+
+            fan_out.run(copy_progress)
+            for target, copied in zip(targets, fan_out.targets):
+                if copied.error is not None:
+                    target.errors.append(f"Copy failed: {copied.error}")
+
+            targets = self.ready_targets
+            with concurrent.futures.ThreadPoolExecutor(min(self.PATCH_WORKERS, max(1, len(targets)))) as pool:
+                list(pool.map(self.patch_target, targets))
+        self.duration = time.perf_counter() - start
+        return self.report()
+
+    def report(self) -> dict:
+        return {"version_choice": self.version_choice,
+                "targets_ok": sum(1 for target in self.targets if target),
+                "targets_failed": sum(1 for target in self.targets if not target),
+                "files": self.files_count,
+                "duration": round(self.duration, 2),
+                "targets": [target.report() for target in self.targets]}
@@ -7,14 +7,14 @@ import subprocess
 import sys
 #import winreg
 import zipfile
-from asyncio import gather
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import ctypes
 from helpers.get_system_fonts import getmember
 #from ctypes import windll
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 import py7zr
 from aiopath import AsyncPath
@@ -28,18 +28,26 @@ from helpers.errors import (CorruptedRemasterFiles, DistributionNotFound,
                             ModsDirMissing, NoModsFound,
                             PatchedButDoesntHaveManifest,
                             WrongGameDirectoryPath)
-from helpers.file_ops import (TARGEM_NEGATIVE, TARGEM_POSITIVE, get_config,
-                              load_yaml, read_yaml, running_in_venv,
-                              save_to_file_async, shorten_path)
+from helpers.file_ops import (TARGEM_NEGATIVE, TARGEM_POSITIVE,
+                              ArchivePathIndex, DistributionStore, copy_throughput, get_config, load_yaml,
+                              markdown_cache, read_yaml, running_in_venv, save_to_file,
+                              save_to_file_async, shorten_path, thumbnail_cache)
 from localisation.service import tr
 
 from .data import (OS_SCALE_FACTOR, OWN_VERSION, VERSION_BYTES_100_STAR,
                    VERSION_BYTES_102_NOCD, VERSION_BYTES_102_STAR,
                    VERSION_BYTES_103_NOCD, VERSION_BYTES_103_STAR,
                    VERSION_BYTES_DEM_LNCH)
+from .compatibility import CompatibilityMatrix
 from .mod import GameInstallments, Mod
 
 
+# dirs which can't contain mod manifests, never descending into them during mod discovery
+DISCOVERY_PRUNED_DIRS = frozenset({"data", "libs", "screenshots", "branding", "media",
+                                   "__pycache__", ".git"})
+DISCOVERY_WORKERS = 8
+
+
 class GameStatus(Enum):
     COMPATIBLE = ""
     NOT_EXISTS = "not_a_valid_path"
@@ -72,6 +80,15 @@ class InstallationContext:
         self.hashed_mod_manifests = {}
         self.archived_mods = {}
         self.archived_manifests_cache = {}
+        # archive path -> ArchivePathIndex, shared by validation and extraction
+        self.archive_path_indexes = {}
+        self._distribution_store = None
+        # outlives sessions, so switching between game copies reuses computed results
+        self.compatibility = CompatibilityMatrix()
+        cache_dir = os.path.join(InstallationContext.get_local_path(), "cache")
+        markdown_cache.set_location(os.path.join(cache_dir, "markdown"))
+        thumbnail_cache.set_location(os.path.join(cache_dir, "thumbnails"))
+        copy_throughput.set_location(os.path.join(cache_dir, "copy_speed.yaml"))
         self.commod_version = OWN_VERSION
         self.os = platform.system()
         self.os_version = platform.release()
@@ -86,8 +103,16 @@ class InstallationContext:
 
         self.current_session = self.Session()
 
-    def new_session(self):
+    def new_session(self, keep_loaded_mods: bool = False):
+        '''Starts a new session, loaded mods don't depend on the game copy and can be kept'''
+        previous_session = self.current_session
         self.current_session = self.Session()
+        self.current_session.steam_game_paths = previous_session.steam_game_paths
+        if keep_loaded_mods:
+            self.current_session.mods = previous_session.mods
+            self.current_session.tracked_mods = previous_session.tracked_mods
+            self.current_session.tracked_mods_hashes = previous_session.tracked_mods_hashes
+            self.current_session.mods_validation_info = previous_session.mods_validation_info
 
     @staticmethod
     def validate_distribution_dir(distribution_dir: str, legacy_checks=False) -> bool:
@@ -129,6 +154,14 @@ class InstallationContext:
             raise DistributionNotFound(distribution_dir,
                                        "Couldn't find all required files in given distribuion dir")
 
+    @property
+    def distribution_store(self) -> DistributionStore:
+        '''Content addressed store of extracted mods, it's used only when enabled for the distribution'''
+        if (self._distribution_store is None
+           or self._distribution_store.distribution_dir != self.distribution_dir):
+            self._distribution_store = DistributionStore(self.distribution_dir)
+        return self._distribution_store
+
     def load_system_info(self):
         self.under_windows = "Windows" in self.os
         self.monitor_res = self.get_monitor_resolution()
@@ -200,7 +233,7 @@ class InstallationContext:
             exe_path = Path(__file__).resolve().parent
         else:
             exe_path = Path(sys.executable).resolve().parent
-        print(f"exe_path:{exe_path}")
+        logging.getLogger('dem').debug(f"exe_path:{exe_path}")
         return str(exe_path)
 
     def add_default_distribution_dir(self) -> None:
@@ -242,7 +275,7 @@ class InstallationContext:
                 else:
                     self.validated_mod_configs.pop(mod_config_path, None)
 
-            self.logger.info(f"--- Loading {mod_config_path} ---")
+            self.logger.debug(f"--- Loading {mod_config_path} ---")
             self.hashed_mod_manifests[mod_config_path] = digest
             yaml_config = read_yaml(mod_config_path)
             if yaml_config is None:
@@ -253,13 +286,17 @@ class InstallationContext:
                 if mod_config_path in self.validated_mod_configs.keys():
                     self.validated_mod_configs.pop(mod_config_path, None)
                 continue
-            config_validated = Mod.validate_install_config(yaml_config, mod_config_path)
-            if config_validated:
+            # files are checked on demand, when mod is opened or installed
+            validation_report = Mod.validate_install_config(yaml_config, mod_config_path,
+                                                            check_files=False)
+            if validation_report:
+                self.current_session.mods_validation_info.pop(mod_config_path, None)
                 self.validated_mod_configs[mod_config_path] = yaml_config
                 self.logger.debug("--- Loaded and validated mod config ---")
             else:
                 if mod_config_path in self.validated_mod_configs.keys():
                     self.validated_mod_configs.pop(mod_config_path, None)
+                self.current_session.mods_validation_info[mod_config_path] = validation_report
                 self.logger.warning(f"! Couldn't validate Mod manifest: {mod_config_path}")
                 mod_loading_errors.append(f"\n{tr('not_validated_mod_manifest')}.\n"
                                           f"{tr('folder').capitalize()}: "
@@ -274,6 +311,11 @@ class InstallationContext:
                 self.validated_mod_configs.pop(mod, None)
                 self.hashed_mod_manifests.pop(mod, None)
 
+        rejected_mods = self.current_session.mods_validation_info
+        for mod in set(rejected_mods.keys()) - set(all_config_paths):
+            rejected_mods.pop(mod, None)
+            self.hashed_mod_manifests.pop(mod, None)
+
         if archived_mods:
             for path, manifest in archived_mods.items():
                 try:
@@ -317,7 +359,7 @@ class InstallationContext:
                 else:
                     self.validated_mod_configs.pop(mod_config_path, None)
 
-            self.logger.info(f"--- Loading {mod_config_path} ---")
+            self.logger.debug(f"--- Loading {mod_config_path} ---")
             self.hashed_mod_manifests[mod_config_path] = digest
             yaml_config = read_yaml(mod_config_path)
             if yaml_config is None:
@@ -328,13 +370,17 @@ class InstallationContext:
                 if mod_config_path in self.validated_mod_configs.keys():
                     self.validated_mod_configs.pop(mod_config_path, None)
                 continue
-            config_validated = Mod.validate_install_config(yaml_config, mod_config_path)
-            if config_validated:
+            # files are checked on demand, when mod is opened or installed
+            validation_report = Mod.validate_install_config(yaml_config, mod_config_path,
+                                                            check_files=False)
+            if validation_report:
+                self.current_session.mods_validation_info.pop(mod_config_path, None)
                 self.validated_mod_configs[mod_config_path] = yaml_config
                 self.logger.debug(f"Loaded and validated mod config: {mod_config_path}")
             else:
                 if mod_config_path in self.validated_mod_configs.keys():
                     self.validated_mod_configs.pop(mod_config_path, None)
+                self.current_session.mods_validation_info[mod_config_path] = validation_report
                 self.logger.warning(f"Couldn't validate mod install manifest: {mod_config_path}")
                 mod_loading_errors.append(f"\n{tr('not_validated_mod_manifest')}.\n"
                                           f"{tr('folder').capitalize()}: "
@@ -349,6 +395,11 @@ class InstallationContext:
                 self.validated_mod_configs.pop(mod, None)
                 self.hashed_mod_manifests.pop(mod, None)
 
+        rejected_mods = self.current_session.mods_validation_info
+        for mod in set(rejected_mods.keys()) - set(all_config_paths):
+            rejected_mods.pop(mod, None)
+            self.hashed_mod_manifests.pop(mod, None)
+
         if archived_mods:
             for path, manifest in archived_mods.items():
                 try:
@@ -363,56 +414,61 @@ class InstallationContext:
         if mod_loading_errors:
             self.logger.error("-- Errors occurred when loading mods! --")
 
-    def get_dir_manifests(self, dir: str, nesting_levels: int = 3, top_level=True) -> str:
+    @staticmethod
+    def scan_mod_dir(dir: str) -> tuple[bool, list[os.DirEntry]]:
+        '''Reads directory once, returns if it contains manifest.yaml and the list of
+        subdirectories that are worth descending into during mod discovery'''
+        has_manifest = False
+        nested_dirs = []
+        try:
+            with os.scandir(dir) as entries:
+                for entry in entries:
+                    if entry.name == "manifest.yaml":
+                        has_manifest = entry.is_file()
+                    elif entry.name.lower() not in DISCOVERY_PRUNED_DIRS and entry.is_dir():
+                        nested_dirs.append(entry)
+        except OSError as ex:
+            logging.getLogger('dem').warning(f"Couldn't scan dir during mod discovery: {dir} ({ex})")
+        return has_manifest, nested_dirs
+
+    def walk_mod_dirs(self, nested_dirs: list[os.DirEntry],
+                      levels_left: int, top_level: bool = True) -> list[str]:
+        '''Looks for manifests in given dirs, every directory is read only once.
+        Below the top level search stops after the first mod found, and if both "patch" and "remaster"
+        dirs are present (ComPatch + ComRemaster distribution) only "remaster" is checked'''
         found_manifests = []
-        levels_left = nesting_levels - 1
-        for entry in os.scandir(dir):
-            if entry.is_dir():
-                manifest_path = os.path.join(entry, "manifest.yaml")
-                if os.path.exists(manifest_path):
-                    found_manifests.append(manifest_path)
-                    if not top_level:
-                        break
-                else:
-                    if levels_left != 0:
-                        found_manifests.extend(self.get_dir_manifests(entry, levels_left, top_level=False))
+        if not top_level:
+            dir_names = {entry.name for entry in nested_dirs}
+            if {"patch", "remaster"}.issubset(dir_names):
+                nested_dirs = [entry for entry in nested_dirs if entry.name == "remaster"]
+
+        for entry in nested_dirs:
+            has_manifest, entry_nested_dirs = self.scan_mod_dir(entry.path)
+            if has_manifest:
+                found_manifests.append(os.path.join(entry.path, "manifest.yaml"))
+                if not top_level:
+                    break
+            elif levels_left != 0:
+                found_manifests.extend(self.walk_mod_dirs(entry_nested_dirs, levels_left - 1,
+                                                          top_level=False))
         return found_manifests
 
-    async def find_manifest_in_dir(self, dir: AsyncPath, nesting_levels: int = 3):
-        self.logger.debug(f"{datetime.now()} looking for manifest in {dir.name}")
+    def iter_dir_manifests(self, dir: str, nesting_levels: int = 3) -> Iterator[str]:
+        '''Yields manifests of mods found in dir as soon as each top level mod dir is scanned,
+        top level dirs are scanned concurrently as most of the time is spent waiting on disk'''
+        _, top_level_dirs = self.scan_mod_dir(dir)
+        if not top_level_dirs:
+            return
         levels_left = nesting_levels - 1
-        manifests_path = AsyncPath(dir, "manifest.yaml")
-        if await manifests_path.exists():
-            return manifests_path
-
-        if levels_left == 0:
-            return None
-
-        nested_dirs = []
-        async for path in dir.glob("*"):
-            if await path.is_dir():
-                nested_dirs.append(path)
-
-        num_dirs = len(nested_dirs)
-        if num_dirs == 0:
-            return None
-        elif num_dirs > 1:
-            dir_names = set([dir.name for dir in nested_dirs])
-            if set(["patch", "remaster"]).issubset(dir_names):
-                return await self.find_manifest_in_dir(AsyncPath(dir, "remaster"))
-            return None
-
-        return await self.find_manifest_in_dir(nested_dirs[0])
+        workers = min(DISCOVERY_WORKERS, len(top_level_dirs))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mod_discovery") as executor:
+            futures = [executor.submit(self.walk_mod_dirs, [entry], levels_left)
+                       for entry in top_level_dirs]
+            for future in as_completed(futures):
+                yield from future.result()
 
-    async def get_dir_manifest_async(self, dir: str,) -> str:
-        top_level_dirs = []
-        async for path in AsyncPath(dir).glob("*"):
-            if await path.is_dir():
-                top_level_dirs.append(path)
-
-        search_results = await gather(*[self.find_manifest_in_dir(dir) for dir in top_level_dirs])
-
-        return [result for result in search_results if result is not None]
+    def get_dir_manifests(self, dir: str, nesting_levels: int = 3) -> list[str]:
+        return sorted(self.iter_dir_manifests(dir, nesting_levels))
 
     def get_existing_mods(self, mods_dir: str) -> list[str]:
         # self.logger.debug("Inside get_existing_mods")
@@ -440,8 +496,7 @@ class InstallationContext:
 
     async def get_existing_mods_async(self, mods_dir: str) -> list[str]:
         # self.logger.debug("Inside get_existing_mods async")
-        # mod_list = await self.get_dir_manifest_async(mods_dir)
-        mod_list = self.get_dir_manifests(mods_dir)
+        mod_list = await asyncio.to_thread(self.get_dir_manifests, mods_dir)
         # self.logger.debug("Finished get_dir_manifest")
         archive_dict = {}
         # async for entry in AsyncPath(mods_dir).glob("*.zip"):
@@ -483,15 +538,15 @@ class InstallationContext:
                                           f'{uncompressed:.1f} MB')
                     await loading_text.update_async()
                     await asyncio.sleep(0.01)
-                file_list = archive.filelist
-                manifests = [file for file in file_list
-                             if "manifest.yaml" in file.filename]
+                path_index = ArchivePathIndex(archive.filelist, archive_path)
+                self.archive_path_indexes[str(archive_path)] = path_index
+                manifests = path_index.find_files("manifest.yaml")
                 if manifests:
                     manifest_b = archive.read(manifests[0])
                     if manifest_b:
                         manifest = load_yaml(manifest_b)
-                        if Mod.validate_install_config(manifest, manifests[0].filename,
-                                                       archive_file_list=file_list,
+                        if Mod.validate_install_config(manifest, manifests[0],
+                                                       archive_file_list=path_index,
                                                        root_path=archive_path):
                             self.archived_manifests_cache[archive_path] = manifest
                             return manifest
@@ -520,17 +575,18 @@ class InstallationContext:
                                           f'{info.uncompressed/1024/1024:.1f} MB')
                     await loading_text.update_async()
                     await asyncio.sleep(0.01)
-                file_list = archive.files
-                manifests = [file for file in file_list
-                             if "manifest.yaml" in file.filename]
+                path_index = ArchivePathIndex(archive.files, archive_path)
+                self.archive_path_indexes[str(archive_path)] = path_index
+                manifests = path_index.find_files("manifest.yaml")
                 if manifests:
-                    manifests_read_dict = archive.read(targets=[manifests[0].filename])
+                    manifest_b = None
+                    manifests_read_dict = archive.read(targets=[manifests[0]])
                     if manifests_read_dict.values():
                         manifest_b = list(manifests_read_dict.values())[0]
                     if manifest_b:
                         manifest = load_yaml(manifest_b)
-                        if Mod.validate_install_config(manifest, manifests[0].filename,
-                                                       archive_file_list=file_list,
+                        if Mod.validate_install_config(manifest, manifests[0],
+                                                       archive_file_list=path_index,
                                                        root_path=archive_path):
                             self.archived_manifests_cache[archive_path] = manifest
                             return manifest
@@ -548,7 +604,6 @@ class InstallationContext:
             self.logger.debug("Logger already exists, will use it with existing settings")
         else:
             self.logger.handlers.clear()
-            self.logger.setLevel(logging.DEBUG)
             formatter = logging.Formatter('%(asctime)s: %(levelname)-7s - '
                                           '%(module)-11s - line %(lineno)-4d: %(message)s')
             stream_formatter = logging.Formatter('%(asctime)s: %(levelname)-7s - %(module)-11s'
@@ -563,6 +618,8 @@ class InstallationContext:
                 file_handler_level = logging.DEBUG
             else:
                 file_handler_level = logging.INFO
+            # debug records are only created when some handler can write them
+            self.logger.setLevel(file_handler_level)
 
             if not stream_only:
                 file_handler = logging.FileHandler(
@@ -831,6 +888,7 @@ class GameCopy:
         self.game_root_path = target_dir
         self.data_path = os.path.join(self.game_root_path, "data")
         self.installed_manifest_path = os.path.join(self.data_path, "mod_manifest.yaml")
+        self.install_checkpoint_path = os.path.join(self.data_path, "install_checkpoint.json")
 
         patched_version = (self.exe_version.startswith("ComRemaster")
                            or self.exe_version.startswith("ComPatch"))
@@ -950,15 +1008,23 @@ class GameCopy:
 
             self.installed_descriptions[content_piece] = description.strip()
 
-    async def change_config_values(self, key_value_pairs):
+    def get_changed_config(self, key_value_pairs):
         config = get_config(self.game_root_path)
         for key, value in key_value_pairs.items():
             current_value = config.attrib.get(key)
             if current_value is not None:
                 config.attrib[key] = str(value)
+        return config
+
+    async def change_config_values(self, key_value_pairs):
+        config = self.get_changed_config(key_value_pairs)
         await save_to_file_async(config,
                                  os.path.join(self.game_root_path, "data", "config.cfg"))
 
+    def change_config_values_sync(self, key_value_pairs):
+        config = self.get_changed_config(key_value_pairs)
+        save_to_file(config, os.path.join(self.game_root_path, "data", "config.cfg"))
+
     async def switch_windowed(self, enable=True):
         config = get_config(self.game_root_path)
         current_value = config.attrib.get("r_fullScreen")
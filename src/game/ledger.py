@@ -0,0 +1,327 @@
+'''
+Per-file install ledger, lets installed content be removed without reinstalling the game.
+For every file written by install the ledger keeps the content which was written, the layer
+(mod or base patch) which wrote it and the content which it replaced. Replaced contents are backed up
+to a blob store in the game copy, so uninstall touches only the files of the removed layer.
+
+Ledger is an SQLite database next to the install manifest, hashes are stored as raw sha256:
+
+    data/mod_ledger.sqlite
+        layers - name, install order and time
+        files  - path, layer, install order, size, hash, hash of the replaced content or NULL
+    commod_backup/blobs/ab/ab12...  - replaced contents by sha256
+
+Files of the same path form a stack ordered by install order, the content replaced by the layer
+is the content written by the layer below it, or the original game file for the bottom one.
+'''
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import typing
+from datetime import datetime
+from pathlib import Path
+
+from helpers import file_ops
+from helpers.errors import LayerNotInLedger
+
+if typing.TYPE_CHECKING:
+    from .environment import GameCopy
+
+logger = logging.getLogger('dem')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS layers (
+    name TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    installed TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    layer TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    prev_hash BLOB,
+    PRIMARY KEY (path, layer)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_by_layer ON files (layer);
+'''
+
+
+class UninstallResult:
+    __slots__ = ("name", "restored", "removed", "relinked", "kept", "errors", "duration")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.restored = []
+        self.removed = []
+        self.relinked = 0
+        self.kept = []
+        self.errors = []
+        self.duration = 0.0
+
+    def __bool__(self) -> bool:
+        return not self.errors
+
+    def __repr__(self) -> str:
+        return (f"UninstallResult({self.name!r}, restored={len(self.restored)}, removed={len(self.removed)}, "
+                f"relinked={self.relinked}, kept={len(self.kept)}, duration={self.duration:.1f}s)")
+
+    def report(self) -> dict:
+        return {"name": self.name,
+                "restored": self.restored,
+                "removed": self.removed,
+                "relinked": self.relinked,
+                "kept": self.kept,
+                "errors": self.errors,
+                "duration": round(self.duration, 2)}
+
+
+class InstallLedger:
+    '''Records the files of installs planned with CopyPlan and removes the recorded layers.
+    Install is recorded in two steps: begin before copy backs up the files which will be replaced,
+    commit after successful copy writes the records'''
+    FILE_NAME = "mod_ledger.sqlite"
+    BACKUP_DIR = "commod_backup"
+    # files added to copy plan without a layer are the files of base patch
+    DEFAULT_LAYER = "community_patch"
+
+    def __init__(self, game: GameCopy) -> None:
+        self.game = game
+        self.path = os.path.join(game.data_path, self.FILE_NAME)
+        self.backups = file_ops.BlobStore(os.path.join(game.game_root_path, self.BACKUP_DIR, "blobs"))
+        # records of the begun install: (file rows, relinked rows, detached rows, layer seqs)
+        self.pending = None
+
+    @contextlib.contextmanager
+    def transaction(self) -> typing.Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                connection.executescript(SCHEMA)
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    def get_relative_path(self, dest_path: str) -> str:
+        root = os.path.normcase(self.game.game_root_path)
+        return Path(os.path.relpath(os.path.normcase(dest_path), root)).as_posix()
+
+    @staticmethod
+    def get_stack(connection: sqlite3.Connection, relative_path: str) -> list[tuple]:
+        return connection.execute("SELECT layer, seq, prev_hash FROM files WHERE path = ? ORDER BY seq",
+                                  (relative_path,)).fetchall()
+
+    @staticmethod
+    def unlink(stack: list[tuple], removed: set[str]) -> tuple[bool, bytes | None, list[tuple]]:
+        '''Drops the removed layers from the stack of (layer, seq, prev_hash) ordered by seq.
+        Returns if the top of stack was removed, the content which becomes visible in this case,
+        and (prev_hash, seq) of the layers which now replace a different content'''
+        stack = [list(row) for row in stack]
+        top_removed = False
+        visible = None
+        relinks = {}
+        for index in reversed(range(len(stack))):
+            layer, _, prev_hash = stack[index]
+            if layer not in removed:
+                continue
+            if index == len(stack) - 1:
+                top_removed = True
+                visible = prev_hash
+            else:
+                upper = stack[index + 1]
+                upper[2] = prev_hash
+                relinks[upper[1]] = prev_hash
+            del stack[index]
+        return top_removed, visible, [(prev_hash, seq) for seq, prev_hash in relinks.items()]
+
+    def begin(self, plan: file_ops.CopyPlan, hash_cache: dict[str, str] | None = None,
+              checkpoint: file_ops.Checkpoint | None = None) -> bool:
+        '''Hashes the planned sources and backs up the game files they replace, called before copy.
+        Hash cache maps source path to the hash of its content and can be shared between plans
+        with the same sources. With loaded checkpoint of install the records are kept in it, so the resumed
+        install reuses the records of the first run instead of taking the partly copied files as replaced.
+        Ledger errors don't stop install, it's left unrecorded and False is returned'''
+        if checkpoint is not None and "ledger" in checkpoint.extra:
+            self.pending = self.decode_records(checkpoint.extra["ledger"])
+            logger.info("Install ledger records are resumed from checkpoint")
+            return True
+        try:
+            self.pending = self.get_records(plan, hash_cache)
+        except (OSError, sqlite3.Error) as ex:
+            logger.error(f"Install won't be recorded in ledger: {ex!r}")
+            self.pending = None
+            return False
+        if checkpoint is not None:
+            checkpoint.extra["ledger"] = self.encode_records(self.pending)
+            checkpoint.save()
+        return True
+
+    @staticmethod
+    def encode_records(records: tuple) -> dict:
+        rows, relinks, detached, layer_seqs = records
+        return {"rows": [[path, layer, seq, size, digest.hex(), prev_hash.hex() if prev_hash else None]
+                         for path, layer, seq, size, digest, prev_hash in rows],
+                "relinks": [[prev_hash.hex() if prev_hash else None, path, seq]
+                            for prev_hash, path, seq in relinks],
+                "detached": detached,
+                "layer_seqs": layer_seqs}
+
+    @staticmethod
+    def decode_records(encoded: dict) -> tuple:
+        rows = [(path, layer, seq, size, bytes.fromhex(digest),
+                 bytes.fromhex(prev_hash) if prev_hash else None)
+                for path, layer, seq, size, digest, prev_hash in encoded["rows"]]
+        relinks = [(bytes.fromhex(prev_hash) if prev_hash else None, path, seq)
+                   for prev_hash, path, seq in encoded["relinks"]]
+        detached = [tuple(row) for row in encoded["detached"]]
+        return rows, relinks, detached, encoded["layer_seqs"]
+
+    def get_records(self, plan: file_ops.CopyPlan, hash_cache: dict[str, str] | None = None) -> tuple:
+        '''Records of the planned files, layers which are installed again replace their previous records'''
+        start = time.perf_counter()
+        if hash_cache is None:
+            hash_cache = {}
+        layer_order = [layer or self.DEFAULT_LAYER for layer in plan.layer_order]
+        planned_layers = set(layer_order)
+        rows = []
+        relinks = []
+        detached = []
+        with self.transaction() as connection:
+            next_seq = (connection.execute("SELECT MAX(seq) FROM layers").fetchone()[0] or 0) + 1
+            layer_seqs = {layer: next_seq + index for index, layer in enumerate(dict.fromkeys(layer_order))}
+            for dest_key, layers in plan.layers.items():
+                relative_path = self.get_relative_path(plan.sources[dest_key][1])
+                stack = self.get_stack(connection, relative_path)
+                top_removed, prev_hash, path_relinks = self.unlink(stack, planned_layers)
+                relinks.extend((prev, relative_path, seq) for prev, seq in path_relinks)
+                detached.extend((relative_path, layer) for layer, _, _ in stack if layer in planned_layers)
+                if not top_removed:
+                    dest_path = plan.sources[dest_key][1]
+                    prev_hash = None
+                    if os.path.isfile(dest_path):
+                        prev_hash = bytes.fromhex(self.backups.put(dest_path))
+
+                for index, (layer, source_path) in enumerate(layers):
+                    layer = layer or self.DEFAULT_LAYER
+                    # content replaced by a later layer of the same install needs a backup too
+                    shadowed = index < len(layers) - 1
+                    digest = hash_cache.get(source_path)
+                    if digest is None or (shadowed and digest not in self.backups):
+                        digest = self.backups.put(source_path) if shadowed else self.hash_file(source_path)
+                        hash_cache[source_path] = digest
+                    size = os.path.getsize(source_path)
+                    if rows and rows[-1][0] == relative_path and rows[-1][1] == layer:
+                        # several sources of the same layer, only the last one is left in the game
+                        prev_hash = rows.pop()[5]
+                    content_hash = bytes.fromhex(digest)
+                    rows.append((relative_path, layer, layer_seqs[layer], size, content_hash, prev_hash))
+                    prev_hash = content_hash
+        logger.debug(f"Install ledger prepared {len(rows)} records of {len(layer_seqs)} layers "
+                     f"in {time.perf_counter() - start:.1f}s")
+        return rows, relinks, detached, layer_seqs
+
+    def commit(self) -> bool:
+        '''Writes the records of begun install, called after the copy has succeeded'''
+        if self.pending is None:
+            return False
+        rows, relinks, detached, layer_seqs = self.pending
+        self.pending = None
+        installed = datetime.now().isoformat(timespec="seconds")
+        try:
+            with self.transaction() as connection:
+                connection.executemany("DELETE FROM files WHERE path = ? AND layer = ?", detached)
+                connection.executemany("UPDATE files SET prev_hash = ? WHERE path = ? AND seq = ?", relinks)
+                connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+                connection.executemany("INSERT OR REPLACE INTO layers VALUES (?, ?, ?)",
+                                       [(layer, seq, installed) for layer, seq in layer_seqs.items()])
+        except sqlite3.Error as ex:
+            logger.error(f"Install ledger is not updated: {ex!r}")
+            return False
+        logger.info(f"Install ledger recorded {len(rows)} files of {list(layer_seqs)}")
+        return True
+
+    def get_layers(self) -> list[dict]:
+        '''Recorded layers in install order with their files count and size'''
+        with self.transaction() as connection:
+            return [{"name": name, "installed": installed, "files": files_count, "size": size or 0}
+                    for name, installed, files_count, size in connection.execute(
+                        "SELECT layers.name, layers.installed, COUNT(files.path), SUM(files.size) "
+                        "FROM layers LEFT JOIN files ON files.layer = layers.name "
+                        "GROUP BY layers.name ORDER BY layers.seq")]
+
+    def remove_empty_dirs(self, full_path: str) -> None:
+        path = os.path.dirname(full_path)
+        stop_paths = {os.path.normcase(self.game.data_path), os.path.normcase(self.game.game_root_path)}
+        while os.path.normcase(path) not in stop_paths and os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+            path = os.path.dirname(path)
+
+    def uninstall(self, name: str) -> UninstallResult:
+        '''Removes the files of the layer. Files where the layer is on top get back the content
+        it replaced, for files overwritten by the later layers only the records are relinked.
+        Files changed outside of ComMod since install are kept as is. Exe and config changes
+        of the layer are not reverted. Layer is removed from install manifest'''
+        start = time.perf_counter()
+        result = UninstallResult(name)
+        root = self.game.game_root_path
+        if not os.path.exists(self.path):
+            raise LayerNotInLedger(name)
+        with self.transaction() as connection:
+            rows = connection.execute("SELECT path, hash FROM files WHERE layer = ?", (name,)).fetchall()
+            if not rows:
+                raise LayerNotInLedger(name)
+            for relative_path, digest in rows:
+                stack = self.get_stack(connection, relative_path)
+                top_removed, visible, relinks = self.unlink(stack, {name})
+                connection.executemany("UPDATE files SET prev_hash = ? WHERE path = ? AND seq = ?",
+                                       [(prev, relative_path, seq) for prev, seq in relinks])
+                if not top_removed:
+                    result.relinked += 1
+                    continue
+
+                full_path = os.path.join(root, relative_path)
+                if os.path.isfile(full_path) and self.hash_file(full_path) != digest.hex():
+                    logger.warning(f"Keeping '{relative_path}', it was changed after install of {name}")
+                    result.kept.append(relative_path)
+                elif visible is None:
+                    if os.path.isfile(full_path):
+                        os.remove(full_path)
+                        self.remove_empty_dirs(full_path)
+                    result.removed.append(relative_path)
+                elif visible.hex() not in self.backups:
+                    logger.warning(f"Keeping '{relative_path}', backup of the replaced content is missing")
+                    result.kept.append(relative_path)
+                else:
+                    self.backups.restore(visible.hex(), full_path)
+                    result.restored.append(relative_path)
+            connection.execute("DELETE FROM files WHERE layer = ?", (name,))
+            connection.execute("DELETE FROM layers WHERE name = ?", (name,))
+            referenced = {prev_hash.hex() for prev_hash, in connection.execute(
+                "SELECT DISTINCT prev_hash FROM files WHERE prev_hash IS NOT NULL")}
+        # backups of the interrupted install are needed when it's resumed
+        interrupted = file_ops.Checkpoint.read(self.game.install_checkpoint_path) or {}
+        for row in interrupted.get("extra", {}).get("ledger", {}).get("rows", []):
+            if row[5] is not None:
+                referenced.add(row[5])
+        freed = self.backups.collect_garbage(referenced)
+
+        game = self.game
+        if name in game.installed_content:
+            game.installed_content = {content_name: entry for content_name, entry
+                                      in game.installed_content.items() if content_name != name}
+            if not file_ops.dump_yaml(game.installed_content, game.installed_manifest_path):
+                result.errors.append(f"Couldn't dump install manifest to '{game.installed_manifest_path}'!")
+        result.duration = time.perf_counter() - start
+        logger.info(f"Uninstalled: {result}, {freed} bytes of backups freed")
+        return result
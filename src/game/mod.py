@@ -15,13 +15,18 @@ from pathvalidate import sanitize_filename
 from py7zr import py7zr
 
 from console.color import bcolors, fconsole, remove_colors
-from helpers.file_ops import (copy_from_to, copy_from_to_async_fast,
-                              get_internal_file_path, process_markdown,
-                              read_yaml)
+from helpers.file_ops import (ArchivePathIndex, Checkpoint, CopyPlan,
+                              copy_from_to, copy_from_to_async_fast,
+                              get_internal_file_path, markdown_cache,
+                              read_yaml, read_yaml_header)
 from localisation.service import (COMPATCH_GITHUB, DEM_DISCORD, WIKI_COMPATCH,
                                   tr)
 
+from .compatibility import PASSED, Verdict
 from .data import get_known_mod_display_name, is_known_lang
+from .schema import (CONFIG_OPTIONS_SCHEMA, INSTALL_SETTINGS_SCHEMA,
+                     MANIFEST_SCHEMA, OPTIONAL_CONTENT_SCHEMA,
+                     PATCHER_OPTIONS_SCHEMA, PREREQ_SCHEMA, ValidationReport)
 
 logger = logging.getLogger('dem')
 
@@ -34,14 +39,49 @@ class GameInstallments(Enum):
     UNKNOWN = 4
 
 
+class ValidationTier(Enum):
+    '''Depth of mod manifest validation'''
+    STRUCTURAL = 1  # manifest is checked against schema, on discovery
+    FILES = 2  # mod data dirs are checked to exist, on demand
+    FILES_MISSING = 3  # files check failed, mod can't be installed
+
+
+SUPPORTED_IMG_EXTENSIONS = (".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp")
+# marks lazily loaded GUI fields which were not accessed yet
+NOT_LOADED = object()
+# parsed versions are interned, limit only protects from unbounded growth on malformed input
+VERSION_CACHE_SIZE = 4096
+
+
 class Mod:
     '''Mod for HTA/EM, contains mod data, installation instructions
        and related functions'''
+    __slots__ = (
+        # manifest info
+        "name", "installment", "display_name", "description", "language", "authors",
+        "version", "build", "id", "url", "trailer_url", "release_date", "tags",
+        "logo", "install_banner", "change_log", "other_info", "_screenshots",
+        "prerequisites", "incompatible", "strict_requirements", "vanilla_mod",
+        "requirements", "incompatibilities", "patcher_requirement",
+        "compatible_minor_versions", "compatible_patch_versions", "safe_reinstall_options",
+        "patcher_version_requirement", "patcher_options", "config_options",
+        "no_base_content", "optional_content", "options_dict",
+        "translations", "translations_loaded", "translations_headers", "compatibility_context",
+        "known_language", "lang_label",
+        "distribution_dir", "install_config", "validation_tier", "files_report",
+        # compatibility with the current session
+        "individual_require_status", "individual_incomp_status",
+        "requirements_style", "incompatibles_style",
+        "commod_compatible", "commod_compatible_err", "installment_compatible",
+        "compatible", "requirement_verdicts", "prevalidated", "incompatible_verdicts",
+        "is_reinstall", "can_be_reinstalled", "reinstall_verdict", "existing_version", "can_install",
+        # GUI only info, loaded on first access
+        "_change_log_content", "_other_info_content", "_logo_path", "_banner_path", "_screenshots_resolved")
+
     def __init__(self, yaml_config: dict, distribution_dir: str) -> None:
         try:
             self.vanilla_mod = False
-            self.name = \
-                yaml_config.get("name")[:64].replace("/", "").replace("\\", "").replace(".", "").strip()
+            self.name = Mod.normalise_name(yaml_config.get("name"))
 
             installment = yaml_config.get("installment")
             if installment is None:
@@ -83,7 +123,7 @@ class Mod:
             self.install_banner = yaml_config.get("install_banner")
             self.tags = yaml_config.get("tags")
             self.logo = yaml_config.get("logo")
-            self.screenshots = yaml_config.get("screenshots")
+            self._screenshots = yaml_config.get("screenshots")
             self.change_log = yaml_config.get("change_log")
             self.other_info = yaml_config.get("other_info")
             self.compatible_minor_versions = False
@@ -107,9 +147,9 @@ class Mod:
             if self.compatible_minor_versions:
                 self.compatible_patch_versions = True
                 if yaml_config.get("compatible_patch_versions") is not None:
-                    self.logger.debug(f"Warn for content '{self.name}': "
-                                      "when compatible_minor_versions is True, "
-                                      "compatible_patch_versions is automatically True. No need to specify.")
+                    logger.debug(f"Warn for content '{self.name}': "
+                                 "when compatible_minor_versions is True, "
+                                 "compatible_patch_versions is automatically True. No need to specify.")
             else:
                 compatible_patch_versions = yaml_config.get("compatible_patch_versions")
                 if compatible_patch_versions is not None:
@@ -141,12 +181,12 @@ class Mod:
 
             self.individual_require_status = []
             self.individual_incomp_status = []
-            self.requirements_style = "mixed"
-            self.incompatibles_style = "mixed"
 
             translations = yaml_config.get("translations")
             self.translations = {}
             self.translations_loaded = {}
+            self.translations_headers = {}
+            self.compatibility_context = {}
             if translations is not None:
                 for translation in translations:
                     self.translations[translation] = is_known_lang(translation)
@@ -158,12 +198,12 @@ class Mod:
                 self.tags = [Mod.Tags.UNCATEGORIZED.name]
             else:
                 # removing unknown values
-                self.tags = list(set([tag.upper() for tag in self.tags]) & set(Mod.Tags.list_names()))
+                self.tags = Mod.normalise_tags(self.tags)
 
-            if self.screenshots is None:
-                self.screenshots = []
-            elif isinstance(self.screenshots, list):
-                for screenshot in self.screenshots:
+            if self._screenshots is None:
+                self._screenshots = []
+            elif isinstance(self._screenshots, list):
+                for screenshot in self._screenshots:
                     if not isinstance(screenshot.get("img"), str):
                         next
 
@@ -214,6 +254,8 @@ class Mod:
 
             if not self.prerequisites:
                 self.vanilla_mod = True
+            self.requirements = [Mod.Constraint(prereq) for prereq in self.prerequisites]
+            self.requirements_style = Mod.Constraint.get_common_style(self.requirements)
 
             if self.incompatible is None:
                 self.incompatible = []
@@ -223,6 +265,8 @@ class Mod:
                         incomp["name"] = [incomp["name"]]
                     if isinstance(incomp.get("versions"), str):
                         incomp["versions"] = [incomp["versions"]]
+            self.incompatibilities = [Mod.Incompatibility(incomp) for incomp in self.incompatible]
+            self.incompatibles_style = Mod.Constraint.get_common_style(self.incompatibilities)
 
             patcher_version_requirement = yaml_config.get("patcher_version_requirement")
             if patcher_version_requirement is None:
@@ -231,11 +275,22 @@ class Mod:
                 self.patcher_version_requirement = [str(patcher_version_requirement)]
             else:
                 self.patcher_version_requirement = [str(ver) for ver in patcher_version_requirement]
+            # default operation for mod manager version is ">="
+            self.patcher_requirement = [Mod.Constraint.parse_version(version, operator.ge)
+                                        for version in self.patcher_version_requirement]
 
             self.patcher_options = yaml_config.get("patcher_options")
             self.config_options = yaml_config.get("config_options")
 
             self.distribution_dir = str(distribution_dir)
+            self.install_config = yaml_config
+            self.validation_tier = ValidationTier.STRUCTURAL
+            self.files_report = None
+            self._change_log_content = NOT_LOADED
+            self._other_info_content = NOT_LOADED
+            self._logo_path = NOT_LOADED
+            self._banner_path = NOT_LOADED
+            self._screenshots_resolved = NOT_LOADED
             self.options_dict = {}
             self.no_base_content = False
 
@@ -275,155 +330,263 @@ class Mod:
             # logger.error(er_message)
             raise ValueError(er_message)
 
+    TRANSLATION_HEADER_KEYS = frozenset({"name", "version", "language", "installment", "tags"})
+
+    @staticmethod
+    def normalise_name(name: str) -> str:
+        return name[:64].replace("/", "").replace("\\", "").replace(".", "").strip()
+
+    @staticmethod
+    def normalise_tags(tags: list[str]) -> list[str]:
+        # removing unknown values
+        return list(set([tag.upper() for tag in tags]) & set(Mod.Tags.list_names()))
+
+    @staticmethod
+    def get_lang_label(lang: str) -> str:
+        return tr(lang) if is_known_lang(lang) else lang
+
+    @staticmethod
+    def read_translation_header(lang_manifest_path: Path) -> dict:
+        '''Reads only the info needed to check translation consistency, without loading the whole manifest'''
+        header = read_yaml_header(lang_manifest_path, Mod.TRANSLATION_HEADER_KEYS)
+        if header is None or not isinstance(header.get("name"), str) or header.get("version") is None:
+            raise ValueError("Broken translation manifest, can't read name and version: "
+                             f"{lang_manifest_path}")
+
+        tags = header.get("tags")
+        installment = header.get("installment")
+        language = header.get("language")
+        return {"name": Mod.normalise_name(header["name"]),
+                "version": str(header["version"])[:64].strip(),
+                "language": "ru" if language is None else str(language),
+                "installment": "exmachina" if installment is None else str(installment).strip().lower(),
+                "tags": ([Mod.Tags.UNCATEGORIZED.name] if not isinstance(tags, list)
+                         else Mod.normalise_tags([str(tag) for tag in tags]))}
+
+    def check_translation(self, lang: str, header: dict) -> None:
+        '''Raises ValueError if translation doesn't match the main mod'''
+        if header["name"] != self.name:
+            raise ValueError("Service name mismatch in translation: "
+                             f"'{header['name']}' name specified for translation, "
+                             f"but main mod name is '{self.name}'! "
+                             f"(Mod: {self.name}) (Translation: {header['language']})")
+        if header["version"] != self.version:
+            raise ValueError("Version mismatch: "
+                             f"'{header['version']}' specified for translation, "
+                             f"but main mod version is '{self.version}'! "
+                             f"(Mod: {self.name}) (Translation: {header['language']})")
+        if sorted(header["tags"]) != sorted(self.tags):
+            raise ValueError("Tags mismatch: "
+                             f"{header['tags']} specified for translation, "
+                             f"but main mod tags are {self.tags}! "
+                             f"(Mod: {self.name}) (Translation: {header['language']})")
+        if header["language"] != lang:
+            raise ValueError("Language mismatch for translation manifest name and info: "
+                             f"{header['language']} in manifest, {lang} in manifest name! "
+                             f"(Mod: {self.name})")
+        if header["language"] == self.language:
+            raise ValueError("Language duplication for translation manifest: "
+                             f"{lang} in manifest, but {lang} is main lang already! "
+                             f"(Mod: {self.name})")
+        if header["installment"] != self.installment:
+            raise ValueError("Game mismatch for translation manifest and the main mod: "
+                             f"{header['installment']} in translation, {self.installment} "
+                             f"in manifest name! (Mod: {self.name})")
+
     def load_translations(self, load_gui_info: bool = False):
+        '''Checks translations against the main mod using only manifest headers,
+           full translation is loaded on first request by get_translation'''
         self.translations_loaded[self.language] = self
+        self.known_language = is_known_lang(self.language)
+        self.lang_label = Mod.get_lang_label(self.language)
         if load_gui_info:
             self.load_gui_info()
         if self.translations:
-            for lang, _ in self.translations.items():
+            for lang in self.translations:
                 lang_manifest_path = Path(self.distribution_dir, f"manifest_{lang}.yaml")
                 if not lang_manifest_path.exists():
                     raise ValueError(f"Lang '{lang}' specified but manifest for it is missing! "
                                      f"(Mod: {self.name})")
-                yaml_config = read_yaml(lang_manifest_path)
-                config_validated = Mod.validate_install_config(yaml_config, lang_manifest_path)
-                if config_validated:
-                    mod_tr = Mod(yaml_config, self.distribution_dir)
-                    if mod_tr.name != self.name:
-                        raise ValueError("Service name mismatch in translation: "
-                                         f"'{mod_tr.name}' name specified for translation, "
-                                         f"but main mod name is '{self.name}'! "
-                                         f"(Mod: {self.name}) (Translation: {mod_tr.language})")
-                    if mod_tr.version != self.version:
-                        raise ValueError("Version mismatch: "
-                                         f"'{mod_tr.version}' specified for translation, "
-                                         f"but main mod version is '{self.version}'! "
-                                         f"(Mod: {self.name}) (Translation: {mod_tr.language})")
-                    if sorted(mod_tr.tags) != sorted(self.tags):
-                        raise ValueError("Tags mismatch: "
-                                         f"{mod_tr.tags} specified for translation, "
-                                         f"but main mod tags are {self.tags}! "
-                                         f"(Mod: {self.name}) (Translation: {mod_tr.language})")
-                    if mod_tr.language != lang:
-                        raise ValueError("Language mismatch for translation manifest name and info: "
-                                         f"{mod_tr.language} in manifest, {lang} in manifest name! "
-                                         f"(Mod: {self.name})")
-                    if mod_tr.language == self.language:
-                        raise ValueError("Language duplication for translation manifest: "
-                                         f"{lang} in manifest, but {lang} is main lang already! "
-                                         f"(Mod: {self.name})")
-                    if mod_tr.installment != self.installment:
-                        raise ValueError("Game mismatch for translation manifest and the main mod: "
-                                         f"{mod_tr.installment} in translation, {self.installment} "
-                                         f"in manifest name! (Mod: {self.name})")
-
-                    self.translations_loaded[lang] = mod_tr
-                    if load_gui_info:
-                        mod_tr.load_gui_info()
-
-        for lang, mod in self.translations_loaded.items():
-            mod.known_language = is_known_lang(lang)
-            if mod.known_language:
-                mod.lang_label = tr(lang)
-            else:
-                mod.lang_label = lang
-
-    def load_gui_info(self):
-        supported_img_extensions = [".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"]
-        self.change_log_content = ""
-        if self.change_log:
-            changelog_path = Path(self.distribution_dir, self.change_log)
-            if changelog_path.exists() and changelog_path.suffix.lower() == ".md":
-                with open(changelog_path, "r", encoding="utf-8") as fh:
-                    md = fh.read()
-                    md = process_markdown(md)
-                    self.change_log_content = md
-
-        self.other_info_content = ""
-        if self.other_info:
-            other_info_path = Path(self.distribution_dir, self.other_info)
-            if other_info_path.exists() and other_info_path.suffix.lower() == ".md":
-                with open(other_info_path, "r", encoding="utf-8") as fh:
-                    md = fh.read()
-                    md = process_markdown(md)
-                    self.other_info_content = md
-
-        self.logo_path = get_internal_file_path("assets/no_logo.png")
-        if isinstance(self.logo, str):
-            logo_path = Path(self.distribution_dir, self.logo)
-            if logo_path.exists() and logo_path.suffix.lower() in supported_img_extensions:
-                self.logo_path = str(logo_path)
-
-        self.banner_path = None
-        if isinstance(self.install_banner, str):
-            banner_path = Path(self.distribution_dir, self.install_banner)
-            if banner_path.exists() and banner_path.suffix.lower() in supported_img_extensions:
-                self.banner_path = str(banner_path)
-
-        for screen in self.screenshots:
-            screen_path = Path(self.distribution_dir, screen["img"])
-            if screen_path.exists() and screen_path.suffix.lower() in supported_img_extensions:
-                screen["path"] = str(screen_path)
-            else:
-                screen["path"] = ""
-                logger.warning(f"Missing path for screenshot ({screen['img']}) "
-                               f"in mod {self.name}-{self.language}")
-
-            compare_path = Path(self.distribution_dir, screen["compare"])
-            if compare_path.exists() and compare_path.suffix.lower() in supported_img_extensions:
-                screen["compare_path"] = str(compare_path)
-                if screen["text"]:
-                    screen["text"] += "\n"
-                screen["text"] = screen["text"] + f'({tr("click_screen_to_compare")})'
-            else:
-                screen["compare_path"] = ""
+                header = Mod.read_translation_header(lang_manifest_path)
+                self.check_translation(lang, header)
+                self.translations_headers[lang] = header
+
+    @property
+    def languages(self) -> list[str]:
+        '''Main language followed by all the translations which passed the header check'''
+        return [self.language, *self.translations_headers]
+
+    def get_translation(self, lang: str) -> Mod | None:
+        '''Returns translation of mod, loading and validating its manifest on first request.
+           Broken translations are logged and excluded from the available languages'''
+        translation = self.translations_loaded.get(lang)
+        if translation is not None or lang not in self.translations_headers:
+            return translation
+
+        lang_manifest_path = Path(self.distribution_dir, f"manifest_{lang}.yaml")
+        try:
+            yaml_config = read_yaml(lang_manifest_path)
+            validation_report = Mod.validate_install_config(yaml_config, lang_manifest_path,
+                                                            check_files=False)
+            if not validation_report:
+                raise ValueError(f"Translation manifest is not valid: {lang_manifest_path}")
+            translation = Mod(yaml_config, self.distribution_dir)
+            self.check_translation(lang, {"name": translation.name,
+                                          "version": translation.version,
+                                          "language": translation.language,
+                                          "installment": translation.installment,
+                                          "tags": translation.tags})
+        except Exception as ex:
+            logger.error(f"Unable to load translation '{lang}' for mod '{self.name}': {ex}")
+            self.translations_headers.pop(lang, None)
+            return None
 
-        # we ignore screens which do not exist
-        self.screenshots = [screen for screen in self.screenshots if screen["path"]]
+        translation.known_language = is_known_lang(lang)
+        translation.lang_label = Mod.get_lang_label(lang)
+        self.translations_loaded[lang] = translation
 
-        if ", " in self.authors:
-            self.developer_title = "authors"
-        else:
-            self.developer_title = "author"
+        if "commod_version" in self.compatibility_context:
+            self.load_commod_compatibility(self.compatibility_context["commod_version"], [translation])
+        if "game_installment" in self.compatibility_context:
+            self.load_game_compatibility(self.compatibility_context["game_installment"], [translation])
+        if "session" in self.compatibility_context:
+            self.load_session_compatibility(*self.compatibility_context["session"], [translation])
+        return translation
 
-    def load_commod_compatibility(self, commod_version):
-        for translation in self.translations_loaded.values():
+    def load_gui_info(self):
+        '''Prefetches all the info used only by GUI, normally it's loaded on first access'''
+        return (self.change_log_content, self.other_info_content,
+                self.logo_path, self.banner_path, self.screenshots)
+
+    def read_markdown(self, md_path: str) -> str:
+        if md_path:
+            full_path = Path(self.distribution_dir, md_path)
+            if full_path.suffix.lower() == ".md" and full_path.exists():
+                with open(full_path, "r", encoding="utf-8") as fh:
+                    return markdown_cache.process(fh.read())
+        return ""
+
+    def resolve_image(self, img_path: str) -> str | None:
+        if isinstance(img_path, str) and img_path:
+            full_path = Path(self.distribution_dir, img_path)
+            if full_path.suffix.lower() in SUPPORTED_IMG_EXTENSIONS and full_path.exists():
+                return str(full_path)
+        return None
+
+    @property
+    def change_log_content(self) -> str:
+        if self._change_log_content is NOT_LOADED:
+            self._change_log_content = self.read_markdown(self.change_log)
+        return self._change_log_content
+
+    @property
+    def other_info_content(self) -> str:
+        if self._other_info_content is NOT_LOADED:
+            self._other_info_content = self.read_markdown(self.other_info)
+        return self._other_info_content
+
+    @property
+    def logo_path(self) -> str:
+        if self._logo_path is NOT_LOADED:
+            self._logo_path = self.resolve_image(self.logo) or get_internal_file_path("assets/no_logo.png")
+        return self._logo_path
+
+    @property
+    def banner_path(self) -> str | None:
+        if self._banner_path is NOT_LOADED:
+            self._banner_path = self.resolve_image(self.install_banner)
+        return self._banner_path
+
+    @property
+    def screenshots(self) -> list[dict]:
+        '''Screenshots with resolved paths, screenshots which do not exist are ignored'''
+        if self._screenshots_resolved is NOT_LOADED:
+            resolved = []
+            for screen in self._screenshots:
+                screen_path = self.resolve_image(screen["img"])
+                if screen_path is None:
+                    logger.warning(f"Missing path for screenshot ({screen['img']}) "
+                                   f"in mod {self.name}-{self.language}")
+                    continue
+                text = screen["text"]
+                compare_path = self.resolve_image(screen["compare"])
+                if compare_path is not None:
+                    if text:
+                        text += "\n"
+                    text += f'({tr("click_screen_to_compare")})'
+                resolved.append({**screen,
+                                 "path": screen_path,
+                                 "compare_path": compare_path or "",
+                                 "text": text})
+            self._screenshots_resolved = resolved
+        return self._screenshots_resolved
+
+    @property
+    def developer_title(self) -> str:
+        return "authors" if ", " in self.authors else "author"
+
+    # compatibility is stored in context to be applied to translations which are loaded later
+    def load_commod_compatibility(self, commod_version, translations: list[Mod] | None = None):
+        if translations is None:
+            self.compatibility_context["commod_version"] = commod_version
+            translations = self.translations_loaded.values()
+        for translation in translations:
             translation.commod_compatible, translation.commod_compatible_err = \
                 translation.compatible_with_mod_manager(commod_version)
             translation.commod_compatible_err = remove_colors(translation.commod_compatible_err)
 
-    def load_game_compatibility(self, game_installment):
-        for translation in self.translations_loaded.values():
+    def load_game_compatibility(self, game_installment, translations: list[Mod] | None = None):
+        if translations is None:
+            self.compatibility_context["game_installment"] = game_installment
+            translations = self.translations_loaded.values()
+        for translation in translations:
             translation.installment_compatible = self.installment == game_installment
 
-    def load_session_compatibility(self, installed_content, installed_descriptions):
-        for translation in self.translations_loaded.values():
+    def load_session_compatibility(self, installed_content, installed_descriptions,
+                                   translations: list[Mod] | None = None):
+        if translations is None:
+            self.compatibility_context["session"] = (installed_content, installed_descriptions)
+            translations = self.translations_loaded.values()
+        for translation in translations:
 
-            translation.compatible, translation.compatible_err = \
+            translation.compatible, translation.requirement_verdicts = \
                 translation.check_requirements(
                     installed_content,
                     installed_descriptions)
 
-            translation.compatible_err = "\n".join(translation.compatible_err).strip()
-
-            translation.prevalidated, translation.prevalidated_err = \
+            translation.prevalidated, translation.incompatible_verdicts = \
                 translation.check_incompatibles(
                     installed_content,
                     installed_descriptions)
 
-            translation.prevalidated_err = "\n".join(translation.prevalidated_err).strip()
-
             (translation.is_reinstall, translation.can_be_reinstalled,
-             translation.reinstall_warning, translation.existing_version) = \
+             translation.reinstall_verdict, translation.existing_version) = \
                 translation.check_reinstallability(
                     installed_content,
                     installed_descriptions)
 
-            translation.can_install = (translation.commod_compatible
-                                       and translation.installment_compatible
-                                       and translation.compatible
-                                       and translation.prevalidated
-                                       and translation.can_be_reinstalled)
+            translation.update_can_install()
+
+    # error texts are rendered from verdicts only when shown
+    @property
+    def compatible_err(self) -> str:
+        return "\n".join(Verdict.render_all(self.requirement_verdicts)).strip()
+
+    @property
+    def prevalidated_err(self) -> str:
+        return "\n".join(Verdict.render_all(self.incompatible_verdicts)).strip()
+
+    @property
+    def reinstall_warning(self) -> str:
+        return self.reinstall_verdict.text
+
+    def update_can_install(self):
+        self.can_install = (self.commod_compatible
+                            and self.installment_compatible
+                            and self.compatible
+                            and self.prevalidated
+                            and self.can_be_reinstalled
+                            and self.validation_tier != ValidationTier.FILES_MISSING)
 
     def install(self, game_data_path: str,
                 install_settings: dict,
@@ -476,17 +639,73 @@ class Mod:
                 copy_from_to(mod_files, game_data_path, console)
                 return True, []
             else:
-                return False, error_msgs
+                return False, Verdict.render_all(error_msgs)
         except Exception as ex:
             logger.error(ex)
             return False, []
 
+    def get_install_sources(self, install_settings: dict) -> list[str]:
+        '''Directories which will be copied to game data by install, in the order of copying'''
+        sources = []
+        install_base = install_settings.get("base")
+        if install_base is None:
+            raise KeyError(f"Installation config for base of mod '{self.name}' is broken")
+        elif install_base != "skip":
+            sources.append(os.path.join(self.distribution_dir, "data"))
+        for install_setting, installation_decision in install_settings.items():
+            if install_setting == "base" or installation_decision == "skip":
+                continue
+            option_name = self.options_dict[install_setting].name
+            sources.append(os.path.join(self.distribution_dir, option_name, "data"))
+            if installation_decision != "yes":
+                sources.append(os.path.join(self.distribution_dir, option_name,
+                                            installation_decision, "data"))
+        return sources
+
+    def plan_install(self, game_data_path: str, install_settings: dict,
+                     plan: CopyPlan | None = None) -> CopyPlan:
+        '''Dry run of install: files and bytes to write, overwritten files and free space check'''
+        if plan is None:
+            plan = CopyPlan()
+        plan.add(self.get_install_sources(install_settings), game_data_path, self.name)
+        logger.debug(f"Install plan for {self.name}: {plan}")
+        return plan
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        return tr("size_megabytes", size=f"{size / 1024 / 1024:.1f}")
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        minutes, seconds = divmod(max(1, round(seconds)), 60)
+        if minutes:
+            return tr("duration_minutes", minutes=minutes, seconds=seconds)
+        return tr("duration_seconds", seconds=seconds)
+
+    @staticmethod
+    def describe_install_plan(plan: CopyPlan) -> tuple[str, str]:
+        '''Returns localised estimate and the error if install doesn't fit on the game volume'''
+        estimate = tr("install_estimate",
+                      files_count=plan.files_count,
+                      write_size=Mod.format_size(plan.bytes_to_write),
+                      overwritten_count=plan.files_overwritten,
+                      new_dirs=len(plan.new_dirs),
+                      duration=Mod.format_duration(plan.duration))
+        space_error = ""
+        if not plan.fits:
+            space_error = tr("not_enough_disk_space",
+                             required_size=Mod.format_size(plan.required_space),
+                             free_size=Mod.format_size(plan.free_space))
+        return estimate, space_error
+
     async def install_async(self, game_data_path: str,
                             install_settings: dict,
                             existing_content: dict,
                             callback_progbar: Awaitable,
-                            callback_status: Awaitable):
-        '''Uses fast async copy, returns bool success status of install'''
+                            callback_status: Awaitable,
+                            checkpoint: Checkpoint | None = None):
+        '''Uses fast async copy, returns bool success status of install.
+        Files which are done according to the loaded checkpoint are not copied again'''
         try:
             logger.info(f"Existing content at the start of install: {existing_content}")
             mod_files = []
@@ -500,7 +719,7 @@ class Mod:
                 await callback_status(tr("copying_base_files_please_wait"))
                 mod_files.append(base_path)
                 start = datetime.now()
-                await copy_from_to_async_fast(mod_files, game_data_path, callback_progbar)
+                await copy_from_to_async_fast(mod_files, game_data_path, callback_progbar, checkpoint)
                 end = datetime.now()
                 logger.debug(f"{(end - start).microseconds / 1000000} seconds took fast copy")
                 mod_files.clear()
@@ -530,7 +749,7 @@ class Mod:
                         await callback_status(tr("copying_options_please_wait"))
 
                 start = datetime.now()
-                await copy_from_to_async_fast(mod_files, game_data_path, callback_progbar)
+                await copy_from_to_async_fast(mod_files, game_data_path, callback_progbar, checkpoint)
                 end = datetime.now()
                 logger.debug(f"{(end - start).microseconds / 1000000} seconds took fast copy")
 
@@ -540,38 +759,50 @@ class Mod:
             logger.error(ex)
             return False
 
-    def check_requirement(self, prereq: dict, existing_content: dict,
+    def check_requirement(self, prereq: dict, constraint: Mod.Constraint, existing_content: dict,
                           existing_content_descriptions: dict,
-                          is_compatch_env: bool) -> tuple[bool, str]:
-        error_msg = []
-        required_mod_name = None
-
-        name_validated = True
+                          is_compatch_env: bool) -> Verdict:
+        '''Only finds the facts, messages are rendered by render_requirement when they are needed'''
+        required_mod_name = constraint.find_installed(existing_content)
+        name_validated = required_mod_name is not None
         version_validated = True
-        optional_content_validated = True
-
-        for possible_prereq_mod in prereq['name']:
-            existing_mod = existing_content.get(possible_prereq_mod)
-            if existing_mod is not None:
-                required_mod_name = possible_prereq_mod
-
-        if required_mod_name is None:
-            name_validated = False
+        missing_options = ()
 
         # if trying to install compatch-only mod on comrem
-        if (required_mod_name == "community_patch"
-           and existing_content.get("community_remaster") is not None
-           and self.name != "community_remaster"
-           and "community_remaster" not in prereq["name"]):
+        compatch_on_comrem = (required_mod_name == "community_patch"
+                              and "community_remaster" in existing_content
+                              and self.name != "community_remaster"
+                              and "community_remaster" not in constraint.name_set)
+        if compatch_on_comrem:
             name_validated = False
-            error_msg.append(f"{tr('compatch_mod_incompatible_with_comrem')}")
 
+        if name_validated and constraint.versions:
+            version_validated = constraint.versions_match(existing_content[required_mod_name]["version"])
+
+        if name_validated and version_validated and constraint.options:
+            missing_options = constraint.missing_options(existing_content[required_mod_name])
+            if logger.isEnabledFor(logging.DEBUG):
+                for option in constraint.options:
+                    if option not in missing_options:
+                        logger.debug(f"   PASS: content requirement met: {option} "
+                                     f"- of required mod: {required_mod_name}")
+
+        return Verdict(name_validated and version_validated and not missing_options,
+                       Mod.render_requirement,
+                       prereq=prereq, existing_content=existing_content,
+                       existing_content_descriptions=existing_content_descriptions,
+                       is_compatch_env=is_compatch_env, required_mod_name=required_mod_name,
+                       name_validated=name_validated, compatch_on_comrem=compatch_on_comrem,
+                       missing_options=missing_options)
+
+    @staticmethod
+    def get_name_label(names: list[str], existing_content: dict) -> tuple[str, bool]:
+        '''Display names of content joined by "or" and whether only technical name was available for any'''
         or_word = f" {tr('or')} "
-        and_word = f" {tr('and')} "
         only_technical_name_available = False
 
         name_label = []
-        for service_name in prereq["name"]:
+        for service_name in names:
             existing_mod = existing_content.get(service_name)
             if existing_mod is not None:
                 name_label.append(existing_mod["display_name"])
@@ -582,83 +813,39 @@ class Mod:
                     only_technical_name_available = True
                 else:
                     name_label.append(known_name)
+        return or_word.join(name_label), only_technical_name_available
 
-        name_label = or_word.join(name_label)
+    @staticmethod
+    def render_requirement(verdict: Verdict) -> tuple[str, list[str]]:
+        facts = verdict.facts
+        prereq = facts["prereq"]
+        required_mod_name = facts["required_mod_name"]
+        existing_content_descriptions = facts["existing_content_descriptions"]
+        error_msg = []
+        if facts["compatch_on_comrem"]:
+            error_msg.append(f"{tr('compatch_mod_incompatible_with_comrem')}")
+
+        and_word = f" {tr('and')} "
+        name_label, only_technical_name_available = Mod.get_name_label(prereq["name"],
+                                                                       facts["existing_content"])
         version_label = ""
         optional_content_label = ""
 
-        prereq_versions = prereq.get("versions")
-        if prereq_versions and prereq_versions is not None:
+        if prereq.get("versions"):
             version_label = (f', {tr("of_version")}: '
                              f'{and_word.join(prereq.get("versions"))}')
-            if name_validated:
-                compare_ops = set([])
-                for version in prereq_versions:
-                    if ">=" == version[:2]:
-                        compare_operation = operator.ge
-                    elif "<=" == version[:2]:
-                        compare_operation = operator.le
-                    elif ">" == version[:1]:
-                        compare_operation = operator.gt
-                    elif "<" == version[:1]:
-                        compare_operation = operator.lt
-                    else:  # default "version" treated the same as "==version":
-                        compare_operation = operator.eq
-
-                    for sign in (">", "<", "="):
-                        version = version.replace(sign, '')
-
-                    installed_version = existing_content[required_mod_name]["version"]
-                    parsed_existing_ver = Mod.Version(installed_version)
-                    parsed_required_ver = Mod.Version(version)
-
-                    version_validated = compare_operation(parsed_existing_ver, parsed_required_ver)
-                    compare_ops.add(compare_operation)
-                    if compare_operation is operator.eq:
-                        if parsed_required_ver.identifier:
-                            if parsed_existing_ver.identifier != parsed_required_ver.identifier:
-                                version_validated = False
-
-                compare_ops = list(compare_ops)
-                len_ops = len(compare_ops)
-                if len_ops == 1 and operator.eq in compare_ops:
-                    self.requirements_style = "strict"
-                elif len_ops == 2 and operator.eq not in compare_ops:
-                    if (compare_ops[0] in (operator.ge, operator.gt)
-                       and compare_ops[1] in (operator.le, operator.lt)):
-                        self.requirements_style = "range"
-                    elif (compare_ops[0] in (operator.lt, operator.lt)
-                          and compare_ops[1] in (operator.ge, operator.gt)):
-                        self.requirements_style = "range"
-                    else:
-                        self.requirements_style = "mixed"
-                else:
-                    self.requirements_style = "mixed"
 
-        optional_content = prereq.get("optional_content")
-        if optional_content and optional_content is not None:
+        if prereq.get("optional_content"):
             optional_content_label = (f', {tr("including_options").lower()}: '
                                       f'{", ".join(prereq["optional_content"])}')
-            if name_validated and version_validated:
-                for option in optional_content:
-                    if existing_content[required_mod_name].get(option) in [None, "skip"]:
-                        optional_content_validated = False
-                        requirement_err = f"{tr('content_requirement_not_met')}:"
-                        requirement_name = (f"  * '{option}' {tr('for_mod')} "
-                                            f"{name_label}")
-
-                        if requirement_err not in error_msg:
-                            error_msg.append(requirement_err)
-
-                        error_msg.append(requirement_name)
-                    else:
-                        logger.info(f"   PASS: content requirement met: {option} "
-                                    f"- of required mod: {name_label}")
-
-        validated = name_validated and version_validated and optional_content_validated
-
-        if not validated:
-            if not name_validated:
+            for option in facts["missing_options"]:
+                requirement_err = f"{tr('content_requirement_not_met')}:"
+                if requirement_err not in error_msg:
+                    error_msg.append(requirement_err)
+                error_msg.append(f"  * '{option}' {tr('for_mod')} {name_label}")
+
+        if not verdict.ok:
+            if not facts["name_validated"]:
                 warning = f'\n{tr("required_mod_not_found")}:'
             else:
                 warning = f'\n{tr("required_base")}:'
@@ -683,70 +870,70 @@ class Mod:
             else:
                 # in case when we working with compatched game but mod requires comrem
                 # it would be nice to tip a user that this is incompatibility in itself
-                if is_compatch_env and "community_remaster" in prereq["name"]:
+                if facts["is_compatch_env"] and "community_remaster" in prereq["name"]:
                     installed_description = existing_content_descriptions.get("community_patch")
                     error_msg_entry = (f'\n{tr("version_available").capitalize()}:\n'
                                        f'{remove_colors(installed_description)}')
                     if error_msg_entry not in error_msg:
                         error_msg.append(error_msg_entry)
-        prereq["name_label"] = name_label
-        prereq["mention_versions"] = True
-        return validated, error_msg
+        return name_label, error_msg
 
     def check_requirements(self, existing_content: dict, existing_content_descriptions: dict,
-                           patcher_version: str | float = '') -> tuple[bool, list]:
-        error_msg = []
+                           patcher_version: str | float = '') -> tuple[bool, list[Verdict]]:
+        '''Returns whether requirements are met and verdicts which messages form the error text'''
+        error_verdicts = []
 
         requirements_met = True
-        is_compatch_env = ("community_remaster" not in existing_content.keys() and
-                           "community_patch" in existing_content.keys())
+        is_compatch_env = ("community_remaster" not in existing_content and
+                           "community_patch" in existing_content)
 
         if patcher_version:
-            if not self.compatible_with_mod_manager(patcher_version):
+            compatible_with_commod, _ = self.compatible_with_mod_manager(patcher_version)
+            if not compatible_with_commod:
                 requirements_met &= False
-                error_msg.append(f"{tr('usupported_patcher_version')}: "
-                                 f"{self.display_name} - {self.patcher_version_requirement}"
-                                 f" > {patcher_version}")
+                error_verdicts.append(Verdict(False, lines=[
+                    f"{tr('usupported_patcher_version')}: "
+                    f"{self.display_name} - {self.patcher_version_requirement}"
+                    f" > {patcher_version}"]))
 
         self.individual_require_status.clear()
-        for prereq in self.prerequisites:
+        for prereq, constraint in zip(self.prerequisites, self.requirements):
             if self.name == "community_remaster" and prereq["name"][0] == "community_patch":
                 continue
 
-            validated, mod_error = self.check_requirement(prereq,
-                                                          existing_content, existing_content_descriptions,
-                                                          is_compatch_env)
-            self.individual_require_status.append((prereq, validated, mod_error))
-            if mod_error:
-                error_msg.extend(mod_error)
-            requirements_met &= validated
+            verdict = self.check_requirement(prereq, constraint,
+                                             existing_content, existing_content_descriptions,
+                                             is_compatch_env)
+            self.individual_require_status.append((prereq, verdict))
+            if not verdict:
+                error_verdicts.append(verdict)
+            requirements_met &= verdict.ok
 
         if requirements_met:
             if self.strict_requirements:
                 # we will handle more complex case in check_incompatibles
                 if self.vanilla_mod:
-                    fake_req = {"name_label": f"{tr('clean').capitalize()} " + tr(self.installment),
-                                "mention_versions": False
-                                }
-                    if set(existing_content.keys()) - set([self.name]):
-                        validated_vanilla_mod = False
-                        mod_error = tr('cant_install_mod_for_vanilla')
-                        error_msg.append(mod_error)
-                    else:
-                        validated_vanilla_mod = True
-                        mod_error = ""
-                    self.individual_require_status.append(
-                        (fake_req, validated_vanilla_mod, [mod_error]))
+                    validated_vanilla_mod = not (existing_content.keys() - {self.name})
+                    verdict = Verdict(validated_vanilla_mod, Mod.render_vanilla_requirement,
+                                      installment=self.installment, mention_versions=False)
+                    self.individual_require_status.append(({}, verdict))
+                    if not validated_vanilla_mod:
+                        error_verdicts.append(verdict)
                     requirements_met &= validated_vanilla_mod
 
         # if error_msg:
             # error_msg.append(f'\n{tr("check_for_a_new_version")}')
 
-        return requirements_met, error_msg
+        return requirements_met, error_verdicts
+
+    @staticmethod
+    def render_vanilla_requirement(verdict: Verdict) -> tuple[str, list[str]]:
+        name_label = f"{tr('clean').capitalize()} " + tr(verdict.facts["installment"])
+        return name_label, [] if verdict.ok else [tr('cant_install_mod_for_vanilla')]
 
     def check_reinstallability(self, existing_content: dict,
-                               existing_content_descriptions: dict) -> tuple[bool, bool, str]:
-        '''Returns is_reinstallation: bool, can_be_installed: bool, warning_text: str'''
+                               existing_content_descriptions: dict) -> tuple[bool, bool, Verdict, dict]:
+        '''Returns is_reinstallation: bool, can_be_installed: bool, warning: Verdict, previous install'''
         previous_install = existing_content.get(self.name)
         comrem_on_compatch = False
 
@@ -767,7 +954,7 @@ class Mod:
 
         if previous_install is None:
             # no reinstall, can be installed
-            return False, True, "", None
+            return False, True, PASSED, None
 
         old_options = set(previous_install.keys()) - set(["base", "version", "display_name",
                                                           "build", "language", "installment"])
@@ -778,567 +965,398 @@ class Mod:
             self_and_prereqs.extend(prereq["name"])
 
         if previous_install.get("language") != self.language:
-            return True, False, tr("cant_reinstall_different_lang"), previous_install
+            return (True, False, Mod.get_reinstall_verdict(False, "cant_reinstall_different_lang"),
+                    previous_install)
 
         existing_other_mods = set(existing_content.keys()) - set(self_and_prereqs)
         if existing_other_mods:
             # is reinstall, can't be installed as other mods not from prerequisites were installed
-            existing_mods_display_names = []
-            for name in existing_other_mods:
-                mod_name = existing_content[name].get("display_name")
-                if mod_name is None:
-                    mod_name = name
-                existing_mods_display_names.append(mod_name)
-            warning = (f'{tr("cant_reinstall_over_other_mods")}: '
-                       + ", ".join(existing_mods_display_names) + ".")
-            return True, False, warning, previous_install
+            return (True, False,
+                    Mod.get_reinstall_verdict(False, "cant_reinstall_over_other_mods",
+                                              other_mods=existing_other_mods,
+                                              existing_content=existing_content),
+                    previous_install)
 
         existing_version = Mod.Version(previous_install["version"])
         this_version = Mod.Version(self.version)
 
-        over_other_version_warning = tr("cant_reinstall_over_other_version")
+        over_other_version_warning = "cant_reinstall_over_other_version"
 
         # special compat settings can make mod forward compatible
         # backwards compatibility is not supported
         if self.compatible_patch_versions:
             if existing_version > this_version:
                 is_compatible_version = False
-                over_other_version_warning = tr("cant_reinstall_over_newer_version")
+                over_other_version_warning = "cant_reinstall_over_newer_version"
             else:
-                existing_version.patch = 0
-                this_version.patch = 0
-
                 if self.compatible_minor_versions:
-                    existing_version.minor = 0
-                    this_version.minor = 0
+                    existing_version = existing_version.without_minor()
+                    this_version = this_version.without_minor()
+                else:
+                    existing_version = existing_version.without_patch()
+                    this_version = this_version.without_patch()
 
                 is_compatible_version = existing_version == this_version
         else:
             is_compatible_version = existing_version == this_version
 
         if not is_compatible_version:
-            return True, False, over_other_version_warning, previous_install
+            return True, False, Mod.get_reinstall_verdict(False, over_other_version_warning), previous_install
 
         if self.build < previous_install["build"]:
-            return True, False, tr("cant_reinstall_over_newer_build"), previous_install
+            return (True, False, Mod.get_reinstall_verdict(False, "cant_reinstall_over_newer_build"),
+                    previous_install)
 
         if self.build == previous_install["build"]:
             if not self.optional_content and not comrem_on_compatch:
                 # is reinstall, simple mod, safe reinstall
-                return True, True, tr("can_reinstall"), previous_install
+                return True, True, Mod.get_reinstall_verdict(True, "can_reinstall"), previous_install
 
             if old_options == new_options:
                 # is reinstall, complex mod, safe reinstall, forced options
                 if not self.safe_reinstall_options:
-                    warning = tr("to_increase_compat_options_are_limited")
+                    warning = Mod.get_reinstall_verdict(True, "to_increase_compat_options_are_limited")
                 else:
-                    warning = tr("can_reinstall")
+                    warning = Mod.get_reinstall_verdict(True, "can_reinstall")
                 return True, True, warning, previous_install
             elif comrem_on_compatch:
-                return True, True, tr("can_reinstall"), previous_install
+                return True, True, Mod.get_reinstall_verdict(True, "can_reinstall"), previous_install
             else:
-                return True, False, tr("cant_reinstall_with_different_options"), previous_install
+                return (True, False,
+                        Mod.get_reinstall_verdict(False, "cant_reinstall_with_different_options"),
+                        previous_install)
 
         elif self.build > previous_install["build"]:
             if not self.optional_content:
                 # is reinstall, simple mod, unsafe reinstall
-                return True, True, tr("can_reinstall"), previous_install
+                return True, True, Mod.get_reinstall_verdict(True, "can_reinstall"), previous_install
 
             if old_options == new_options:
                 # is reinstall, complex mod, unsafe reinstall, forced options
-                warning = tr("can_reinstall")
                 if not self.safe_reinstall_options:
-                    warning += "\n" + tr("to_increase_compat_options_are_limited")
+                    warning = Mod.get_reinstall_verdict(True, "can_reinstall",
+                                                        "to_increase_compat_options_are_limited")
+                else:
+                    warning = Mod.get_reinstall_verdict(True, "can_reinstall")
                 return True, True, warning, previous_install
             elif comrem_on_compatch:
-                return True, True, tr("can_reinstall"), previous_install
+                return True, True, Mod.get_reinstall_verdict(True, "can_reinstall"), previous_install
             else:
-                return True, False, tr("cant_reinstall_with_different_options"), previous_install
+                return (True, False,
+                        Mod.get_reinstall_verdict(False, "cant_reinstall_with_different_options"),
+                        previous_install)
 
-    def check_incompatible(self, incomp: dict, existing_content: dict,
-                           existing_content_descriptions: dict) -> tuple[bool, list]:
-        error_msg = []
-        name_incompat = False
-        version_incomp = False
-        optional_content_incomp = False
+    @staticmethod
+    def get_reinstall_verdict(can_be_reinstalled: bool, *keys: str,
+                              other_mods: set | None = None, existing_content: dict | None = None) -> Verdict:
+        return Verdict(can_be_reinstalled, Mod.render_reinstall_verdict,
+                       keys=keys, other_mods=other_mods, existing_content=existing_content)
 
-        incomp_mod_name = None
-        for possible_incomp_mod in incomp['name']:
-            existing_mod = existing_content.get(possible_incomp_mod)
-            if existing_mod is not None:
-                incomp_mod_name = possible_incomp_mod
+    @staticmethod
+    def render_reinstall_verdict(verdict: Verdict) -> tuple[str, list[str]]:
+        facts = verdict.facts
+        if facts["other_mods"]:
+            existing_mods_display_names = []
+            for name in facts["other_mods"]:
+                mod_name = facts["existing_content"][name].get("display_name")
+                if mod_name is None:
+                    mod_name = name
+                existing_mods_display_names.append(mod_name)
+            return "", [f'{tr(facts["keys"][0])}: ' + ", ".join(existing_mods_display_names) + "."]
+        return "", ["\n".join(tr(key) for key in facts["keys"])]
+
+    def check_incompatible(self, incomp: dict, constraint: Mod.Incompatibility, existing_content: dict,
+                           existing_content_descriptions: dict) -> Verdict:
+        '''Verdict is ok when the mod is compatible with the installed content'''
+        incomp_mod_name = constraint.find_installed(existing_content)
+        incompatible_with_game_copy = (incomp_mod_name is not None
+                                       and constraint.matches(existing_content[incomp_mod_name]))
+        return Verdict(not incompatible_with_game_copy, Mod.render_incompatible,
+                       incomp=incomp, existing_content=existing_content,
+                       existing_content_descriptions=existing_content_descriptions,
+                       incomp_mod_name=incomp_mod_name)
 
+    @staticmethod
+    def render_incompatible(verdict: Verdict) -> tuple[str, list[str]]:
+        facts = verdict.facts
+        incomp = facts["incomp"]
+        error_msg = []
         or_word = f" {tr('or')} "
-        # and_word = f" {tr('and')} "
-        only_technical_name_available = False
-
-        name_label = []
-        for service_name in incomp["name"]:
-            existing_mod = existing_content.get(service_name)
-            if existing_mod is not None:
-                name_label.append(existing_mod["display_name"])
-            else:
-                known_name = get_known_mod_display_name(service_name)
-                if known_name is None:
-                    name_label.append(service_name)
-                    only_technical_name_available = True
-                else:
-                    name_label.append(known_name)
-
-        name_label = or_word.join(name_label)
-        version_label = ""
-        optional_content_label = ""
-
-        if incomp_mod_name is not None:
-            # if incompatible mod is found we need to check if a tighter conformity check exists
-            name_incompat = True
-
-            incomp_versions = incomp.get("versions")
-            if incomp_versions and incomp_versions is not None:
-                installed_version = existing_content[incomp_mod_name]["version"]
+        name_label, only_technical_name_available = Mod.get_name_label(incomp["name"],
+                                                                       facts["existing_content"])
 
+        if not verdict.ok:
+            version_label = ""
+            optional_content_label = ""
+            if incomp.get("versions"):
                 version_label = (f', {tr("of_version")}: '
                                  f'{or_word.join(incomp.get("versions"))}')
-                compare_ops = set([])
-                for version in incomp_versions:
-                    if ">=" == version[:2]:
-                        compare_operation = operator.ge
-                    elif "<=" == version[:2]:
-                        compare_operation = operator.le
-                    elif ">" == version[:1]:
-                        compare_operation = operator.gt
-                    elif "<" == version[:1]:
-                        compare_operation = operator.lt
-                    else:  # default "version" treated the same as "==version":
-                        compare_operation = operator.eq
-
-                    for sign in (">", "<", "="):
-                        version = version.replace(sign, '')
-
-                    parsed_existing_ver = Mod.Version(installed_version)
-                    parsed_incompat_ver = Mod.Version(version)
-
-                    version_incomp = compare_operation(parsed_existing_ver, parsed_incompat_ver)
-
-                    compare_ops.add(compare_operation)
-                    # while we ignore postfix for less/greater ops, we want to have an ability
-                    # to make a specifix version with postfix incompatible
-                    if compare_operation is operator.eq:
-                        if parsed_incompat_ver.identifier:
-                            if parsed_existing_ver.identifier != parsed_incompat_ver.identifier:
-                                version_incomp = True
-
-                compare_ops = list(compare_ops)
-                len_ops = len(compare_ops)
-                if len_ops == 1 and operator.eq in compare_ops:
-                    self.incompatibles_style = "strict"
-                elif len_ops == 2 and operator.eq not in compare_ops:
-                    if (compare_ops[0] in (operator.ge, operator.gt)
-                       and compare_ops[1] in (operator.le, operator.lt)):
-                        self.incompatibles_style = "range"
-                    elif (compare_ops[0] in (operator.lt, operator.lt)
-                          and compare_ops[1] in (operator.ge, operator.gt)):
-                        self.incompatibles_style = "range"
-                    else:
-                        self.incompatibles_style = "mixed"
-                else:
-                    self.incompatibles_style = "mixed"
-
-            else:
-                version_incomp = True
-
-            optional_content = incomp.get("optional_content")
-
-            if optional_content and optional_content is not None:
-
+            if incomp.get("optional_content"):
                 optional_content_label = (f', {tr("including_options").lower()}: '
                                           f'{or_word.join(incomp.get("optional_content"))}')
 
-                for option in optional_content:
-                    if existing_content[incomp_mod_name].get(option) not in [None, "skip"]:
-                        optional_content_incomp = True
-            else:
-                optional_content_incomp = True
-
-            incompatible_with_game_copy = name_incompat and version_incomp and optional_content_incomp
-
             if only_technical_name_available:
                 name_label_tr = tr("technical_name")
             else:
                 name_label_tr = tr("mod_name")
 
-            if incompatible_with_game_copy:
-                error_msg.append(f'\n{tr("found_incompatible")}:\n'
-                                 f'{name_label_tr.capitalize()}: '
-                                 f'{name_label}{version_label}{optional_content_label}')
-                installed_description = existing_content_descriptions.get(incomp_mod_name)
-                if installed_description is not None:
-                    installed_description = installed_description.strip("\n\n")
-                    error_msg.append(f'\n{tr("version_available").capitalize()}:\n'
-                                     f'{remove_colors(installed_description)}')
-                else:
-                    # TODO: check if this path even possible
-                    raise NotImplementedError
-            incomp["name_label"] = name_label
-            return incompatible_with_game_copy, error_msg
-
-        incomp["name_label"] = name_label
-        return False, ""
+            error_msg.append(f'\n{tr("found_incompatible")}:\n'
+                             f'{name_label_tr.capitalize()}: '
+                             f'{name_label}{version_label}{optional_content_label}')
+            installed_description = facts["existing_content_descriptions"].get(facts["incomp_mod_name"])
+            if installed_description is not None:
+                installed_description = installed_description.strip("\n\n")
+                error_msg.append(f'\n{tr("version_available").capitalize()}:\n'
+                                 f'{remove_colors(installed_description)}')
+        return name_label, error_msg
 
     def check_incompatibles(self, existing_content: dict,
-                            existing_content_descriptions: dict) -> tuple[bool, list]:
-        error_msg = []
+                            existing_content_descriptions: dict) -> tuple[bool, list[Verdict]]:
+        '''Returns whether mod is compatible and verdicts which messages form the error text'''
+        error_verdicts = []
         compatible = True
 
         self.individual_incomp_status.clear()
 
-        for incomp in self.incompatible:
-            incompatible_with_game_copy, mod_error = self.check_incompatible(
-                incomp, existing_content, existing_content_descriptions)
-            self.individual_incomp_status.append((incomp, not incompatible_with_game_copy,
-                                                 mod_error))
-            if mod_error:
-                error_msg.extend(mod_error)
-            compatible &= (not incompatible_with_game_copy)
+        for incomp, constraint in zip(self.incompatible, self.incompatibilities):
+            verdict = self.check_incompatible(incomp, constraint,
+                                              existing_content, existing_content_descriptions)
+            self.individual_incomp_status.append((incomp, verdict))
+            if not verdict:
+                error_verdicts.append(verdict)
+            compatible &= verdict.ok
 
         if compatible:
             if self.strict_requirements and self.prerequisites:
                 self_and_prereqs = [self.name, "community_patch"]
                 for prereq in self.prerequisites:
                     self_and_prereqs.extend(prereq["name"])
-                existing_other_mods = set(existing_content.keys()) - set(self_and_prereqs)
+                existing_other_mods = existing_content.keys() - set(self_and_prereqs)
                 if existing_other_mods:
-                    existing_mods_display_names = []
-                    for name in existing_other_mods:
-                        mod_name = existing_content[name].get("display_name")
-                        if mod_name is None:
-                            mod_name = name
-                        existing_mods_display_names.append(mod_name)
-                    existing_string = ", ".join(existing_mods_display_names)
-                    error_msg.append(f'{tr("cant_install_strict_requirements")}: '
-                                     + existing_string + ".")
                     compatible = False
-                    fake_incomp = {"name_label": existing_string,
-                                   "mention_versions": False}
+                    error_verdicts.append(Verdict(False, Mod.render_strict_requirements,
+                                                  existing_content=existing_content,
+                                                  other_mods=existing_other_mods,
+                                                  key="cant_install_strict_requirements"))
                     self.individual_incomp_status.append(
-                        (fake_incomp, False, [f'{tr("already_installed")}: {existing_string}']))
-        return compatible, error_msg
+                        ({}, Verdict(False, Mod.render_strict_requirements,
+                                     existing_content=existing_content,
+                                     other_mods=existing_other_mods,
+                                     key="already_installed", mention_versions=False)))
+        return compatible, error_verdicts
+
+    @staticmethod
+    def render_strict_requirements(verdict: Verdict) -> tuple[str, list[str]]:
+        existing_content = verdict.facts["existing_content"]
+        existing_mods_display_names = []
+        for name in verdict.facts["other_mods"]:
+            mod_name = existing_content[name].get("display_name")
+            if mod_name is None:
+                mod_name = name
+            existing_mods_display_names.append(mod_name)
+        existing_string = ", ".join(existing_mods_display_names)
+        if verdict.facts["key"] == "already_installed":
+            return existing_string, [f'{tr("already_installed")}: {existing_string}']
+        return existing_string, [f'{tr(verdict.facts["key"])}: ' + existing_string + "."]
 
     def validate_install_config(install_config: Any, mod_config_path: str,
-                                archive_file_list: Optional[list[ZipInfo] | py7zr.ArchiveFileList] = None,
-                                root_path: Optional[str] = None) -> bool:
-        logger.info("--- Validating install config struct ---")
-        if root_path:
-            logger.info(f"Path: {root_path}")
-        else:
-            logger.info(f"Path: {mod_config_path}")
-
-        is_dict = isinstance(install_config, dict)
-        if is_dict:
-            # schema type 1: list of possible types, required(bool)
-            # schema type 2: list of possible types, required(bool), value[min, max]
-            schema_fieds_top = {
-                "name": [[str], True],
-                "display_name": [[str], True],
-                "installment": [[str], False],
-                "version": [[str, int, float], True],
-                "build": [[str], True],
-                "description": [[str], True],
-                "authors": [[str], True],
-                "language": [[str], False],  # defaults to ru
-
-                "patcher_version_requirement": [[str, float, int, list[str | float | int]], True],
-                "prerequisites": [[list], True],
-                "incompatible": [[list], False],
-                "compatible_patch_versions": [[bool, str], False],
-                "compatible_minor_versions": [[bool, str], False],
-                "safe_reinstall_options": [[bool, str], False],
-
-                "release_date": [[str], False],
-                "trailer_url": [[str], False],
-                "translations": [[list[str]], False],
-                "link": [[str], False],
-                "tags": [[list[str]], False],
-                "logo": [[str], False],
-                "install_banner": [[str], False],
-                "screenshots": [[list], False],
-                "change_log": [[str], False],
-                "other_info": [[str], False],
-                "patcher_options": [[dict], False],
-                "config_options": [[dict], False],
-                "optional_content": [[list], False],
-                "strict_requirements": [[bool, str], False],
-                "no_base_content": [[bool, str], False],
-            }
-
-            schema_prereqs = {
-                "name": [[str, list[str]], True],
-                "versions": [[list[str | int | float]], False],
-                "optional_content": [[list[str]], False]
-            }
-            schema_patcher_options = {
-                "gravity": [[float], False, [-100.0, -1.0]],
-                "skins_in_shop": [[int], False, [8, 32]],
-                "blast_damage_friendly_fire": [[bool, str], False, None],
-                "game_font": [[str], False]
-            }
-            schema_config_options = {
-                "firstLevel": [[str], False],
-                "DoNotLoadMainmenuLevel": [[str], False],
-                "weather_AtmoRadius": [[str], False],
-                "weather_ConfigFile": [[str], False]}
-            schema_optional_content = {
-                "name": [[str], True],
-                "display_name": [[str], True],
-                "description": [[str], True],
-
-                "default_option": [[str], False],
-                "forced_option": [[bool, str], False],
-                "install_settings": [[list], False],
-            }
-            schema_install_settins = {
-                "name": [[str], True],
-                "description": [[str], True],
-            }
-            validated = Mod.validate_dict(install_config, schema_fieds_top)
-            if validated:
-                display_name = install_config.get("display_name")
-                mod_name = install_config.get("name")
-                mod_lang = install_config.get("language")
-                logger.info(f"Validating mod '{display_name}' ({mod_name}, lang: {mod_lang})")
-                logger.info("   PASS: Simple manifest validation result")
-                patcher_options = install_config.get("patcher_options")
-                config_options = install_config.get("config_options")
-                optional_content = install_config.get("optional_content")
-                prerequisites = install_config.get("prerequisites")
-                incompatibles = install_config.get("incompatible")
-                if patcher_options is not None:
-                    validated &= Mod.validate_dict_constrained(patcher_options, schema_patcher_options)
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                "patcher options dict validation result")
-                    validated &= len(set(patcher_options.keys()) - set(schema_patcher_options.keys())) == 0
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                "only supported patcher options validation result")
-
-                if config_options is not None:
-                    validated &= Mod.validate_dict_constrained(config_options, schema_config_options)
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                "config options dict validation result")
-                    validated &= len(set(config_options.keys()) - set(schema_config_options.keys())) == 0
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                "only supported config options validation result")
-
-                if prerequisites is not None:
-                    has_forbidden_prerequisites = False
-                    for prereq_entry in prerequisites:
-                        validated &= Mod.validate_dict(prereq_entry, schema_prereqs)
-                        if validated:
-                            if isinstance(prereq_entry.get("name"), str):
-                                prereq_entry_checked = [prereq_entry["name"]]
-                            else:
-                                prereq_entry_checked = prereq_entry["name"]
-                            entry_optional_content = prereq_entry.get("optional_content")
-                            has_forbidden_prerequisites |= ("community_patch" in prereq_entry_checked
-                                                            and bool(entry_optional_content)
-                                                            and entry_optional_content is not None)
-                    if has_forbidden_prerequisites:
-                        logger.error("   FAIL: prerequisites which include ComPatch "
-                                     "can't specify optional content")
-                    validated &= not has_forbidden_prerequisites
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: prerequisites validation result")
-
-                if incompatibles is not None:
-                    has_forbidden_icompabilities = False
-                    for incompatible_entry in incompatibles:
-                        validated &= Mod.validate_dict(incompatible_entry, schema_prereqs)
-                        if validated:
-                            if isinstance(incompatible_entry.get("name"), str):
-                                incompatible_entry_checked = [incompatible_entry["name"]]
-                            else:
-                                incompatible_entry_checked = incompatible_entry["name"]
-                            has_forbidden_icompabilities |= bool(set(incompatible_entry_checked)
-                                                                 & set(["community_patch"]))
-                    if has_forbidden_icompabilities:
-                        logger.error("   FAIL: incompatibles can't contain ComPatch, "
-                                     "should just have ComRem prereq if mod is ComRem exclusive")
-                    validated &= not has_forbidden_icompabilities
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                "incompatible content validation result")
-
-                if optional_content is not None:
-                    validated &= Mod.validate_list(optional_content, schema_optional_content)
-                    logger.info(f"   {'PASS' if validated else 'FAIL'}: optional content validation result")
-                    if validated:
-                        for option in optional_content:
-                            if option.get("name") in ["base", "display_name", "build", "version"]:
-                                validated = False
-                                logger.error(f"   FAIL: optional content name '"
-                                             f"{option.get('name')}' is one of the reserved service names, "
-                                             f"can't load mod properly!")
-                            install_settings = option.get("install_settings")
-                            if install_settings is not None:
-                                validated &= (len(install_settings) > 1)
-                                logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                            "multiple install settings exists for complex optional content '"
-                                            f"{option.get('name')}' validation result")
-                                validated &= Mod.validate_list(install_settings, schema_install_settins)
-                                logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                            f"install settings for content '{option.get('name')}' "
-                                            "validation result")
-                            patcher_options_additional = option.get('patcher_options')
-                            if patcher_options_additional is not None:
-                                validated &= Mod.validate_dict_constrained(patcher_options_additional,
-                                                                           schema_patcher_options)
-                                logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                            "patcher options for additional content "
-                                            "validation result")
-
-                if not validated:
-                    logger.info("<! MOD MANIFEST FAILED VALIDATION, SKIPPING DATA CHECK !>")
-                    return validated
-
-                no_base_config = install_config.get("no_base_content")
-                if no_base_config is None:
-                    no_base_config = False
-
-                if archive_file_list is not None:
-                    if isinstance(archive_file_list, py7zr.ArchiveFileList):
-                        archive_files = []
-                        for file in archive_file_list:
-                            if file.emptystream:
-                                archive_files.append(f"{file.filename}/")
-                            else:
-                                archive_files.append(file.filename)
-                    else:
-                        archive_files = [file.filename for file in archive_file_list]
-                    if mod_name == "community_remaster":
-                        paths_to_check = [
-                            mod_config_path.replace("remaster/manifest.yaml", "patch/"),
-                            mod_config_path.replace("remaster/manifest.yaml", "libs/library.dll"),
-                            mod_config_path.replace("remaster/manifest.yaml", "libs/library.pdb")]
-                        validated_comrem = all(com_path in archive_files for com_path in paths_to_check)
-                        validated &= validated_comrem
-                        logger.info(f"   {'PASS' if validated_comrem else 'FAIL'}: "
-                                    "Archived ComPatch files validation "
-                                    "('patch' and 'libs' folders) result")
-
-                    if not validated:
-                        logger.info("<! COMPATCH FILES VALIDATION FAILED, SKIPPING FURTHER CHECKS !>")
-                        return validated
-
-                    if not no_base_config:
-                        mod_data_path = mod_config_path.replace("manifest.yaml", "data/")
-                        validated_data_dir = mod_data_path in archive_files
-                        validated &= validated_data_dir
-                        if not validated_data_dir:
-                            logger.error("   FAIL: Archived base mod data folder validation fail, "
-                                         f"expected path not found: {mod_data_path}")
+                                archive_file_list: Optional[list[ZipInfo] | py7zr.ArchiveFileList
+                                                            | ArchivePathIndex] = None,
+                                root_path: Optional[str] = None,
+                                check_files: bool = True,
+                                report: Optional[ValidationReport] = None) -> ValidationReport:
+        '''Validates manifest structure and, unless check_files is False, existence
+           of mod files in the mod dir or in archive file list.
+           Returns report of all checks, it's written to the log only on failure or in dev mode'''
+        if report is None:
+            report = ValidationReport(f"{root_path}: {mod_config_path}" if root_path else mod_config_path)
+
+        if not report.check("manifest_is_dict", isinstance(install_config, dict),
+                            details="broken config encountered, couldn't be read as dictionary"):
+            report.log(logger)
+            return report
+
+        if report.check_schema("manifest_schema", MANIFEST_SCHEMA.validate(install_config)):
+            patcher_options = install_config.get("patcher_options")
+            config_options = install_config.get("config_options")
+            optional_content = install_config.get("optional_content")
+            prerequisites = install_config.get("prerequisites")
+            incompatibles = install_config.get("incompatible")
+            if patcher_options is not None:
+                report.check_schema("patcher_options_schema",
+                                    PATCHER_OPTIONS_SCHEMA.validate(patcher_options))
+                unknown_options = PATCHER_OPTIONS_SCHEMA.unknown_keys(patcher_options)
+                report.check("patcher_options_supported", not unknown_options,
+                             details=f"unsupported: {sorted(unknown_options)}" if unknown_options else "")
+
+            if config_options is not None:
+                report.check_schema("config_options_schema", CONFIG_OPTIONS_SCHEMA.validate(config_options))
+                unknown_options = CONFIG_OPTIONS_SCHEMA.unknown_keys(config_options)
+                report.check("config_options_supported", not unknown_options,
+                             details=f"unsupported: {sorted(unknown_options)}" if unknown_options else "")
+
+            if prerequisites is not None:
+                has_forbidden_prerequisites = False
+                for i, prereq_entry in enumerate(prerequisites):
+                    result = PREREQ_SCHEMA.validate(prereq_entry)
+                    if not result:
+                        report.check_schema("prerequisite_schema", result, f"prerequisites[{i}]")
+                    elif report.valid:
+                        if isinstance(prereq_entry.get("name"), str):
+                            prereq_entry_checked = [prereq_entry["name"]]
                         else:
-                            logger.info("   PASS: Archived base mod data folder validation result")
-
-                    if not validated:
-                        logger.info("<! BASE FILES VALIDATION FAILED, SKIPPING FURTHER CHECKS !>")
-                        return validated
-
-                    if optional_content is not None:
-                        for option in optional_content:
-                            validated &= mod_config_path.replace(
-                                "manifest.yaml", f'{option.get("name")}/') in archive_files
-                            if option.get("install_settings") is not None:
-                                for setting in option.get("install_settings"):
-                                    validated &= mod_config_path.replace(
-                                        "manifest.yaml",
-                                        f'{option.get("name")}/{setting.get("name")}/data/') in archive_files
-                                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                                f"Archived optional content '{option.get('name')}' "
-                                                f"install setting '{setting.get('name')}' "
-                                                f"data folder validation result")
-                            else:
-                                validated &= mod_config_path.replace(
-                                    "manifest.yaml", f'{option.get("name")}/data/') in archive_files
-                            logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                        f"Archived optional content '{option.get('name')}' "
-                                        "data folder validation result")
-                else:
-                    mod_root_dir = Path(mod_config_path).parent
-                    if mod_name == "community_remaster":
-                        comrem_root = mod_root_dir.parent
-                        paths_to_check = [Path(comrem_root, "patch"),
-                                          Path(comrem_root, "remaster"),
-                                          Path(comrem_root, "remaster", "data"),
-                                          Path(comrem_root, "remaster", "manifest.yaml"),
-                                          Path(comrem_root, "libs", "library.dll"),
-                                          Path(comrem_root, "libs", "library.pdb")]
-                        validated_comrem = all(com_path.exists() for com_path in paths_to_check)
-                        validated &= validated_comrem
-                        logger.info(f"   {'PASS' if validated_comrem else 'FAIL'}: "
-                                    "ComRem/Patch files validation "
-                                    "('patch', 'remaster' and 'libs' folders) result")
-
-                    if not no_base_config:
-                        validated_data_dir = Path(mod_root_dir, "data").is_dir()
-                        validated &= validated_data_dir
-                        if not validated_data_dir:
-                            logger.error('   FAIL: base mod data folder validation fail, '
-                                         'expected path not exists: '
-                                         f'{Path(mod_root_dir, "data")}')
+                            prereq_entry_checked = prereq_entry["name"]
+                        entry_optional_content = prereq_entry.get("optional_content")
+                        has_forbidden_prerequisites |= ("community_patch" in prereq_entry_checked
+                                                        and bool(entry_optional_content)
+                                                        and entry_optional_content is not None)
+                report.check("prerequisites", not has_forbidden_prerequisites,
+                             details="prerequisites which include ComPatch can't specify optional content"
+                             if has_forbidden_prerequisites else "")
+
+            if incompatibles is not None:
+                has_forbidden_icompabilities = False
+                for i, incompatible_entry in enumerate(incompatibles):
+                    result = PREREQ_SCHEMA.validate(incompatible_entry)
+                    if not result:
+                        report.check_schema("incompatible_schema", result, f"incompatible[{i}]")
+                    elif report.valid:
+                        if isinstance(incompatible_entry.get("name"), str):
+                            incompatible_entry_checked = [incompatible_entry["name"]]
                         else:
-                            logger.info("   PASS: base mod data folder validation result")
-                    if optional_content is not None:
-                        for option in optional_content:
-                            validated &= Path(mod_root_dir, option.get("name")).is_dir()
-                            if option.get("install_settings") is not None:
-                                for setting in option.get("install_settings"):
-                                    validated &= Path(mod_root_dir,
-                                                      option.get("name"),
-                                                      setting.get("name"),
-                                                      "data").is_dir()
-                                    logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                                f"optional content '{option.get('name')}' "
-                                                f"install setting '{setting.get('name')}' "
-                                                f"data folder validation result")
-                            else:
-                                validated &= Path(mod_root_dir,
-                                                  option.get("name"),
-                                                  "data").is_dir()
-                            logger.info(f"   {'PASS' if validated else 'FAIL'}: "
-                                        f"optional content '{option.get('name')}' "
-                                        "data folder validation result")
-
-            logger.info("< MOD MANIFEST VALIDATED >" if validated else "<! MOD MANIFEST FAILED VALIDATION !>")
-            return validated
+                            incompatible_entry_checked = incompatible_entry["name"]
+                        has_forbidden_icompabilities |= "community_patch" in incompatible_entry_checked
+                report.check("incompatible", not has_forbidden_icompabilities,
+                             details="incompatibles can't contain ComPatch, should just have ComRem "
+                                     "prereq if mod is ComRem exclusive"
+                             if has_forbidden_icompabilities else "")
+
+            if optional_content is not None:
+                if report.check_schema("optional_content_schema",
+                                       OPTIONAL_CONTENT_SCHEMA.validate_list(optional_content)):
+                    for option in optional_content:
+                        option_name = option.get("name")
+                        if option_name in ["base", "display_name", "build", "version"]:
+                            report.check("optional_content_name", False, option_name,
+                                         "optional content name is one of the reserved service names")
+                        install_settings = option.get("install_settings")
+                        if install_settings is not None:
+                            report.check("install_settings_multiple", len(install_settings) > 1, option_name,
+                                         "complex optional content should have multiple install settings"
+                                         if len(install_settings) <= 1 else "")
+                            report.check_schema("install_settings_schema",
+                                                INSTALL_SETTINGS_SCHEMA.validate_list(install_settings),
+                                                option_name)
+                        patcher_options_additional = option.get('patcher_options')
+                        if patcher_options_additional is not None:
+                            report.check_schema("option_patcher_options_schema",
+                                                PATCHER_OPTIONS_SCHEMA.validate(patcher_options_additional),
+                                                option_name)
+
+            if report.valid:
+                if check_files:
+                    Mod.validate_install_files(install_config, mod_config_path, archive_file_list, report)
+                else:
+                    report.skip("mod_files", "deferred until the mod is used")
+
+        report.log(logger)
+        return report
+
+    @staticmethod
+    def validate_install_files(install_config: dict, mod_config_path: str,
+                               archive_file_list: Optional[list[ZipInfo] | py7zr.ArchiveFileList
+                                                           | ArchivePathIndex] = None,
+                               report: Optional[ValidationReport] = None) -> ValidationReport:
+        '''Deep tier of manifest validation: checks that base and optional content data dirs
+           described by the structurally valid manifest exist on disk or in archive'''
+        if report is None:
+            report = ValidationReport(mod_config_path)
+        mod_name = install_config.get("name")
+        optional_content = install_config.get("optional_content")
+        no_base_config = install_config.get("no_base_content")
+        if no_base_config is None:
+            no_base_config = False
+
+        if archive_file_list is not None:
+            if isinstance(archive_file_list, ArchivePathIndex):
+                archive_files = archive_file_list
+            else:
+                archive_files = ArchivePathIndex(archive_file_list)
+
+            def exists(path: str) -> bool:
+                return path in archive_files
+
+            def relative(path_end: str) -> str:
+                return mod_config_path.replace("manifest.yaml", path_end)
+
+            if mod_name == "community_remaster":
+                paths_to_check = [
+                    mod_config_path.replace("remaster/manifest.yaml", "patch/"),
+                    mod_config_path.replace("remaster/manifest.yaml", "libs/library.dll"),
+                    mod_config_path.replace("remaster/manifest.yaml", "libs/library.pdb")]
+                for com_path in paths_to_check:
+                    report.check("comrem_files", exists(com_path), com_path)
+                if not report.valid:
+                    return report
         else:
-            logger.error("   FAIL: broken config encountered, couldn't be read as dictionary")
-            return False
+            mod_root_dir = Path(mod_config_path).parent
+
+            def exists(path: str) -> bool:
+                return os.path.isdir(path)
+
+            def relative(path_end: str) -> str:
+                return os.path.join(mod_root_dir, path_end)
+
+            if mod_name == "community_remaster":
+                comrem_root = mod_root_dir.parent
+                paths_to_check = [Path(comrem_root, "patch"),
+                                  Path(comrem_root, "remaster"),
+                                  Path(comrem_root, "remaster", "data"),
+                                  Path(comrem_root, "remaster", "manifest.yaml"),
+                                  Path(comrem_root, "libs", "library.dll"),
+                                  Path(comrem_root, "libs", "library.pdb")]
+                for com_path in paths_to_check:
+                    report.check("comrem_files", com_path.exists(), str(com_path))
+
+        if not no_base_config:
+            data_path = relative("data/")
+            report.check("base_data_dir", exists(data_path), data_path)
+            if archive_file_list is not None and not report.valid:
+                return report
+
+        if optional_content is not None:
+            for option in optional_content:
+                option_path = relative(f'{option.get("name")}/')
+                report.check("option_dir", exists(option_path), option_path)
+                if option.get("install_settings") is not None:
+                    for setting in option.get("install_settings"):
+                        setting_path = relative(f'{option.get("name")}/{setting.get("name")}/data/')
+                        report.check("install_setting_data_dir", exists(setting_path), setting_path)
+                else:
+                    option_data_path = relative(f'{option.get("name")}/data/')
+                    report.check("option_data_dir", exists(option_data_path), option_data_path)
+        return report
+
+    def validate_files(self) -> bool:
+        '''Runs deep validation tier for the mod once, result is stored in validation_tier'''
+        if self.validation_tier == ValidationTier.STRUCTURAL:
+            self.files_report = Mod.validate_install_files(
+                self.install_config, os.path.join(self.distribution_dir, "manifest.yaml"))
+            if self.files_report:
+                self.validation_tier = ValidationTier.FILES
+            else:
+                self.validation_tier = ValidationTier.FILES_MISSING
+            self.files_report.log(logger)
+        return self.validation_tier == ValidationTier.FILES
 
     def compatible_with_mod_manager(self, patcher_version: str | float) -> bool:
         compatible = True
 
         patcher_version_parsed = Mod.Version(patcher_version)
-        patcher_version_parsed.identifier = None
         error_msg = ""
         mod_manager_too_new = False
 
-        for version in self.patcher_version_requirement:
-            if ">=" == version[:2]:
-                compare_operation = operator.ge
-            elif "<=" == version[:2]:
-                compare_operation = operator.le
-            elif ">" == version[:1]:
-                compare_operation = operator.gt
-            elif "<" == version[:1]:
-                compare_operation = operator.lt
-            elif "=" == version[:1]:
-                compare_operation = operator.eq
-            else:  # default "version" treated the same as ">=version":
-                compare_operation = operator.ge
-
-            for sign in (">", "<", "="):
-                version = version.replace(sign, '')
-
-            parsed_required_ver = Mod.Version(version)
-            parsed_required_ver.identifier = None
-
+        for compare_operation, parsed_required_ver in self.patcher_requirement:
             if compare_operation is operator.eq and parsed_required_ver < patcher_version_parsed:
                 mod_manager_too_new = True
 
@@ -1364,46 +1382,6 @@ class Mod:
 
         return compatible, error_msg.strip()
 
-    @staticmethod
-    def validate_dict(validating_dict: dict, scheme: dict) -> bool:
-        '''Validates dictionary based on scheme in a format
-           {name: [list of possible types, required(bool)]}.
-           Supports generics for type checking in schemes'''
-        # logger.debug(f"Validating dict with scheme {scheme.keys()}")
-        if not isinstance(validating_dict, dict):
-            logger.error(f"Validated part of scheme is not a dict: {validating_dict}")
-            return False
-        for field in scheme:
-            types = scheme[field][0]
-            required = scheme[field][1]
-            value = validating_dict.get(field)
-            if required and value is None:
-                logger.error(f"key '{field}' is required but couldn't be found in manifest")
-                return False
-            elif required or (not required and value is not None):
-                generics_present = any([hasattr(type_entry, "__origin__") for type_entry in types])
-                if not generics_present:
-                    valid_type = any([isinstance(value, type_entry) for type_entry in types])
-                else:
-                    valid_type = True
-                    for type_entry in types:
-                        if hasattr(type_entry, "__origin__"):
-                            if isinstance(value, typing.get_origin(type_entry)):
-                                if type(value) in [dict, list]:
-                                    for value_internal in value:
-                                        if not isinstance(value_internal, typing.get_args(type_entry)):
-                                            valid_type = False
-                                            break
-                                else:
-                                    valid_type = False
-                                    break
-
-                if not valid_type:
-                    logger.error(f"key '{field}' has value {value} of invalid type '{type(value)}', "
-                                 f"expected: {' or '.join(str(type_inst) for type_inst in types)}")
-                    return False
-        return True
-
     @staticmethod
     def get_unique_id_from_manifest(manifest):
         try:
@@ -1430,58 +1408,6 @@ class Mod:
             logger.error("Error when calculating hash for mod manifest", ex)
             return None
 
-    @staticmethod
-    def validate_dict_constrained(validating_dict: dict, scheme: dict) -> bool:
-        '''Validates dictionary based on scheme in a format
-           {name: [list of possible types, required(bool), int or float value[min, max]]}.
-           Doesn't support generics in schemes'''
-        # logger.debug(f"Validating constrained dict with scheme {scheme.keys()}")
-        for field in scheme:
-            types = scheme[field][0]
-            required = scheme[field][1]
-            value = validating_dict.get(field)
-            if (float in types) or (int in types):
-                min_req = scheme[field][2][0]
-                max_req = scheme[field][2][1]
-
-            if required and value is None:
-                logger.error(f"key '{field}' is required but couldn't be found in manifest")
-                return False
-            elif required or (not required and value is not None):
-                valid_type = any([isinstance(value, type_entry) for type_entry in types])
-                if not valid_type:
-                    logger.error(f"key '{field}' is of invalid type '{type(field)}', expected '{types}'")
-                    return False
-                if float in types:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        logger.error(f"key '{field}' can't be converted to float as supported - "
-                                     f"found value '{value}'")
-                        return False
-                if int in types:
-                    try:
-                        value = int(value)
-                    except ValueError:
-                        logger.error(f"key '{field}' can't be converted to int as supported - "
-                                     f"found value '{value}'")
-                        return False
-                if ((float in types) or (int in types)) and (not (min_req <= value <= max_req)):
-                    logger.error(f"key '{field}' is not in supported range '{min_req}-{max_req}'")
-                    return False
-
-        return True
-
-    @staticmethod
-    def validate_list(validating_list: list[dict], scheme: dict) -> bool:
-        '''Runs validate_dict for multiple lists with the same scheme
-           and returns total validation result for them'''
-        # logger.debug(f"Validating list of length: '{len(validating_list)}'")
-        to_validate = [element for element in validating_list if isinstance(element, dict)]
-        result = all([Mod.validate_dict(element, scheme) for element in to_validate])
-        # logger.debug(f"Result: {result}")
-        return result
-
     def get_full_install_settings(self) -> dict:
         '''Returns settings that describe default installation of the mod'''
         install_settings = {}
@@ -1549,17 +1475,27 @@ class Mod:
 
     @total_ordering
     class Version:
-        def __init__(self, version_str: str) -> None:
-            self.major = '0'
-            self.minor = '0'
-            self.patch = '0'
-            self.identifier = ''
+        '''Immutable parsed version, instances are interned by the source string
+           and compared by the key computed once on parsing'''
+        __slots__ = ("source", "major", "minor", "patch", "identifier", "is_numeric", "text_key", "sort_key")
+        _interned: dict[str, Mod.Version] = {}
+
+        def __new__(cls, version_str: str) -> Mod.Version:
+            version_str = str(version_str)
+            version = cls._interned.get(version_str)
+            if version is not None:
+                return version
+
+            major = '0'
+            minor = '0'
+            patch = '0'
+            identifier = ''
 
             identifier_index = version_str.find('-')
             has_minor_ver = "." in version_str
 
             if identifier_index != -1:
-                self.identifier = version_str[identifier_index + 1:]
+                identifier = version_str[identifier_index + 1:]
                 numeric_version = version_str[:identifier_index]
             else:
                 numeric_version = version_str
@@ -1568,20 +1504,40 @@ class Mod:
                 version_split = numeric_version.split('.')
                 version_levels = len(version_split)
                 if version_levels > 0:
-                    self.major = version_split[0][:4]
+                    major = version_split[0][:4]
 
                 if version_levels > 1:
-                    self.minor = version_split[1][:4]
+                    minor = version_split[1][:4]
 
                 if version_levels > 2:
-                    self.patch = version_split[2][:10]
+                    patch = version_split[2][:10]
 
                 if version_levels > 3:
-                    self.patch = ''.join(version_split[2:])
+                    patch = ''.join(version_split[2:])
             else:
-                self.major = numeric_version
+                major = numeric_version
+
+            # isdecimal guarantees that int() will succeed, unlike isnumeric
+            is_numeric = all([part.isdecimal() for part in [major, minor, patch]])
+            text_key = (major.lower(), minor.lower(), patch.lower())
+
+            version = super().__new__(cls)
+            for field, value in (("source", version_str), ("major", major), ("minor", minor),
+                                 ("patch", patch), ("identifier", identifier),
+                                 ("is_numeric", is_numeric), ("text_key", text_key),
+                                 ("sort_key",
+                                  (int(major), int(minor), int(patch)) if is_numeric else text_key)):
+                object.__setattr__(version, field, value)
+
+            if len(cls._interned) < VERSION_CACHE_SIZE:
+                cls._interned[version_str] = version
+            return version
+
+        def __setattr__(self, name: str, value: typing.Any) -> None:
+            raise AttributeError(f"Version is immutable, can't set '{name}'")
 
-            self.is_numeric = all([part.isnumeric() for part in [self.major, self.minor, self.patch]])
+        def __reduce__(self):
+            return (Mod.Version, (self.source,))
 
         def __str__(self) -> str:
             version = f"{self.major}.{self.minor}.{self.patch}"
@@ -1592,6 +1548,10 @@ class Mod:
         def __repr__(self) -> str:
             return str(self)
 
+        def __hash__(self) -> int:
+            # numeric and non numeric versions are never equal, so the hash is consistent with __eq__
+            return hash(self.sort_key)
+
         def _is_valid_operand(self, other: typing.Any):
             return (isinstance(other, Mod.Version))
 
@@ -1600,28 +1560,125 @@ class Mod:
                 return NotImplemented
 
             if self.is_numeric and other.is_numeric:
-                return ((int(self.major), int(self.minor), int(self.patch))
-                        ==
-                        (int(other.major), int(other.minor), int(other.patch)))
-            else:
-                return ((self.major.lower(), self.minor.lower(), self.patch.lower())
-                        ==
-                        (self.major.lower(), self.minor.lower(), self.patch.lower()))
+                return self.sort_key == other.sort_key
+            return self.text_key == other.text_key
 
         def __lt__(self, other: Mod.Version) -> bool:
             if not self._is_valid_operand(other):
                 return NotImplemented
 
             if self.is_numeric and other.is_numeric:
-                return ((int(self.major), int(self.minor), int(self.patch))
-                        <
-                        (int(other.major), int(other.minor), int(other.patch)))
+                return self.sort_key < other.sort_key
+            return self.text_key < other.text_key
+
+        def without_patch(self) -> Mod.Version:
+            return Mod.Version(f"{self.major}.{self.minor}.0")
+
+        def without_minor(self) -> Mod.Version:
+            return Mod.Version(f"{self.major}.0.0")
+
+    class Constraint:
+        '''Prerequisite or incompatibility entry of manifest compiled once on mod load'''
+        __slots__ = ("names", "name_set", "versions", "options", "style")
+
+        def __init__(self, entry: dict) -> None:
+            self.names = tuple(entry["name"])
+            self.name_set = frozenset(self.names)
+            self.versions = tuple(Mod.Constraint.parse_version(str(version))
+                                  for version in entry.get("versions") or [])
+            self.options = tuple(entry.get("optional_content") or [])
+            self.style = Mod.Constraint.get_style(self.versions)
+
+        @staticmethod
+        def parse_version(version: str,
+                          default_operation: typing.Callable = operator.eq) -> tuple:
+            if ">=" == version[:2]:
+                compare_operation = operator.ge
+            elif "<=" == version[:2]:
+                compare_operation = operator.le
+            elif ">" == version[:1]:
+                compare_operation = operator.gt
+            elif "<" == version[:1]:
+                compare_operation = operator.lt
+            elif "=" == version[:1]:
+                compare_operation = operator.eq
             else:
-                return ((self.major.lower(), self.minor.lower(), self.patch.lower())
-                        <
-                        (self.major.lower(), self.minor.lower(), self.patch.lower()))
+                compare_operation = default_operation
+
+            for sign in (">", "<", "="):
+                version = version.replace(sign, '')
+            return compare_operation, Mod.Version(version)
+
+        @staticmethod
+        def get_style(versions: tuple[tuple]) -> str:
+            '''Strict - list of exact versions, range - lower bound below upper bound,
+            any - bounds which don't overlap, so any of them is enough, mixed - anything else'''
+            compare_ops = {compare_operation for compare_operation, _ in versions}
+            if compare_ops == {operator.eq}:
+                return "strict"
+            if (len(compare_ops) == 2
+               and compare_ops & {operator.ge, operator.gt}
+               and compare_ops & {operator.le, operator.lt}):
+                lower_op, lower = max(((op, version) for op, version in versions
+                                       if op in (operator.ge, operator.gt)), key=lambda bound: bound[1])
+                upper_op, upper = min(((op, version) for op, version in versions
+                                       if op in (operator.le, operator.lt)), key=lambda bound: bound[1])
+                if lower < upper or (lower == upper and lower_op is operator.ge and upper_op is operator.le):
+                    return "range"
+                return "any"
+            return "mixed"
+
+        @staticmethod
+        def get_common_style(constraints: list[Mod.Constraint]) -> str:
+            '''Style used to display versions of all the constraints with versions specified'''
+            styles = {constraint.style for constraint in constraints if constraint.versions}
+            return styles.pop() if len(styles) == 1 else "mixed"
+
+        def find_installed(self, existing_content: dict) -> str | None:
+            '''Name of the installed content matching one of the names, last one in the list wins'''
+            found = None
+            for name in self.names:
+                if name in existing_content:
+                    found = name
+            return found
+
+        def compare_versions(self, installed_version: str) -> typing.Iterator[bool]:
+            '''Result for every listed version, identifier is only checked for the exact version'''
+            existing_version = Mod.Version(installed_version)
+            return (compare_operation(existing_version, version)
+                    and not (compare_operation is operator.eq and version.identifier
+                             and existing_version.identifier != version.identifier)
+                    for compare_operation, version in self.versions)
+
+        def versions_match(self, installed_version: str) -> bool:
+            '''Strict and any constraints are met by any of the listed versions,
+            other styles need all to be met'''
+            if not self.versions:
+                return True
+            if self.style in ("strict", "any"):
+                return any(self.compare_versions(installed_version))
+            return all(self.compare_versions(installed_version))
+
+        def missing_options(self, installed_entry: dict) -> list[str]:
+            return [option for option in self.options if installed_entry.get(option) in (None, "skip")]
+
+        def matches(self, installed_entry: dict) -> bool:
+            '''Installed content entry satisfies version and includes all the options'''
+            return (self.versions_match(installed_entry["version"])
+                    and not self.missing_options(installed_entry))
+
+    class Incompatibility(Constraint):
+        __slots__ = ()
+
+        def matches(self, installed_entry: dict) -> bool:
+            '''Installed content entry has incompatible version and includes any of the options'''
+            return (self.versions_match(installed_entry["version"])
+                    and (not self.options or len(self.missing_options(installed_entry)) < len(self.options)))
 
     class OptionalContent:
+        __slots__ = ("name", "display_name", "description", "install_settings",
+                     "default_option", "forced_option")
+
         def __init__(self, description: dict, parent: Mod) -> None:
             self.name = str(description.get("name"))[:64].replace("/", "").replace("\\", "").replace(".", "")
             self.display_name = description.get("display_name")[:64]
@@ -0,0 +1,294 @@
+'''
+Batch dependency resolver, orders mods so prerequisites are installed first
+and checks the whole batch against installed content before anything is installed.
+
+Uses the same semantics as single mod checks: prerequisites and incompatibilities
+(compiled Mod.Constraint), strict requirements, reinstall rules with
+compatible_*_versions and compatibility with the mod manager and the game.
+'''
+from __future__ import annotations
+
+import heapq
+import logging
+
+from .mod import Mod
+
+
+class PlanConflict:
+    '''Reason why the mod can't be a part of the install plan'''
+    __slots__ = ("kind", "mod_name", "other", "details")
+
+    def __init__(self, kind: str, mod_name: str, other: str | None = None, details: str = "") -> None:
+        self.kind = kind
+        self.mod_name = mod_name
+        self.other = other
+        self.details = details
+
+    def __repr__(self) -> str:
+        return f"PlanConflict({self.kind!r}, {self.mod_name!r}, other={self.other!r})"
+
+    def render(self) -> str:
+        line = f"{self.kind}: {self.mod_name}"
+        if self.other:
+            line += f" <-> {self.other}"
+        if self.details:
+            line += f" - {self.details}"
+        return line
+
+
+class InstallPlan:
+    '''Ordered list of (mod, install_settings) steps, evaluates to bool -
+       plan is valid only when there are no conflicts'''
+    __slots__ = ("steps", "conflicts")
+
+    def __init__(self) -> None:
+        self.steps = []
+        self.conflicts = []
+
+    def __bool__(self) -> bool:
+        return not self.conflicts
+
+    def __repr__(self) -> str:
+        return f"InstallPlan(steps={[mod.name for mod, _ in self.steps]}, conflicts={self.conflicts})"
+
+    @property
+    def order(self) -> list[str]:
+        return [mod.name for mod, _ in self.steps]
+
+    def render(self) -> str:
+        lines = [f"--- Install plan {'resolved' if self else 'has conflicts'} ---"]
+        lines.extend(f"   {index}. {mod.name} {mod.version}"
+                     for index, (mod, _) in enumerate(self.steps, start=1))
+        lines.extend(f"   CONFLICT: {conflict.render()}" for conflict in self.conflicts)
+        return "\n".join(lines)
+
+    def log(self, logger: logging.Logger) -> None:
+        if self.conflicts:
+            logger.warning(self.render())
+        else:
+            logger.info(self.render())
+
+
+class DependencyResolver:
+    '''Resolves batch of mods against installed content of the game copy'''
+    def __init__(self, installed_content: dict, installed_descriptions: dict | None = None,
+                 commod_version: str | None = None, game_installment: str | None = None) -> None:
+        self.installed_content = installed_content
+        self.installed_descriptions = installed_descriptions if installed_descriptions is not None else {}
+        self.commod_version = commod_version
+        self.game_installment = game_installment
+
+    @staticmethod
+    def get_entry(mod: Mod, install_settings: dict) -> dict:
+        '''Entry of installed content as it will be written to manifest after install'''
+        entry = install_settings.copy()
+        entry["version"] = mod.version
+        entry["build"] = mod.build
+        entry["language"] = mod.language
+        entry["installment"] = mod.installment
+        entry["display_name"] = mod.display_name
+        return entry
+
+    @staticmethod
+    def is_strict(mod: Mod) -> bool:
+        '''Strict requirements limit the other content only for vanilla mods and mods with prerequisites,
+           the same way as in the single mod checks'''
+        return mod.strict_requirements and (mod.vanilla_mod or bool(mod.requirements))
+
+    @staticmethod
+    def get_allowed_neighbours(mod: Mod) -> set[str]:
+        '''Content which can be installed when mod with strict requirements is installed'''
+        if mod.vanilla_mod:
+            return {mod.name}
+        allowed = {mod.name, "community_patch"}
+        for constraint in mod.requirements:
+            allowed |= constraint.name_set
+        return allowed
+
+    @staticmethod
+    def get_requirements(mod: Mod) -> list[Mod.Constraint]:
+        return [constraint for constraint in mod.requirements
+                if not (mod.name == "community_remaster" and constraint.names[0] == "community_patch")]
+
+    def install_order(self, mods: list[Mod]) -> list[Mod]:
+        '''Stable topological order of mods: prerequisites first, mods with strict requirements before
+           the mods they don't allow when it's possible. Mods which are a part of prerequisites cycle
+           keep their original order at the end of the list'''
+        order, cycled = self.sort(mods)
+        return order + cycled
+
+    def get_exclusive_pairs(self, mods: list[Mod]) -> list[tuple[int, int]]:
+        '''Indexes of the mods with strict requirements which don't allow each other,
+           no install order lets them be installed together'''
+        strict = [(index, mod, self.get_allowed_neighbours(mod))
+                  for index, mod in enumerate(mods) if self.is_strict(mod)]
+        return [(index, other_index)
+                for position, (index, mod, allowed) in enumerate(strict)
+                for other_index, other, other_allowed in strict[position + 1:]
+                if other.name not in allowed and mod.name not in other_allowed]
+
+    def sort(self, mods: list[Mod], strict_order: bool = True) -> tuple[list[Mod], list[Mod]]:
+        '''Returns ordered mods and the mods which couldn't be ordered because of prerequisites cycle.
+           Order of strict mods is only a preference, it's dropped if it can't be combined with prerequisites,
+           conflict is reported by the strict requirements check of the step then'''
+        # several versions of the same mod can be present in the library
+        indexes_by_name = {}
+        for index, mod in enumerate(mods):
+            indexes_by_name.setdefault(mod.name, []).append(index)
+        dependents = [[] for _ in mods]
+        dependencies_left = [0] * len(mods)
+
+        def add_edge(before: int, after: int) -> None:
+            if before != after:
+                dependents[before].append(after)
+                dependencies_left[after] += 1
+
+        for index, mod in enumerate(mods):
+            for constraint in self.get_requirements(mod):
+                for name in constraint.name_set:
+                    for provider in indexes_by_name.get(name, ()):
+                        add_edge(provider, index)
+            if strict_order and self.is_strict(mod):
+                allowed = self.get_allowed_neighbours(mod)
+                for name, others in indexes_by_name.items():
+                    if name not in allowed:
+                        for other in others:
+                            add_edge(index, other)
+
+        ready = [index for index, left in enumerate(dependencies_left) if left == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            index = heapq.heappop(ready)
+            order.append(mods[index])
+            for dependent in dependents[index]:
+                dependencies_left[dependent] -= 1
+                if dependencies_left[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+
+        cycled = [mods[index] for index, left in enumerate(dependencies_left) if left > 0]
+        if cycled and strict_order:
+            return self.sort(mods, strict_order=False)
+        return order, cycled
+
+    def check_requirements(self, mod: Mod, state: dict) -> PlanConflict | None:
+        for constraint in self.get_requirements(mod):
+            provider = constraint.find_installed(state)
+            if provider is None:
+                return PlanConflict("missing_requirement", mod.name, " | ".join(constraint.names),
+                                    "required content is neither installed nor requested")
+            if (provider == "community_patch"
+               and "community_remaster" in state
+               and mod.name != "community_remaster"
+               and "community_remaster" not in constraint.name_set):
+                return PlanConflict("missing_requirement", mod.name, provider,
+                                    "mod for ComPatch can't be installed over ComRemaster")
+            if not constraint.versions_match(state[provider]["version"]):
+                return PlanConflict("requirement_version", mod.name, provider,
+                                    f"version {state[provider]['version']} doesn't satisfy "
+                                    f"{[str(version) for _, version in constraint.versions]}")
+            missing_options = constraint.missing_options(state[provider])
+            if missing_options:
+                return PlanConflict("requirement_options", mod.name, provider,
+                                    f"options are not installed: {missing_options}")
+
+        if self.is_strict(mod):
+            others = set(state) - self.get_allowed_neighbours(mod)
+            if others:
+                return PlanConflict("strict_requirements", mod.name, ", ".join(sorted(others)),
+                                    "mod can't be installed alongside other content")
+        return None
+
+    @staticmethod
+    def check_incompatibles(mod: Mod, state: dict) -> PlanConflict | None:
+        if not mod.incompatibilities:
+            return None
+        others = {name: entry for name, entry in state.items() if name != mod.name}
+        for constraint in mod.incompatibilities:
+            conflicting = constraint.find_installed(others)
+            if conflicting is not None and constraint.matches(others[conflicting]):
+                return PlanConflict("incompatible", mod.name, conflicting,
+                                    f"declared incompatible with version {others[conflicting]['version']}")
+        return None
+
+    def check_mod(self, mod: Mod) -> PlanConflict | None:
+        '''Checks which don't depend on the other mods'''
+        if self.game_installment is not None and mod.installment != self.game_installment:
+            return PlanConflict("installment", mod.name, details=f"mod is for {mod.installment}")
+        if self.commod_version is not None:
+            compatible, _ = mod.compatible_with_mod_manager(self.commod_version)
+            if not compatible:
+                return PlanConflict("commod_version", mod.name,
+                                    details=f"requires {mod.patcher_version_requirement}")
+        return None
+
+    def resolve(self, requested: list[tuple[Mod, dict]]) -> InstallPlan:
+        '''Orders requested (mod, install_settings) pairs and checks that every step can be installed
+           over the content installed before it. Only the root causes are reported as conflicts,
+           mods depending on the rejected ones are reported as blocked'''
+        plan = InstallPlan()
+        settings_by_name = {}
+        mods = []
+        for mod, install_settings in requested:
+            if mod.name in settings_by_name:
+                plan.conflicts.append(PlanConflict("duplicate", mod.name,
+                                                   details="requested more than once"))
+                continue
+            conflict = self.check_mod(mod)
+            if conflict is not None:
+                plan.conflicts.append(conflict)
+                continue
+            settings_by_name[mod.name] = install_settings
+            mods.append(mod)
+
+        # the later requested mod of exclusive pair is rejected, mods requiring it are blocked
+        excluded = set()
+        for index, other_index in self.get_exclusive_pairs(mods):
+            if index not in excluded and other_index not in excluded:
+                excluded.add(other_index)
+                plan.conflicts.append(PlanConflict(
+                    "strict_requirements", mods[other_index].name, mods[index].name,
+                    "mods with strict requirements can't be installed together"))
+        mods = [mod for index, mod in enumerate(mods) if index not in excluded]
+
+        order, cycled = self.sort(mods)
+        if cycled:
+            cycled_names = [mod.name for mod in cycled]
+            for mod in cycled:
+                plan.conflicts.append(PlanConflict("cycle", mod.name, ", ".join(cycled_names),
+                                                   "prerequisites form a cycle"))
+
+        rejected = {conflict.mod_name for conflict in plan.conflicts}
+        state = dict(self.installed_content)
+        for mod in order:
+            blocked_by = [constraint for constraint in self.get_requirements(mod)
+                          if constraint.find_installed(state) is None and constraint.name_set & rejected]
+            if blocked_by:
+                rejected.add(mod.name)
+                plan.conflicts.append(PlanConflict("blocked", mod.name,
+                                                   ", ".join(sorted(blocked_by[0].name_set & rejected))))
+                continue
+
+            conflict = self.check_requirements(mod, state)
+            if conflict is None:
+                conflict = self.check_incompatibles(mod, state)
+            if conflict is None:
+                _, can_be_reinstalled, warning, _ = mod.check_reinstallability(state,
+                                                                               self.installed_descriptions)
+                if not can_be_reinstalled:
+                    conflict = PlanConflict("reinstall", mod.name, details=warning.text)
+            if conflict is not None:
+                rejected.add(mod.name)
+                plan.conflicts.append(conflict)
+                continue
+
+            state[mod.name] = self.get_entry(mod, settings_by_name[mod.name])
+            plan.steps.append((mod, settings_by_name[mod.name]))
+
+        # incompatibilities are checked both ways - mod installed earlier can declare
+        # that it's incompatible with the one installed later
+        for mod, _ in plan.steps:
+            conflict = self.check_incompatibles(mod, state)
+            if conflict is not None:
+                plan.conflicts.append(conflict)
+        return plan
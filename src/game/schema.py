@@ -0,0 +1,262 @@
+'''
+Manifest schemas compiled once at import into validator objects.
+
+Scheme format is the same as used for manifests from the start:
+{name: [list of possible types, required(bool)]} or for constrained schemas
+{name: [list of possible types, required(bool), int or float value[min, max]]}
+Generics (e.g. list[str]) are supported for type checking in simple schemas.
+'''
+from __future__ import annotations
+
+import logging
+import typing
+
+
+class SchemaResult:
+    '''Outcome of schema validation, evaluates to bool so can be used as a plain check result'''
+    __slots__ = ("valid", "field", "error")
+
+    def __init__(self, valid: bool = True, field: str | None = None, error: str = "") -> None:
+        self.valid = valid
+        self.field = field
+        self.error = error
+
+    def __bool__(self) -> bool:
+        return self.valid
+
+    def __repr__(self) -> str:
+        if self.valid:
+            return "SchemaResult(valid)"
+        return f"SchemaResult(invalid, field={self.field!r}, error={self.error!r})"
+
+
+VALID = SchemaResult()
+
+
+class ValidationReport:
+    '''Structured result of manifest validation, collects checks as
+       (check id, path, verdict, details) tuples and renders them to text only when needed.
+       Verdict is True for passed checks, False for failed and None for skipped ones.
+       Evaluates to bool so can be used as a plain validation result'''
+    __slots__ = ("path", "checks", "valid")
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        self.checks = []
+        self.valid = True
+
+    def __bool__(self) -> bool:
+        return self.valid
+
+    def __repr__(self) -> str:
+        return f"ValidationReport({self.path!r}, valid={self.valid}, checks={len(self.checks)})"
+
+    def check(self, check_id: str, verdict: bool, path: str | None = None, details: str = "") -> bool:
+        self.checks.append((check_id, path, verdict, details))
+        if not verdict:
+            self.valid = False
+        return verdict
+
+    def check_schema(self, check_id: str, result: SchemaResult, path: str | None = None) -> bool:
+        return self.check(check_id, result.valid, path, result.error)
+
+    def skip(self, check_id: str, details: str = "") -> None:
+        self.checks.append((check_id, None, None, details))
+
+    @property
+    def failures(self) -> list[tuple]:
+        return [check for check in self.checks if check[2] is False]
+
+    @staticmethod
+    def render_check(check: tuple) -> str:
+        check_id, path, verdict, details = check
+        line = f"{'SKIP' if verdict is None else 'PASS' if verdict else 'FAIL'}: {check_id}"
+        if path:
+            line += f" [{path}]"
+        if details:
+            line += f" - {details}"
+        return line
+
+    def render(self, failures_only: bool = False) -> str:
+        checks = self.failures if failures_only else self.checks
+        lines = [f"--- Manifest validation {'passed' if self.valid else 'FAILED'}: {self.path} ---"]
+        lines.extend(f"   {self.render_check(check)}" for check in checks)
+        return "\n".join(lines)
+
+    def log(self, logger: logging.Logger) -> None:
+        '''Writes report to the log when validation failed or when debug logging is enabled (dev mode)'''
+        if not self.valid:
+            logger.error(self.render())
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(self.render())
+
+
+class FieldRule:
+    '''Single compiled field of scheme'''
+    __slots__ = ("name", "types", "plain_types", "generics", "required", "numeric", "min_value", "max_value")
+
+    def __init__(self, name: str, rule: list, constrained: bool = False) -> None:
+        self.name = name
+        self.types = rule[0]
+        self.required = rule[1]
+        self.plain_types = tuple(type_entry for type_entry in self.types
+                                 if not hasattr(type_entry, "__origin__"))
+        # for fields with generics only generic types are checked against the values
+        # of the same container type, all other values are accepted
+        self.generics = tuple((typing.get_origin(type_entry), typing.get_args(type_entry))
+                              for type_entry in self.types
+                              if hasattr(type_entry, "__origin__"))
+        self.numeric = constrained and (float in self.types or int in self.types)
+        if self.numeric:
+            self.min_value, self.max_value = rule[2]
+        else:
+            self.min_value = self.max_value = None
+
+    def type_error(self, value) -> SchemaResult:
+        return SchemaResult(False, self.name,
+                            f"key '{self.name}' has value {value} of invalid type '{type(value)}', "
+                            f"expected: {' or '.join(str(type_inst) for type_inst in self.types)}")
+
+    def check_generics(self, value) -> bool:
+        for origin, args in self.generics:
+            if isinstance(value, origin):
+                if type(value) not in (dict, list):
+                    return False
+                for value_internal in value:
+                    if not isinstance(value_internal, args):
+                        return False
+        return True
+
+
+class SchemaValidator:
+    '''Compiled scheme, validates dicts and lists of dicts without any per-call setup'''
+    def __init__(self, scheme: dict, constrained: bool = False) -> None:
+        self.scheme = scheme
+        self.constrained = constrained
+        self.rules = tuple(FieldRule(name, rule, constrained) for name, rule in scheme.items())
+        self.keys = frozenset(scheme)
+
+    def unknown_keys(self, validating_dict: dict) -> set:
+        return validating_dict.keys() - self.keys
+
+    def validate(self, validating_dict: dict) -> SchemaResult:
+        if not isinstance(validating_dict, dict):
+            return SchemaResult(False, None, f"Validated part of scheme is not a dict: {validating_dict}")
+
+        get = validating_dict.get
+        for rule in self.rules:
+            value = get(rule.name)
+            if value is None:
+                if rule.required:
+                    return SchemaResult(False, rule.name,
+                                        f"key '{rule.name}' is required but couldn't be found in manifest")
+                continue
+
+            if self.constrained:
+                result = self.validate_constrained(rule, value)
+                if not result:
+                    return result
+            elif rule.generics:
+                if not rule.check_generics(value):
+                    return rule.type_error(value)
+            elif not isinstance(value, rule.plain_types):
+                return rule.type_error(value)
+        return VALID
+
+    @staticmethod
+    def validate_constrained(rule: FieldRule, value) -> SchemaResult:
+        if not isinstance(value, rule.plain_types):
+            return SchemaResult(False, rule.name,
+                                f"key '{rule.name}' is of invalid type '{type(value)}', "
+                                f"expected '{rule.types}'")
+        if rule.numeric:
+            try:
+                value = float(value) if float in rule.types else int(value)
+            except ValueError:
+                return SchemaResult(False, rule.name,
+                                    f"key '{rule.name}' can't be converted to number as supported - "
+                                    f"found value '{value}'")
+            if not (rule.min_value <= value <= rule.max_value):
+                return SchemaResult(False, rule.name,
+                                    f"key '{rule.name}' is not in supported range "
+                                    f"'{rule.min_value}-{rule.max_value}'")
+        return VALID
+
+    def validate_list(self, validating_list: list) -> SchemaResult:
+        '''Validates every dict in list with the same scheme, other elements are ignored'''
+        for element in validating_list:
+            if isinstance(element, dict):
+                result = self.validate(element)
+                if not result:
+                    return result
+        return VALID
+
+
+MANIFEST_SCHEMA = SchemaValidator({
+    "name": [[str], True],
+    "display_name": [[str], True],
+    "installment": [[str], False],
+    "version": [[str, int, float], True],
+    "build": [[str], True],
+    "description": [[str], True],
+    "authors": [[str], True],
+    "language": [[str], False],  # defaults to ru
+
+    "patcher_version_requirement": [[str, float, int, list[str | float | int]], True],
+    "prerequisites": [[list], True],
+    "incompatible": [[list], False],
+    "compatible_patch_versions": [[bool, str], False],
+    "compatible_minor_versions": [[bool, str], False],
+    "safe_reinstall_options": [[bool, str], False],
+
+    "release_date": [[str], False],
+    "trailer_url": [[str], False],
+    "translations": [[list[str]], False],
+    "link": [[str], False],
+    "tags": [[list[str]], False],
+    "logo": [[str], False],
+    "install_banner": [[str], False],
+    "screenshots": [[list], False],
+    "change_log": [[str], False],
+    "other_info": [[str], False],
+    "patcher_options": [[dict], False],
+    "config_options": [[dict], False],
+    "optional_content": [[list], False],
+    "strict_requirements": [[bool, str], False],
+    "no_base_content": [[bool, str], False],
+})
+
+PREREQ_SCHEMA = SchemaValidator({
+    "name": [[str, list[str]], True],
+    "versions": [[list[str | int | float]], False],
+    "optional_content": [[list[str]], False]
+})
+
+PATCHER_OPTIONS_SCHEMA = SchemaValidator({
+    "gravity": [[float], False, [-100.0, -1.0]],
+    "skins_in_shop": [[int], False, [8, 32]],
+    "blast_damage_friendly_fire": [[bool, str], False, None],
+    "game_font": [[str], False]
+}, constrained=True)
+
+CONFIG_OPTIONS_SCHEMA = SchemaValidator({
+    "firstLevel": [[str], False],
+    "DoNotLoadMainmenuLevel": [[str], False],
+    "weather_AtmoRadius": [[str], False],
+    "weather_ConfigFile": [[str], False]
+}, constrained=True)
+
+OPTIONAL_CONTENT_SCHEMA = SchemaValidator({
+    "name": [[str], True],
+    "display_name": [[str], True],
+    "description": [[str], True],
+
+    "default_option": [[str], False],
+    "forced_option": [[bool, str], False],
+    "install_settings": [[list], False],
+})
+
+INSTALL_SETTINGS_SCHEMA = SchemaValidator({
+    "name": [[str], True],
+    "description": [[str], True],
+})
@@ -0,0 +1,241 @@
+'''
+Snapshots of game copy state for switching between mod setups without reinstall.
+Snapshot keeps the game data, exe, render dll and install manifest as a list of content hashes,
+file contents are stored once per hash in a blob store shared by all the snapshots of the game copy.
+Restore writes only the files whose content differs from the current state.
+
+Store lives inside the game copy, so blobs are on the same volume as the game files:
+
+    commod_snapshots/
+        blobs/ab/ab12...      - file contents by sha256
+        snapshots/<name>.json - path -> [hash, size, mtime_ns]
+        state.json            - last known hashes of game files by size and mtime
+'''
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+import typing
+from datetime import datetime
+from pathlib import Path
+
+from helpers.errors import SnapshotNotFound
+from helpers.file_ops import BlobStore
+
+if typing.TYPE_CHECKING:
+    from .environment import GameCopy
+
+logger = logging.getLogger('dem')
+
+
+class RestoreResult:
+    __slots__ = ("name", "written", "removed", "unchanged", "bytes_written", "duration")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.written = []
+        self.removed = []
+        self.unchanged = 0
+        self.bytes_written = 0
+        self.duration = 0.0
+
+    def __repr__(self) -> str:
+        return (f"RestoreResult({self.name!r}, written={len(self.written)}, removed={len(self.removed)}, "
+                f"unchanged={self.unchanged}, bytes={self.bytes_written}, duration={self.duration:.1f}s)")
+
+    def report(self) -> dict:
+        return {"snapshot": self.name,
+                "written": self.written,
+                "removed": self.removed,
+                "unchanged": self.unchanged,
+                "bytes_written": self.bytes_written,
+                "duration": round(self.duration, 2)}
+
+
+class SnapshotStore:
+    '''Content addressed snapshots of a single game copy'''
+    STORE_DIR = "commod_snapshots"
+    RENDER_DLL = "dxrender9.dll"
+
+    def __init__(self, game: GameCopy) -> None:
+        self.game = game
+        self.store_path = os.path.join(game.game_root_path, self.STORE_DIR)
+        self.blobs = BlobStore(os.path.join(self.store_path, "blobs"))
+        self.snapshots_path = os.path.join(self.store_path, "snapshots")
+        self.state_path = os.path.join(self.store_path, "state.json")
+        # relative path -> [hash, size, mtime_ns] of the game file when it was last hashed
+        self.state = None
+
+    @staticmethod
+    def read_json(path: str) -> typing.Any:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_json(content: typing.Any, path: str) -> None:
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def get_snapshot_path(self, name: str) -> str:
+        safe_name = "".join(char for char in name if char.isalnum() or char in "-_. ").strip()
+        if not safe_name:
+            raise ValueError(f"Invalid snapshot name: '{name}'")
+        return os.path.join(self.snapshots_path, f"{safe_name}.json")
+
+    def get_tracked_files(self) -> dict[str, str]:
+        '''Relative path -> full path of the game files which are a part of snapshot'''
+        root = self.game.game_root_path
+        tracked = {}
+        for path, dirs, filenames in os.walk(self.game.data_path):
+            for sfile in filenames:
+                full_path = os.path.join(path, sfile)
+                tracked[Path(os.path.relpath(full_path, root)).as_posix()] = full_path
+        for full_path in (self.game.target_exe, os.path.join(root, self.RENDER_DLL)):
+            if os.path.isfile(full_path):
+                tracked[os.path.basename(full_path)] = full_path
+        return tracked
+
+    def load_state(self) -> dict:
+        if self.state is None:
+            self.state = {}
+            if os.path.exists(self.state_path):
+                try:
+                    self.state = self.read_json(self.state_path)
+                except (OSError, ValueError) as ex:
+                    logger.warning(f"Snapshot state index is broken, files will be rehashed: {ex}")
+        return self.state
+
+    def save_state(self) -> None:
+        os.makedirs(self.store_path, exist_ok=True)
+        self.write_json(self.state, self.state_path)
+
+    def scan(self, store_blobs: bool = False) -> dict[str, list]:
+        '''Current state of the tracked files, only the files changed since the last scan are hashed.
+           With store_blobs every file content is guaranteed to be in the blob store'''
+        state = self.load_state()
+        current = {}
+        hashed = 0
+        for relative_path, full_path in self.get_tracked_files().items():
+            stat = os.stat(full_path)
+            known = state.get(relative_path)
+            if (known is not None and known[1] == stat.st_size and known[2] == stat.st_mtime_ns
+               and (not store_blobs or known[0] in self.blobs)):
+                current[relative_path] = known
+                continue
+            if store_blobs:
+                digest = self.blobs.put(full_path)
+            else:
+                with open(full_path, "rb") as f:
+                    digest = hashlib.file_digest(f, "sha256").hexdigest()
+            current[relative_path] = [digest, stat.st_size, stat.st_mtime_ns]
+            hashed += 1
+        logger.debug(f"Scanned {len(current)} game files, {hashed} of them hashed")
+        self.state = current
+        self.save_state()
+        return current
+
+    def capture(self, name: str, description: str = "") -> dict:
+        '''Saves the current state of the game copy as the named snapshot, replaces the existing one'''
+        start = time.perf_counter()
+        files = self.scan(store_blobs=True)
+        snapshot = {"name": name,
+                    "description": description,
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "exe_version": self.game.exe_version,
+                    "installed_content": self.game.installed_content,
+                    "files": files}
+        os.makedirs(self.snapshots_path, exist_ok=True)
+        self.write_json(snapshot, self.get_snapshot_path(name))
+        logger.info(f"Captured snapshot '{name}' of {len(files)} files "
+                    f"in {time.perf_counter() - start:.1f}s")
+        return snapshot
+
+    def load(self, name: str) -> dict:
+        snapshot_path = self.get_snapshot_path(name)
+        if not os.path.exists(snapshot_path):
+            raise SnapshotNotFound(name)
+        return self.read_json(snapshot_path)
+
+    def list_snapshots(self) -> list[dict]:
+        '''Snapshot headers without the file lists, oldest first'''
+        snapshots = []
+        if os.path.isdir(self.snapshots_path):
+            for entry in os.scandir(self.snapshots_path):
+                if entry.name.endswith(".json"):
+                    try:
+                        snapshot = self.read_json(entry.path)
+                    except (OSError, ValueError) as ex:
+                        logger.warning(f"Can't read snapshot '{entry.path}': {ex}")
+                        continue
+                    snapshot["files"] = len(snapshot.get("files", {}))
+                    snapshots.append(snapshot)
+        return sorted(snapshots, key=lambda snapshot: snapshot.get("created", ""))
+
+    def restore(self, name: str) -> RestoreResult:
+        '''Brings the game copy to the state of snapshot. Files are copied from the blob store,
+           files which are not a part of the snapshot are removed. Caller is expected to process
+           the game copy again afterwards, as exe and installed content can change'''
+        start = time.perf_counter()
+        snapshot = self.load(name)
+        target_files = snapshot["files"]
+        missing_blobs = [relative_path for relative_path, (digest, _, _) in target_files.items()
+                         if digest not in self.blobs]
+        if missing_blobs:
+            raise SnapshotNotFound(name, f"Snapshot blobs are missing for {len(missing_blobs)} files")
+
+        result = RestoreResult(name)
+        current = self.scan()
+        root = self.game.game_root_path
+        try:
+            for relative_path, (digest, size, mtime_ns) in target_files.items():
+                known = current.get(relative_path)
+                if known is not None and known[0] == digest:
+                    result.unchanged += 1
+                    continue
+                self.blobs.restore(digest, os.path.join(root, relative_path), mtime_ns)
+                current[relative_path] = [digest, size, mtime_ns]
+                result.written.append(relative_path)
+                result.bytes_written += size
+
+            for relative_path in [path for path in current if path not in target_files]:
+                os.remove(os.path.join(root, relative_path))
+                current.pop(relative_path)
+                result.removed.append(relative_path)
+            # snapshots don't record directories, so only the ones emptied by restore are removed
+            stop_paths = {os.path.normcase(self.game.data_path), os.path.normcase(root)}
+            for relative_path in result.removed:
+                path = os.path.dirname(os.path.join(root, relative_path))
+                while (os.path.normcase(path) not in stop_paths
+                       and os.path.isdir(path) and not os.listdir(path)):
+                    os.rmdir(path)
+                    path = os.path.dirname(path)
+        finally:
+            self.state = current
+            self.save_state()
+
+        result.duration = time.perf_counter() - start
+        logger.info(f"Restored snapshot: {result}")
+        return result
+
+    def delete(self, name: str) -> None:
+        snapshot_path = self.get_snapshot_path(name)
+        if not os.path.exists(snapshot_path):
+            raise SnapshotNotFound(name)
+        os.remove(snapshot_path)
+        self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        '''Removes blobs which are not referenced by any snapshot, returns freed bytes'''
+        referenced = set()
+        if os.path.isdir(self.snapshots_path):
+            for entry in os.scandir(self.snapshots_path):
+                if entry.name.endswith(".json"):
+                    referenced.update(digest for digest, _, _ in self.read_json(entry.path)["files"].values())
+        freed = self.blobs.collect_garbage(referenced)
+        logger.info(f"Snapshot store garbage collected, {freed} bytes freed")
+        return freed
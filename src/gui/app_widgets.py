@@ -9,6 +9,8 @@ from pathlib import Path
 from typing import Optional
 import platform
 import sys, traceback
+import typing
+from collections import OrderedDict
 
 import aiofiles.os
 import aioshutil
@@ -18,17 +20,21 @@ from flet import (Column, FloatingActionButton, Icon, IconButton, Image, Row,
                   Tab, Tabs, Text, TextField, UserControl, colors, icons)
 
 import localisation.service as localisation
+from game.compatibility import InstalledIndex
 from game.data import DATE, OWN_VERSION, is_known_lang
 from game.environment import (DistroStatus, GameCopy, GameStatus,
                               InstallationContext)
-from game.mod import GameInstallments, Mod
+from game.ledger import InstallLedger
+from game.mod import GameInstallments, Mod, ValidationTier
 from helpers import file_ops
 from helpers.errors import (DXRenderDllNotFound, ExeIsRunning,
                             HasManifestButUnpatched, InvalidExistingManifest,
                             ModsDirMissing, NoModsFound,
                             PatchedButDoesntHaveManifest)
-from helpers.file_ops import (extract_from_to, get_internal_file_path,
-                              get_proc_by_names, load_yaml, process_markdown)
+from helpers.file_ops import (extract_from_to, get_extract_checkpoint_path,
+                              get_internal_file_path, get_proc_by_names,
+                              load_yaml, markdown_cache, process_markdown,
+                              thumbnail_cache)
 from localisation.service import (COMPATCH_GITHUB, DEM_DISCORD,
                                   DEM_DISCORD_MODS_DOWNLOAD_SCREEN,
                                   WIKI_COMPATCH, LangFlags, SupportedLanguages,
@@ -51,6 +57,18 @@ class App:
 
     def __post_init__(self):
         self.session = self.context.current_session
+        self.files_verification = None
+
+    async def verify_mods_files(self):
+        '''Background run of the deep validation tier for mods in library which were
+           not opened or installed yet, so broken mods are found without slowing down the load'''
+        for mod in list(self.session.mods.values()):
+            for translation in list(mod.translations_loaded.values()):
+                if translation.validation_tier == ValidationTier.STRUCTURAL:
+                    await asyncio.to_thread(translation.validate_files)
+                    if translation.validation_tier == ValidationTier.FILES_MISSING:
+                        translation.can_install = False
+            await asyncio.sleep(0.01)
 
     async def refresh_page(self, index=None):
         if index is not None:
@@ -205,6 +223,13 @@ class App:
 
         if self.context.validated_mod_configs:
             for manifest_path, manifest in self.context.validated_mod_configs.items():
+                loaded_mod = self.session.mods.get(manifest_path)
+                if (loaded_mod is not None
+                   and self.session.tracked_mods_hashes.get(loaded_mod.id)
+                   == self.context.hashed_mod_manifests[manifest_path]):
+                    # mod kept from the previous session, only compatibility is reloaded below
+                    continue
+
                 mod = Mod(manifest, Path(manifest_path).parent)
 
                 if mod.id in self.session.tracked_mods:
@@ -213,17 +238,15 @@ class App:
                         # self.logger.debug(f"{mod.id} already loaded to distro, skipping")
                         continue
                     else:
-                        self.session.tracked_mods.remove(mod.id)
-                        self.session.tracked_mods_hashes.pop(mod.id, None)
-                        self.session.mods.pop(manifest_path, None)
+                        if loaded_mod is not None:
+                            self.context.compatibility.forget(loaded_mod)
+                        self.untrack_mod(manifest_path, mod.id)
                         self.logger.debug(f"{mod.id} was tracked but hash is different, removing from distro")
                 try:
                     self.logger.debug(f"--- Loading {mod.id} to distro ---")
-                    mod.load_translations(load_gui_info=True)
+                    # GUI info (markdown, images) is loaded when mod card is shown
+                    mod.load_translations()
                     mod.load_commod_compatibility(self.context.commod_version)
-                    mod.load_game_compatibility(self.game.installment)
-                    mod.load_session_compatibility(self.game.installed_content,
-                                                   self.game.installed_descriptions)
                     self.session.mods[manifest_path] = mod
                     self.session.tracked_mods.add(mod.id)
                     self.session.tracked_mods_hashes[mod.id] = \
@@ -231,16 +254,31 @@ class App:
                 except Exception as ex:
                     self.logger.error(f'{ex!r}')
                     continue
-        self.logger.debug("-- Loaded distro --")
 
         removed_mods = set(self.session.mods.keys()) - set(self.context.validated_mod_configs.keys())
         for mod_path in removed_mods:
             mod_id = self.session.mods[mod_path].id
-            self.session.tracked_mods.remove(mod_id)
-            self.session.tracked_mods_hashes.pop(mod_id, None)
-            self.session.mods.pop(mod_path, None)
+            self.untrack_mod(mod_path, mod_id)
             self.logger.debug(f"Removed {mod_id} from session as it was deleted")
 
+        # installed content is indexed once, only the mods which depend on changed content are rechecked
+        installed_index = InstalledIndex(self.game.installed_content, self.game.installed_descriptions)
+        for manifest_path, mod in list(self.session.mods.items()):
+            try:
+                mod.load_game_compatibility(self.game.installment)
+                self.context.compatibility.load_session_compatibility(mod, installed_index)
+            except Exception as ex:
+                self.logger.error(f'{ex!r}')
+                self.untrack_mod(manifest_path, mod.id)
+        self.logger.debug("-- Loaded distro --")
+        if self.files_verification is None or self.files_verification.done():
+            self.files_verification = create_task(self.verify_mods_files())
+
+    def untrack_mod(self, manifest_path: str, mod_id: str):
+        self.session.tracked_mods.discard(mod_id)
+        self.session.tracked_mods_hashes.pop(mod_id, None)
+        self.session.mods.pop(manifest_path, None)
+
 
 class GameCopyListItem(UserControl):
     def __init__(self, game_name, game_path,
@@ -1196,14 +1234,10 @@ class SettingsScreen(UserControl):
         await self.update_async()
 
         if self.app.context.distribution_dir:
-            # self.app.context.validated_mod_configs.clear()
-            loaded_steam_game_paths = self.app.context.current_session.steam_game_paths
-            self.app.context.current_session = InstallationContext.Session()
-            self.app.session = self.app.context.current_session
             # TODO: maybe do a full steam path reload?
             # or maybe also copy steam_parsing_error
-            self.app.session.steam_game_paths = loaded_steam_game_paths
-            # self.app.load_distro()
+            self.app.context.new_session(keep_loaded_mods=True)
+            self.app.session = self.app.context.current_session
             await self.app.load_distro_async()
         else:
             self.app.logger.debug("No distro dir found in context")
@@ -1218,14 +1252,10 @@ class SettingsScreen(UserControl):
             self.app.config.current_game = ""
 
             if self.app.context.distribution_dir:
-                # self.app.context.validated_mod_configs.clear()
-                loaded_steam_game_paths = self.app.context.current_session.steam_game_paths
-                self.app.context.current_session = InstallationContext.Session()
-                self.app.session = self.app.context.current_session
                 # TODO: maybe do a full steam path reload?
                 # or maybe also copy steam_parsing_error
-                self.app.session.steam_game_paths = loaded_steam_game_paths
-                # self.app.load_distro()
+                self.app.context.new_session(keep_loaded_mods=True)
+                self.app.session = self.app.context.current_session
                 await self.app.load_distro_async()
             else:
                 self.app.logger.debug("No distro dir found in context")
@@ -1473,6 +1503,7 @@ class ModInfo(UserControl):
 
         self.screenshot_index = 0
         self.max_screenshot_index = len(self.mod.screenshots) - 1
+        self.showing_compare = False
         self.screenshots = ft.Ref[ft.Container]()
         self.screenshot_view = ft.Ref[Image]()
         self.screenshot_text = ft.Ref[Text]()
@@ -1489,6 +1520,8 @@ class ModInfo(UserControl):
         self.expanded = not self.expanded
         self.container.current.height = 0 if not self.expanded else None
         await self.update_async()
+        if self.expanded and self.mod.screenshots:
+            await self.show_screen()
 
     async def switch_tab(self, e):
         self.tab_index = e.data
@@ -1500,12 +1533,7 @@ class ModInfo(UserControl):
         if self.mod.screenshots:
             self.screenshot_index = 0
             self.max_screenshot_index = len(self.mod.screenshots) - 1
-            self.screenshot_view.current.src = self.mod.screenshots[self.screenshot_index]["path"]
-            self.screenshot_view.current.data = self.mod.screenshots[self.screenshot_index]
-            self.screenshot_text.current.value = self.mod.screenshots[self.screenshot_index]["text"]
-            self.screenshot_text.current.visible = bool(self.mod.screenshots[self.screenshot_index]["text"])
-            await self.screenshot_view.current.update_async()
-            await self.screenshot_text.current.update_async()
+            await self.show_screen()
 
     async def update_change_log(self):
         pass
@@ -1536,16 +1564,18 @@ class ModInfo(UserControl):
         await self.update_screens()
 
         if self.main_mod.translations_loaded:
-            for lang, mod in self.main_mod.translations_loaded.items():
-                if mod.known_language:
+            for lang in self.main_mod.languages:
+                # translations are not loaded until selected, so only the loaded ones are marked
+                mod = self.main_mod.translations_loaded.get(lang)
+                if is_known_lang(lang):
                     flag = get_internal_file_path(LangFlags[lang].value)
                 else:
                     flag = get_internal_file_path(LangFlags.other.value)
 
                 icon = Image(flag, width=26)
-                icon.tooltip = mod.lang_label.capitalize()
+                icon.tooltip = Mod.get_lang_label(lang).capitalize()
 
-                if not mod.can_install:
+                if mod is not None and not mod.can_install:
                     icon.opacity = 0.5
                     icon.tooltip += f' ({tr("cant_be_installed")})'
 
@@ -1562,12 +1592,7 @@ class ModInfo(UserControl):
                 self.screenshot_index = 0
             else:
                 self.screenshot_index += 1
-            self.screenshot_view.current.src = self.mod.screenshots[self.screenshot_index]["path"]
-            self.screenshot_view.current.data = self.mod.screenshots[self.screenshot_index]
-            self.screenshot_text.current.value = self.mod.screenshots[self.screenshot_index]["text"]
-            self.screenshot_text.current.visible = bool(self.mod.screenshots[self.screenshot_index]["text"])
-            await self.screenshot_view.current.update_async()
-            await self.screenshot_text.current.update_async()
+            await self.show_screen()
 
     async def previous_screen(self, e):
         if self.mod.screenshots:
@@ -1575,20 +1600,45 @@ class ModInfo(UserControl):
                 self.screenshot_index = self.max_screenshot_index
             else:
                 self.screenshot_index -= 1
-            self.screenshot_view.current.src = self.mod.screenshots[self.screenshot_index]["path"]
-            self.screenshot_view.current.data = self.mod.screenshots[self.screenshot_index]
-            self.screenshot_text.current.value = self.mod.screenshots[self.screenshot_index]["text"]
-            self.screenshot_text.current.visible = bool(self.mod.screenshots[self.screenshot_index]["text"])
+            await self.show_screen()
+
+    async def show_screen(self):
+        screen = self.mod.screenshots[self.screenshot_index]
+        self.showing_compare = False
+        self.screenshot_view.current.src = thumbnail_cache.get_cached(screen["path"], "screenshot")
+        self.screenshot_view.current.data = screen
+        self.screenshot_text.current.value = screen["text"]
+        self.screenshot_text.current.visible = bool(screen["text"])
+        await self.screenshot_view.current.update_async()
+        await self.screenshot_text.current.update_async()
+
+        if not self.expanded:
+            # collapsed info is mounted for every mod in list, thumbnails are made when it's opened
+            return
+        resized = await thumbnail_cache.get_async(screen["path"], "screenshot")
+        if (self.screenshot_view.current.data is screen and not self.showing_compare
+                and self.screenshot_view.current.src != resized):
+            self.screenshot_view.current.src = resized
             await self.screenshot_view.current.update_async()
-            await self.screenshot_text.current.update_async()
+        self.prefetch_screens()
+
+    def prefetch_screens(self):
+        '''Neighbours in carousel and the comparison screen are prepared before they are requested'''
+        screenshots = self.mod.screenshots
+        current = screenshots[self.screenshot_index]
+        thumbnail_cache.prefetch(current["compare_path"], "screenshot")
+        if len(screenshots) > 1:
+            for step in (1, -1):
+                neighbour = screenshots[(self.screenshot_index + step) % len(screenshots)]
+                thumbnail_cache.prefetch(neighbour["path"], "screenshot")
 
     async def compare_screen(self, e):
         screen_widget = self.screenshot_view.current
-        if screen_widget.data["compare_path"]:
-            if screen_widget.src == self.mod.screenshots[self.screenshot_index]["path"]:
-                screen_widget.src = self.mod.screenshots[self.screenshot_index]["compare_path"]
-            else:
-                screen_widget.src = self.mod.screenshots[self.screenshot_index]["path"]
+        screen = screen_widget.data
+        if screen and screen["compare_path"]:
+            self.showing_compare = not self.showing_compare
+            path = screen["compare_path"] if self.showing_compare else screen["path"]
+            screen_widget.src = await thumbnail_cache.get_async(path, "screenshot")
             await screen_widget.update_async()
 
     # async def launch_url(self, e):
@@ -1726,19 +1776,19 @@ class ModInfo(UserControl):
                 ], expand=True)]
 
         req_list = []
-        for req_tuple in self.mod.individual_require_status:
-            req = req_tuple[0]
-            ok_status = req_tuple[1]
-            req_errors = [line.strip() for line in req_tuple[2]]
+        for req, req_verdict in self.mod.individual_require_status:
+            ok_status = req_verdict.ok
+            req_errors = [line.strip() for line in req_verdict.lines]
 
             version = req.get("versions")
-            mention_versions = req.get("mention_versions")
+            mention_versions = req_verdict.mention_versions
 
             if version is None:
                 version = ""
             else:
-                if self.mod.requirements_style == "strict":
-                    version = [ver_str.replace("=", "") for ver_str in version]
+                if self.mod.requirements_style in ("strict", "any"):
+                    if self.mod.requirements_style == "strict":
+                        version = [ver_str.replace("=", "") for ver_str in version]
                     if len(version) <= 2:
                         version = or_word.join(version)
                     else:
@@ -1775,7 +1825,7 @@ class ModInfo(UserControl):
             req_list.append(Row([
                 icon,
                 Column([
-                    Row([Text(req["name_label"],
+                    Row([Text(req_verdict.label,
                               weight=ft.FontWeight.W_500,
                               color=ft.colors.ON_PRIMARY_CONTAINER),
                          Text(version_string,
@@ -1796,24 +1846,22 @@ class ModInfo(UserControl):
             )
 
         incomp_list = []
-        for incomp_tuple in self.mod.individual_incomp_status:
-            incomp = incomp_tuple[0]
-            incomp_ok_status = incomp_tuple[1]
-            incomp_errors = [line.strip() for line in incomp_tuple[2]]
+        for incomp, incomp_verdict in self.mod.individual_incomp_status:
+            incomp_ok_status = incomp_verdict.ok
+            incomp_errors = [line.strip() for line in incomp_verdict.lines]
 
             version = incomp.get("versions")
             if version is None:
                 version = ""
             else:
-                if self.mod.incompatibles_style == "strict":
-                    version = [ver_str.replace("=", "") for ver_str in version]
+                if self.mod.incompatibles_style in ("strict", "any"):
+                    if self.mod.incompatibles_style == "strict":
+                        version = [ver_str.replace("=", "") for ver_str in version]
                     if len(version) <= 2:
                         version = or_word.join(version)
                     else:
                         version = (", ".join(version[:-2])
                                    + ", " + or_word.join(version[-2:]))
-
-                    version = or_word.join(version)
                 elif self.mod.incompatibles_style == "range":
                     version = but_word.join(version)
                 else:
@@ -1845,7 +1893,7 @@ class ModInfo(UserControl):
             incomp_list.append(Row([
                 icon,
                 Column([
-                    Row([Text(incomp["name_label"],
+                    Row([Text(incomp_verdict.label,
                               weight=ft.FontWeight.W_500,
                               color=ft.colors.ON_PRIMARY_CONTAINER),
                          Text(version_string,
@@ -2098,6 +2146,9 @@ class ModArchiveItem(UserControl):
         self.archive_extension = Path(self.archive_path).suffix.replace(".", "").upper()
         self.mod = mod_dummy
         self.key = self.mod.id
+        self.extract_path = os.path.join(self.app.context.distribution_dir, "mods", self.mod.id)
+        # previous extraction was interrupted and will continue from its checkpoint
+        self.resumable = os.path.exists(get_extract_checkpoint_path(self.extract_path))
 
         self.extract_btn = ft.Ref[ft.ElevatedButton]()
         self.about_archived_mod = ft.Ref[ft.OutlinedButton]()
@@ -2131,9 +2182,10 @@ class ModArchiveItem(UserControl):
         self.file_counting_text.current.visible = True
         self.version_label.current.visible = False
         await self.version_label.current.update_async()
-        mods_path = os.path.join(self.app.context.distribution_dir, "mods")
-        await extract_from_to(self.archive_path, os.path.join(mods_path, self.mod.id),
-                              self.progress_show, loading_text)
+        await extract_from_to(self.archive_path, self.extract_path,
+                              self.progress_show, loading_text,
+                              self.app.context.archive_path_indexes.get(str(self.archive_path)),
+                              self.app.context.distribution_store)
         self.extracting = False
         self.app.context.archived_mods.pop(self.archive_path, None)
         await self.app.close_alert()
@@ -2194,7 +2246,7 @@ class ModArchiveItem(UserControl):
                         Column([
                             Row([
                                  ft.Container(ft.ElevatedButton(
-                                    tr("extract").capitalize(),
+                                    tr("resume_extract" if self.resumable else "extract").capitalize(),
                                     icon=ft.icons.UNARCHIVE_ROUNDED,
                                     ref=self.extract_btn,
                                     disabled=self.extracting,
@@ -2210,7 +2262,8 @@ class ModArchiveItem(UserControl):
                                             ft.MaterialState.DISABLED: ft.colors.SURFACE_VARIANT
                                         }
                                     ),
-                                    tooltip=tr("extract_mod").capitalize(),
+                                    tooltip=tr("resume_extract_mod" if self.resumable
+                                               else "extract_mod").capitalize(),
                                     on_click=self.extract), alignment=ft.alignment.center)
                                  ],
                                 alignment=ft.MainAxisAlignment.CENTER,
@@ -2268,6 +2321,10 @@ class ModItem(UserControl):
             self.app.local_mods.game_is_running = True
             await self.app.refresh_page()
             return
+        if not await self.validate_files():
+            await self.app.show_alert(f"{self.mod.display_name} {self.mod.version} [{self.mod.build}]",
+                                      tr("not_validated_mod_manifest"))
+            return
         if not self.app.page.overlay:
             bg = ft.Container(Row([Column(
                 controls=[], alignment=ft.MainAxisAlignment.CENTER,
@@ -2281,8 +2338,20 @@ class ModItem(UserControl):
             self.app.page.overlay.append(fg)
             await self.app.page.update_async()
 
+    async def validate_files(self) -> bool:
+        '''Deep validation of mod files is deferred until the mod is opened or installed'''
+        files_ok = await asyncio.to_thread(self.main_mod.validate_files)
+        if self.mod is not self.main_mod:
+            files_ok &= await asyncio.to_thread(self.mod.validate_files)
+        if not files_ok and not self.install_btn.current.disabled:
+            self.install_btn.current.disabled = True
+            self.install_btn.current.tooltip = tr("not_validated_mod_manifest")
+            await self.install_btn.current.update_async()
+        return files_ok
+
     async def toggle_info(self, e):
         if self.about_mod_btn.current.text == tr("about_mod").capitalize():
+            create_task(self.validate_files())
             self.about_mod_btn.current.text = tr("hide_menu").capitalize()
             await self.info_container.current.toggle()
             await self.app.local_mods.mods_list_view.current.scroll_to_async(
@@ -2301,14 +2370,16 @@ class ModItem(UserControl):
         if lang_to_switch == self.mod.language:
             return
 
-        self.mod = self.main_mod.translations_loaded[lang_to_switch]
+        translation = await asyncio.to_thread(self.main_mod.get_translation, lang_to_switch)
+        if translation is None:
+            return
+        self.mod = translation
 
         self.mod_name_text.current.value = self.mod.display_name
         await self.mod_name_text.current.update_async()
         self.author_text.current.value = f"{tr(self.mod.developer_title)} {self.mod.authors}"
         await self.author_text.current.update_async()
-        self.mod_logo_img.current.src = self.mod.logo_path
-        await self.mod_logo_img.current.update_async()
+        await self.update_logo()
         await self.update_install_btn()
         await self.info_container.current.update_info()
 
@@ -2386,8 +2457,16 @@ class ModItem(UserControl):
             await self.version_info.current.update_async()
 
         if self.app.config.prefered_mod_lang != self.mod.language:
-            if self.app.config.prefered_mod_lang in self.main_mod.translations_loaded.keys():
+            if self.app.config.prefered_mod_lang in self.main_mod.languages:
                 await self.change_lang(lang=self.app.config.prefered_mod_lang)
+                return
+        await self.update_logo()
+
+    async def update_logo(self):
+        logo_path = await thumbnail_cache.get_async(self.mod.logo_path, "logo")
+        if self.mod_logo_img.current.src != logo_path:
+            self.mod_logo_img.current.src = logo_path
+            await self.mod_logo_img.current.update_async()
 
     def build(self):
         tr_tags = [tr(tag.lower()).capitalize() for tag in self.mod.tags]
@@ -2413,7 +2492,7 @@ class ModItem(UserControl):
             ft.Container(
                 Column([
                     ft.ResponsiveRow([
-                        Image(src=self.mod.logo_path,
+                        Image(src=thumbnail_cache.get_cached(self.mod.logo_path, "logo"),
                               ref=self.mod_logo_img,
                               fit=ft.ImageFit.FIT_WIDTH,
                               gapless_playback=True,
@@ -2520,7 +2599,7 @@ class ModInstallWizard(UserControl):
         self.mod_item = parent
         self.app: App = app
         self.main_mod: Mod | None = mod
-        self.mod: Mod | None = self.main_mod.translations_loaded[language]
+        self.mod: Mod | None = self.main_mod.get_translation(language)
         self.current_lang = language
         self.current_screen = None
         self.options = []
@@ -2753,8 +2832,10 @@ class ModInstallWizard(UserControl):
         self.app.page.floating_action_button.visible = False
         await self.app.page.floating_action_button.update_async()
         validated_translations = []
-        for lang, mod in self.main_mod.translations_loaded.items():
-            if mod.can_install:
+        # all translations are loaded to show which of them can be installed
+        for lang in self.main_mod.languages:
+            mod = await asyncio.to_thread(self.main_mod.get_translation, lang)
+            if mod is not None and mod.can_install:
                 validated_translations.append(mod)
 
         num_valid_translations = len(validated_translations)
@@ -2791,19 +2872,67 @@ class ModInstallWizard(UserControl):
             await self.install_status_text.current.update_async()
             self.callback_time = now_time
 
-    async def show_install_progress(self, e):
-        await self.update_status_capsules(self.Steps.INSTALLING)
+    def get_install_settings(self) -> dict:
+        install_settings = {}
 
+        if self.mod.no_base_content:
+            install_settings["base"] = "skip"
+        else:
+            install_settings["base"] = "yes"
+        for option_card in self.options:
+            option = option_card.option
+            if option_card.complex_selector:
+                # if no options is chosen this will be the default
+                install_settings[option.name] = "skip"
+                for check in option_card.checkboxes:
+                    if check.value:
+                        install_settings[option.name] = check.data
+            else:
+                check = option_card.checkboxes[0]
+                install_settings[option.name] = "yes" if check.value else "skip"
+        return install_settings
+
+    def plan_install(self, install_settings: dict, is_comrem_or_patch: bool,
+                     is_compatch: bool) -> file_ops.CopyPlan:
+        '''Dry run of everything show_install_progress will copy'''
+        game = self.app.game
+        distribution_dir = str(Path(self.mod.distribution_dir).parent)
+        plan = file_ops.CopyPlan()
+        if is_comrem_or_patch:
+            plan.add([os.path.join(distribution_dir, "patch")], os.path.join(game.game_root_path, "data"),
+                     "community_patch")
+            plan.add([os.path.join(distribution_dir, "libs")], game.game_root_path, "community_patch")
+        if not is_compatch:
+            self.mod.plan_install(game.data_path, install_settings, plan)
+        return plan
+
+    async def show_install_progress(self, e):
         is_comrem_or_patch = self.mod.name == "community_remaster"
         is_compatch = False
         if isinstance(e.control.data, dict):
             is_compatch = e.control.data["is_compatch"]
         is_comrem = is_comrem_or_patch and not is_compatch
 
+        install_settings = self.get_install_settings()
+        plan = None
+        try:
+            plan = await asyncio.to_thread(self.plan_install, install_settings,
+                                           is_comrem_or_patch, is_compatch)
+            install_estimate, space_error = Mod.describe_install_plan(plan)
+        except Exception as ex:
+            # estimate is informational, install reports its own errors
+            self.app.logger.error(f"Couldn't plan install: {ex!r}")
+            install_estimate, space_error = "", ""
+        if space_error:
+            await self.app.show_alert(space_error, tr("cant_be_installed"))
+            return
+
+        await self.update_status_capsules(self.Steps.INSTALLING)
+
         if is_compatch:
             mod_banner_path = get_internal_file_path("assets/compatch_logo.png")
         else:
-            mod_banner_path = self.mod.banner_path
+            mod_banner_path = await thumbnail_cache.get_async(self.mod.banner_path, "banner")
 
         self.screen.current.content = ft.Column([
             Text(f"{tr('install_in_progress').capitalize()}...",
@@ -2814,6 +2943,12 @@ class ModInstallWizard(UserControl):
                       fit=ft.ImageFit.CONTAIN,
                       col={"xs": 12, "xl": 11, "xxl": 10})
                 ], alignment=ft.MainAxisAlignment.CENTER),
+            ft.ResponsiveRow([Text(install_estimate,
+                                   visible=bool(install_estimate),
+                                   color=ft.colors.SECONDARY,
+                                   text_align=ft.TextAlign.CENTER,
+                                   no_wrap=False, col=12)],
+                             alignment=ft.MainAxisAlignment.CENTER),
             ft.ProgressRing(width=100, height=100),
             ft.ResponsiveRow([Text(ref=self.install_details_number_text,
                                    text_align=ft.TextAlign.CENTER,
@@ -2837,29 +2972,24 @@ class ModInstallWizard(UserControl):
         self.close_wizard_btn_tooltip.current.message = tr("install_please_wait")
         await self.close_wizard_btn_tooltip.current.update_async()
 
-        install_settings = {}
-
-        if self.mod.no_base_content:
-            install_settings["base"] = "skip"
-        else:
-            install_settings["base"] = "yes"
-        for option_card in self.options:
-            option = option_card.option
-            if option_card.complex_selector:
-                # if no options is chosen this will be the default
-                install_settings[option.name] = "skip"
-                for check in option_card.checkboxes:
-                    if check.value:
-                        install_settings[option.name] = check.data
-            else:
-                check = option_card.checkboxes[0]
-                install_settings[option.name] = "yes" if check.value else "skip"
-
         game = self.app.game
         session = self.app.session
         mod = self.mod
         distribution_dir = str(Path(mod.distribution_dir).parent)
         game_root = game.game_root_path
+        checkpoint = file_ops.Checkpoint(game.install_checkpoint_path,
+                                         {"kind": "install",
+                                          "mod": mod.name,
+                                          "display_name": mod.display_name,
+                                          "version": str(mod.version),
+                                          "build": mod.build,
+                                          "language": mod.language,
+                                          "is_compatch": is_compatch,
+                                          "install_settings": install_settings})
+        await asyncio.to_thread(checkpoint.load)
+        ledger = InstallLedger(game)
+        if plan is not None:
+            await asyncio.to_thread(ledger.begin, plan, None, checkpoint)
 
         try:
             if is_comrem_or_patch:
@@ -2877,12 +3007,14 @@ class ModInstallWizard(UserControl):
                 await file_ops.copy_from_to_async_fast(
                     [os.path.join(distribution_dir, "patch")],
                     os.path.join(game_root, "data"),
-                    self.callable_for_progbar)
+                    self.callable_for_progbar,
+                    checkpoint)
 
                 await file_ops.copy_from_to_async_fast(
                     [os.path.join(distribution_dir, "libs")],
                     game_root,
-                    self.callable_for_progbar)
+                    self.callable_for_progbar,
+                    checkpoint)
                 file_ops.rename_effects_bps(game_root)
 
             status_ok = False
@@ -2892,7 +3024,8 @@ class ModInstallWizard(UserControl):
                     install_settings,
                     game.installed_content,
                     self.callable_for_progbar,
-                    self.callable_for_status
+                    self.callable_for_status,
+                    checkpoint
                     )
                 self.app.logger.info(f'Installation status: {"ok" if status_ok else "error"}')
 
@@ -2937,6 +3070,8 @@ class ModInstallWizard(UserControl):
                 changes_description = file_ops.patch_memory(game.target_exe)
 
             if status_ok:
+                await asyncio.to_thread(ledger.commit)
+                checkpoint.finish()
                 er_message = f"Couldn't dump install manifest to '{game.installed_manifest_path}'!"
                 try:
                     game.installed_content = game.installed_content | session.content_in_processing
@@ -2949,12 +3084,15 @@ class ModInstallWizard(UserControl):
                     self.app.logger.error(ex)
                     self.app.logger.error(er_message)
                     return
+            else:
+                checkpoint.save()
 
             if is_comrem_or_patch or mod.vanilla_mod:
                 self.app.game.process_game_install(self.app.game.game_root_path)
         except Exception as ex:
             self.app.logger.error(ex)
             print(traceback.format_exc())
+            checkpoint.save()
             await self.show_install_results(False, [], ex)
             return
 
@@ -3109,9 +3247,9 @@ class ModInstallWizard(UserControl):
                                  on_click=self.close_wizard)
             ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
 
-        for mod in self.app.session.mods.values():
-            mod.load_session_compatibility(self.app.game.installed_content,
-                                           self.app.game.installed_descriptions)
+        self.app.context.compatibility.update(self.app.session.mods.values(),
+                                              self.app.game.installed_content,
+                                              self.app.game.installed_descriptions)
 
         await self.screen.current.update_async()
         self.can_close = False
@@ -3139,7 +3277,10 @@ class ModInstallWizard(UserControl):
 
     def get_flag_buttons(self):
         flag_buttons = []
-        for lang, mod in self.main_mod.translations_loaded.items():
+        for lang in self.main_mod.languages:
+            mod = self.main_mod.translations_loaded.get(lang)
+            if mod is None:
+                continue
             if mod.known_language:
                 flag = get_internal_file_path(LangFlags[lang].value)
             else:
@@ -3338,7 +3479,7 @@ class ModInstallWizard(UserControl):
         if is_compatch:
             mod_banner_path = get_internal_file_path("assets/compatch_logo.png")
         else:
-            mod_banner_path = self.mod.banner_path
+            mod_banner_path = await thumbnail_cache.get_async(self.mod.banner_path, "banner")
 
         self.screen.current.content = ft.Column([
             ft.ResponsiveRow([
@@ -3481,7 +3622,8 @@ class ModInstallWizard(UserControl):
 
         self.screen.current.content = ft.Column([
             ft.ResponsiveRow([
-                Image(src=self.mod.banner_path, visible=self.mod.banner_path is not None,
+                Image(src=await thumbnail_cache.get_async(self.mod.banner_path, "banner"),
+                      visible=self.mod.banner_path is not None,
                       col={"xs": 6, "xl": 5, "xxl": 4})
                 ], alignment=ft.MainAxisAlignment.CENTER),
             ft.ResponsiveRow([
@@ -3527,7 +3669,10 @@ class ModInstallWizard(UserControl):
         await self.screen.current.update_async()
 
     async def set_install_lang(self, e):
-        self.mod = self.main_mod.translations_loaded[e.control.data]
+        translation = await asyncio.to_thread(self.main_mod.get_translation, e.control.data)
+        if translation is None:
+            return
+        self.mod = translation
         await self.show_welcome_mod_screen()
 
     async def update_status_capsules(self, step: Steps):
@@ -3677,16 +3822,109 @@ class ModInstallWizard(UserControl):
             alignment=ft.alignment.center, padding=ft.padding.symmetric(vertical=15, horizontal=10))
 
 
+class ModListEntry:
+    '''Family of mods shown as a single row of library list: all versions of the same mod for the same game'''
+    __slots__ = ("key", "mods", "search_text", "name_key")
+
+    def __init__(self, key: str, mods: list[Mod]) -> None:
+        self.key = key
+        self.mods = sorted(mods, key=lambda mod: mod.id.lower())
+        self.name_key = self.mods[0].id.lower()
+        search_parts = []
+        for mod in self.mods:
+            search_parts.extend((mod.name, mod.version, mod.build, mod.authors))
+            for translation in (mod, *mod.translations_loaded.values()):
+                search_parts.append(translation.display_name)
+                search_parts.extend(tr(tag.lower()) for tag in translation.tags)
+        self.search_text = "\n".join(str(part) for part in search_parts).lower()
+
+    def is_same(self, other: "ModListEntry") -> bool:
+        return len(self.mods) == len(other.mods) and all(
+            mod is other_mod for mod, other_mod in zip(self.mods, other.mods))
+
+    def matches(self, words: list[str]) -> bool:
+        return all(word in self.search_text for word in words)
+
+    @property
+    def compatible_key(self) -> tuple[bool, str]:
+        # compatibility depends on the selected game, so it's not stored
+        return not self.mods[-1].can_install, self.name_key
+
+
+class ModListIndex:
+    '''Rows of library list, filtering and sorting are done here, not on the controls'''
+    SORTINGS = ("sort_by_name", "sort_compatible_first")
+
+    def __init__(self) -> None:
+        self.entries = {}
+        self.query = ""
+        self.sorting = "sort_by_name"
+        # keys of entries which pass the filter, in the display order
+        self.rows = []
+
+    def update(self, mods: typing.Iterable[Mod]) -> set[str]:
+        '''Rebuilds families from loaded mods, returns keys of families which were changed or removed'''
+        families = {}
+        for mod in mods:
+            families.setdefault(mod.installment + mod.name, []).append(mod)
+        changed = set(self.entries) - set(families)
+        entries = {}
+        for key, family in families.items():
+            entry = ModListEntry(key, family)
+            previous = self.entries.get(key)
+            if previous is not None and previous.is_same(entry):
+                entry = previous
+            else:
+                changed.add(key)
+            entries[key] = entry
+        self.entries = entries
+        self.apply()
+        return changed
+
+    def apply(self) -> None:
+        words = self.query.lower().split()
+        entries = [entry for entry in self.entries.values() if entry.matches(words)]
+        if self.sorting == "sort_compatible_first":
+            entries.sort(key=lambda entry: entry.compatible_key)
+        else:
+            entries.sort(key=lambda entry: entry.name_key)
+        self.rows = [entry.key for entry in entries]
+
+    @property
+    def mod_ids(self) -> set[str]:
+        return {mod.id for entry in self.entries.values() for mod in entry.mods}
+
+
 class LocalModsScreen(UserControl):
+    # big libraries are virtualized: only the rows around the visible part of list have controls,
+    # the rest of the list is replaced by spacers of estimated height
+    VIRTUALIZE_FROM_ROWS = 30
+    ROW_EXTENT = 250
+    VISIBLE_ROWS = 5
+    OVERSCAN_ROWS = 4
+    # controls of rows which were scrolled out are kept for reuse, up to this number
+    CACHED_ROWS = 64
+
     def __init__(self, app: App, **kwargs):
         super().__init__(self, **kwargs)
         self.app = app
         self.tracked_loaded_mods = set()
+        self.index = ModListIndex()
+        # family key -> control of the row, least recently shown first
+        self.row_controls = OrderedDict()
+        self.window_start = 0
+        self.visible_rows = self.VISIBLE_ROWS
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
         self.mods_list_view = ft.Ref[ft.ListView]()
+        self.mods_filter = ft.Ref[ft.Row]()
+        self.mods_search = ft.Ref[TextField]()
+        self.mods_sorting = ft.Ref[ft.Dropdown]()
         self.mods_archived_list_view = ft.Ref[ft.ListView]()
         self.add_mods_column = ft.Ref[Column]()
         self.add_mod_card = ft.Ref[ft.Card]()
         self.no_mods_warning = ft.Ref[Text]()
+        self.rejected_mods_btn = ft.Ref[ft.TextButton]()
         self.game_info = ft.Ref[ft.Container]()
         self.get_mod_archive_dialog = ft.FilePicker(on_result=self.get_mod_archive_result)
         self.refreshing = False
@@ -3770,16 +4008,6 @@ class LocalModsScreen(UserControl):
     async def update_list(self):
         await self.app.load_distro_async()
 
-        mod_items = self.mods_list_view.current.controls
-        self.tracked_loaded_mods = set()
-        for mod_item in mod_items:
-            if isinstance(mod_item, ModItem):
-                self.tracked_loaded_mods.add(mod_item.main_mod.id)
-            elif isinstance(mod_item, ft.AnimatedSwitcher):
-                self.tracked_loaded_mods.add(mod_item.content.main_mod.id)
-                for other_version in mod_item.content.other_versions.values():
-                    self.tracked_loaded_mods.add(other_version.main_mod.id)
-
         if self.app.config.current_distro:
             self.app.logger.debug(f"Have current distro {self.app.config.current_distro}")
         else:
@@ -3794,67 +4022,30 @@ class LocalModsScreen(UserControl):
         no_mods = not self.app.session.mods
         no_archives = not self.app.context.archived_mods
 
+        changed = self.index.update(self.app.session.mods.values())
+        for key in changed:
+            self.row_controls.pop(key, None)
+        self.tracked_loaded_mods = self.index.mod_ids
+
         if no_mods and no_archives:
             self.no_mods_warning.current.visible = True
             self.no_mods_warning.current.value = tr("no_local_mods_found").capitalize()
+        elif not no_mods and not self.index.rows:
+            self.no_mods_warning.current.visible = True
+            self.no_mods_warning.current.value = tr("no_mods_match_filter")
         else:
             self.no_mods_warning.current.visible = False
         # await self.no_mods_warning.current.update_async()
 
+        rejected_mods = self.app.session.mods_validation_info
+        self.rejected_mods_btn.current.visible = bool(rejected_mods) and not no_env
+        self.rejected_mods_btn.current.text = f'{tr("rejected_mods").capitalize()}: {len(rejected_mods)}'
+
         self.mods_list_view.current.visible = not no_mods and not no_env
+        self.mods_filter.current.visible = len(self.index.entries) > 1 and not no_env
         self.mods_archived_list_view.current.visible = not no_archives and not no_env
 
-        session_mods = set()
-
-        mods_to_show = []
-
-        for path, mod in self.app.session.mods.items():
-            session_mods.add(mod.id)
-            if mod.id not in self.tracked_loaded_mods:
-                mods_to_show.append(ModItem(self.app, mod))
-                # self.app.logger.debug(f"Adding mod {mod.id} to list")
-                self.tracked_loaded_mods.add(mod.id)
-            else:
-                pass
-                # self.app.logger.debug(f"Mod {mod.id} already in list")
-
-        mods_to_show.sort(key=lambda item: item.main_mod.id.lower())
-
-        mods_families = {}
-        for mod_item in mods_to_show:
-            mod_name = mod_item.main_mod.name
-            installment = mod_item.main_mod.installment
-            version_string = mod_item.main_mod.version + f" [{mod_item.main_mod.build}]"
-            if mods_families.get(installment+mod_name) is None:
-                mods_families[installment+mod_name] = [mod_item]
-            else:
-                for sister_mod in mods_families[installment+mod_name]:
-                    sister_version_string = (sister_mod.main_mod.version
-                                             + f"[{sister_mod.main_mod.build}]")
-                    sister_mod.other_versions[version_string] = mod_item
-                    mod_item.other_versions[sister_version_string] = sister_mod
-                mods_families[installment+mod_name].append(mod_item)
-
-        for mod_short_id, mod_items in mods_families.items():
-            if len(mod_items) == 1:
-                self.mods_list_view.current.controls.append(mod_items[0])
-            else:
-                newest_mod = mod_items[-1]
-                version_switcher = ft.AnimatedSwitcher(
-                    newest_mod,
-                    transition=ft.AnimatedSwitcherTransition.SCALE,
-                    duration=0,
-                    reverse_duration=0)
-                for item in mod_items:
-                    item.switcher = version_switcher
-                self.mods_list_view.current.controls.append(version_switcher)
-
-        outdated_mods = self.tracked_loaded_mods - session_mods
-        if outdated_mods:
-            for mod_item in mod_items:
-                if mod_item.main_mod.id in outdated_mods:
-                    self.app.logger.debug(f"Removing mod {mod_item.main_mod.id} from list")
-                    mod_items.remove(mod_item)
+        self.render_window()
 
         archived_mod_items = self.mods_archived_list_view.current.controls
         tracked_archived_mods = set([mod_item.mod.id for mod_item in archived_mod_items])
@@ -3878,6 +4069,100 @@ class LocalModsScreen(UserControl):
         # self.app.logger.debug(f"{len(self.mods_list_view.current.controls)} elements in mods list view")
         self.app.logger.debug(f"Tracked mods: {self.tracked_loaded_mods}")
 
+    def get_row_control(self, key: str) -> ModItem | ft.AnimatedSwitcher:
+        row_control = self.row_controls.get(key)
+        if row_control is None:
+            mod_items = [ModItem(self.app, mod) for mod in self.index.entries[key].mods]
+            # logos of the rows in window, overscan included, are resized before the cards are mounted
+            thumbnail_cache.prefetch(mod_items[-1].mod.logo_path, "logo")
+            if len(mod_items) == 1:
+                row_control = mod_items[0]
+            else:
+                for mod_item in mod_items:
+                    for sister_mod in mod_items:
+                        if sister_mod is not mod_item:
+                            version_string = f"{sister_mod.main_mod.version} [{sister_mod.main_mod.build}]"
+                            mod_item.other_versions[version_string] = sister_mod
+                newest_mod = mod_items[-1]
+                row_control = ft.AnimatedSwitcher(
+                    newest_mod,
+                    transition=ft.AnimatedSwitcherTransition.SCALE,
+                    duration=0,
+                    reverse_duration=0)
+                for item in mod_items:
+                    item.switcher = row_control
+            self.row_controls[key] = row_control
+        else:
+            self.row_controls.move_to_end(key)
+        return row_control
+
+    def get_window(self) -> tuple[int, int]:
+        rows_count = len(self.index.rows)
+        if rows_count <= self.VIRTUALIZE_FROM_ROWS:
+            return 0, rows_count
+        window_size = self.visible_rows + 2 * self.OVERSCAN_ROWS
+        start = max(0, min(self.window_start, rows_count - window_size))
+        return start, min(rows_count, start + window_size)
+
+    def render_window(self) -> None:
+        '''Puts controls only for the rows of current window to the list view'''
+        start, end = self.get_window()
+        shown = [self.get_row_control(key) for key in self.index.rows[start:end]]
+        self.top_spacer.height = start * self.ROW_EXTENT
+        self.bottom_spacer.height = (len(self.index.rows) - end) * self.ROW_EXTENT
+        self.top_spacer.visible = start > 0
+        self.bottom_spacer.visible = end < len(self.index.rows)
+        self.mods_list_view.current.controls = [self.top_spacer, *shown, self.bottom_spacer]
+
+        shown_keys = set(self.index.rows[start:end])
+        for key in list(self.row_controls):
+            if len(self.row_controls) <= max(self.CACHED_ROWS, len(shown_keys)):
+                break
+            if key not in shown_keys:
+                del self.row_controls[key]
+
+    async def list_scrolled(self, e: ft.OnScrollEvent):
+        if len(self.index.rows) <= self.VIRTUALIZE_FROM_ROWS:
+            return
+        if e.viewport_dimension:
+            self.visible_rows = max(self.VISIBLE_ROWS, int(e.viewport_dimension // self.ROW_EXTENT) + 1)
+        first_visible = int(e.pixels // self.ROW_EXTENT)
+        window_start = max(0, first_visible - self.OVERSCAN_ROWS)
+        # window is moved only when overscan is mostly used up, so small scrolls don't cause updates
+        if abs(window_start - self.window_start) >= self.OVERSCAN_ROWS // 2:
+            self.window_start = window_start
+            self.render_window()
+            await self.mods_list_view.current.update_async()
+
+    async def filter_changed(self, e):
+        self.index.query = self.mods_search.current.value or ""
+        self.index.sorting = self.mods_sorting.current.value or self.index.sorting
+        self.index.apply()
+        self.window_start = 0
+        self.no_mods_warning.current.visible = not self.index.rows
+        self.no_mods_warning.current.value = tr("no_mods_match_filter")
+        self.render_window()
+        await self.no_mods_warning.current.update_async()
+        await self.mods_list_view.current.update_async()
+
+    async def show_rejected_mods(self, e):
+        '''Shows why mods were rejected, based on validation reports of their manifests'''
+        reports = self.app.session.mods_validation_info.values()
+        dlg = ft.AlertDialog(
+            title=Row([Icon(ft.icons.WARNING_AMBER_ROUNDED, color=ft.colors.ERROR),
+                       Text(tr("rejected_mods").capitalize())]),
+            shape=ft.buttons.RoundedRectangleBorder(radius=10),
+            content=Column([Text(tr("rejected_mods_explanation"), weight=ft.FontWeight.W_500),
+                            Text("\n\n".join(report.render(failures_only=True) for report in reports),
+                                 selectable=True, size=12)],
+                           spacing=10, tight=True, scroll=ft.ScrollMode.AUTO),
+            actions=[ft.TextButton("Ok", on_click=self.app.close_alert)],
+            actions_padding=ft.padding.only(left=20, bottom=20, right=20)
+            )
+        self.app.page.dialog = dlg
+        dlg.open = True
+        await self.app.page.update_async()
+
     async def get_mod_archive_result(self, e: ft.FilePickerResultEvent):
         if e.files:
             print(f"path: {e.files}")
@@ -4060,6 +4345,27 @@ class LocalModsScreen(UserControl):
                                  visible=False,
                                  ref=self.no_mods_warning,
                                  col={"md": 12, "lg": 11, "xxl": 10}),
+                            ft.TextButton(icon=ft.icons.WARNING_AMBER_ROUNDED,
+                                          visible=False,
+                                          ref=self.rejected_mods_btn,
+                                          on_click=self.show_rejected_mods,
+                                          col={"md": 12, "lg": 11, "xxl": 10}),
+                            Row([
+                                TextField(hint_text=tr("search_mods").capitalize(),
+                                          prefix_icon=ft.icons.SEARCH_ROUNDED,
+                                          value=self.index.query,
+                                          on_change=self.filter_changed,
+                                          ref=self.mods_search,
+                                          dense=True, expand=True),
+                                ft.Dropdown(options=[ft.dropdown.Option(key=sorting,
+                                                                        text=tr(sorting).capitalize())
+                                                     for sorting in ModListIndex.SORTINGS],
+                                            value=self.index.sorting,
+                                            on_change=self.filter_changed,
+                                            ref=self.mods_sorting,
+                                            dense=True, width=220)
+                                ], visible=False, ref=self.mods_filter,
+                                col={"md": 12, "lg": 11, "xxl": 10}),
                             ft.ListView([], spacing=10, padding=0,
                                         ref=self.mods_list_view,
                                         col={"md": 12, "lg": 11, "xxl": 10}),
@@ -4090,7 +4396,8 @@ class LocalModsScreen(UserControl):
                         padding=ft.padding.only(right=22), alignment=ft.alignment.top_center),
                     self.get_mod_archive_dialog
                     ],
-                    expand=True, scroll=ft.ScrollMode.ALWAYS)
+                    expand=True, scroll=ft.ScrollMode.ALWAYS,
+                    on_scroll=self.list_scrolled, on_scroll_interval=100)
             ]),
             margin=ft.margin.only(bottom=5), expand=True)
 
@@ -4221,7 +4528,7 @@ class HomeScreen(UserControl):
 
                 if response["api_response"]["status_code"] == 200:
                     md_raw = response["api_response"]["text"]
-                    md = process_markdown(md_raw)
+                    md = markdown_cache.process(md_raw)
                     self.markdown_content.current.value = md
                     self.checking_online.current.visible = False
                     await self.checking_online.current.update_async()
@@ -4463,14 +4770,10 @@ class HomeScreen(UserControl):
         self.app.logger.info(f"Game is now: {game_path}")
 
         if self.app.context.distribution_dir:
-            # self.app.context.validated_mod_configs.clear()
-            loaded_steam_game_paths = self.app.context.current_session.steam_game_paths
-            self.app.context.current_session = InstallationContext.Session()
-            self.app.session = self.app.context.current_session
             # TODO: maybe do a full steam path reload?
             # or maybe also copy steam_parsing_error
-            self.app.session.steam_game_paths = loaded_steam_game_paths
-            # self.app.load_distro()
+            self.app.context.new_session(keep_loaded_mods=True)
+            self.app.session = self.app.context.current_session
             await self.app.load_distro_async()
         else:
             self.app.logger.debug("No distro dir found in context")
@@ -8,7 +8,7 @@ import localisation.service as localisation
 from commod import _init_input_parser
 from game.data import get_title
 from game.environment import GameCopy, InstallationContext
-from helpers.file_ops import get_internal_file_path
+from helpers.file_ops import Checkpoint, get_internal_file_path
 from localisation.service import SupportedLanguages, tr
 
 from .app_widgets import (App, DownloadModsScreen, HomeScreen, LocalModsScreen,
@@ -288,6 +288,11 @@ async def main(page: Page):
         # app.load_distro()
         await app.load_distro_async()
         await app.change_page(index=app.config.current_section)
+        if app.game.game_root_path:
+            interrupted = Checkpoint.read(app.game.install_checkpoint_path)
+            if interrupted is not None:
+                await app.show_modal(tr("install_interrupted",
+                                        content_name=interrupted["operation"].get("display_name", "")))
 
     if "NUITKA_ONEFILE_PARENT" in os.environ:
         splash_filename = os.path.join(
@@ -87,3 +87,33 @@ class InvalidExistingManifest(Exception):
 
     def __str__(self) -> str:
         return f"Manifest is invalid: '{self.manifest_path}'"
+
+
+class InvalidInstallProfile(Exception):
+    def __init__(self, path: str, message: str = "Invalid install profile") -> None:
+        self.path = path
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        return f"{self.message}: '{self.path}'"
+
+
+class SnapshotNotFound(Exception):
+    def __init__(self, name: str, message: str = "Snapshot is not found") -> None:
+        self.name = name
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        return f"{self.message}: '{self.name}'"
+
+
+class LayerNotInLedger(Exception):
+    def __init__(self, name: str, message: str = "Content has no files recorded in install ledger") -> None:
+        self.name = name
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        return f"{self.message}: '{self.name}'"
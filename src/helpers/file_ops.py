@@ -1,12 +1,22 @@
 import asyncio
+import bisect
+import concurrent.futures
+import hashlib
 import html
+import json
 import logging
 import math
+import mmap
 import os
+import queue
 import shutil
 import struct
 import sys
+import threading
+import time
 import zipfile
+import zlib
+from collections import OrderedDict
 from math import ceil
 from pathlib import Path
 from typing import Any, Coroutine, Optional
@@ -20,6 +30,12 @@ import yaml
 from flet import Text
 from lxml import etree, objectify
 
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    # thumbnails are optional, full size images are shown without Pillow
+    PILImage = None
+
 from console import progbar
 from game import data, hd_ui
 
@@ -179,11 +195,304 @@ def count_files(directory: str) -> int:
     return len(files)
 
 
+def get_files_stats(directory: str) -> tuple[int, int]:
+    '''Returns number of files in directory and their total size'''
+    files_count = 0
+    total_size = 0
+    if os.path.isdir(directory):
+        for path, dirs, filenames in os.walk(directory):
+            files_count += len(filenames)
+            for sfile in filenames:
+                total_size += os.path.getsize(os.path.join(path, sfile))
+    return files_count, total_size
+
+
+class CopyPlan:
+    '''Dry run of copying directories over the game files, nothing is written.
+    Walks the same way as copy_from_to, files copied by several sources are counted once for disk usage'''
+    # space which is left free on the game volume after install
+    SPACE_MARGIN = 64 * 1024 * 1024
+
+    def __init__(self) -> None:
+        self.files_count = 0
+        self.bytes_to_write = 0
+        # normalised target path -> (size of the last source copied there, size of existing file)
+        self.targets = {}
+        # normalised target path -> (last source copied there, target path)
+        self.sources = {}
+        # normalised path -> path of directory which will be created
+        self.new_dirs = {}
+        self.target_roots = []
+        # normalised target path -> [(layer, source path)] of every source copied there, in copy order
+        self.layers = {}
+        # layers in the order they were added
+        self.layer_order = []
+
+    def add(self, from_path_list: list[str], to_path: str, layer: str | None = None) -> None:
+        '''Layer is the name of content the sources belong to, it's recorded by install ledger'''
+        if layer not in self.layer_order:
+            self.layer_order.append(layer)
+        for from_path in from_path_list:
+            for path, dirs, filenames in os.walk(from_path):
+                dest_dir = path.replace(from_path, to_path)
+                for directory in dirs:
+                    dest_path = os.path.join(dest_dir, directory)
+                    if not os.path.isdir(dest_path):
+                        self.new_dirs.setdefault(os.path.normcase(dest_path), dest_path)
+                for sfile in filenames:
+                    source_path = os.path.join(path, sfile)
+                    size = os.path.getsize(source_path)
+                    dest_path = os.path.join(dest_dir, sfile)
+                    dest_key = os.path.normcase(dest_path)
+                    previous = self.targets.get(dest_key)
+                    if previous is not None:
+                        existing_size = previous[1]
+                    else:
+                        try:
+                            existing_size = os.path.getsize(dest_path)
+                        except OSError:
+                            existing_size = 0
+                    self.targets[dest_key] = (size, existing_size)
+                    self.sources[dest_key] = (source_path, dest_path)
+                    self.layers.setdefault(dest_key, []).append((layer, source_path))
+                    self.files_count += 1
+                    self.bytes_to_write += size
+        self.target_roots.append(to_path)
+
+    def retarget(self, roots: dict[str, str]) -> "CopyPlan":
+        '''Same plan for another game copy, every target root of this plan is replaced by the mapped one.
+        Sources are not walked again, only the files and directories of the new target are checked'''
+        # game root contains data dir, so the longest root is matched first
+        replacements = sorted(roots.items(), key=lambda item: len(item[0]), reverse=True)
+
+        def move(path: str) -> str:
+            for old_root, new_root in replacements:
+                if path == old_root or path.startswith(old_root.rstrip("\\/") + os.sep):
+                    return new_root + path[len(old_root):]
+            raise ValueError(f"Path '{path}' is outside of the plan targets")
+
+        plan = CopyPlan()
+        plan.files_count = self.files_count
+        plan.bytes_to_write = self.bytes_to_write
+        plan.target_roots = [move(root) for root in self.target_roots]
+        plan.layer_order = list(self.layer_order)
+        for dest_key, (source_path, dest_path) in self.sources.items():
+            new_dest_path = move(dest_path)
+            new_dest_key = os.path.normcase(new_dest_path)
+            try:
+                existing_size = os.path.getsize(new_dest_path)
+            except OSError:
+                existing_size = 0
+            plan.targets[new_dest_key] = (self.targets[dest_key][0], existing_size)
+            plan.sources[new_dest_key] = (source_path, new_dest_path)
+            plan.layers[new_dest_key] = self.layers[dest_key]
+            dest_dir = os.path.dirname(new_dest_path)
+            if not os.path.isdir(dest_dir):
+                plan.new_dirs.setdefault(os.path.normcase(dest_dir), dest_dir)
+        for new_dir in self.new_dirs.values():
+            new_dir = move(new_dir)
+            if not os.path.isdir(new_dir):
+                plan.new_dirs.setdefault(os.path.normcase(new_dir), new_dir)
+        return plan
+
+    @property
+    def bytes_final(self) -> int:
+        '''Size of files which will be left after copying, every target is written once by copy_planned'''
+        return sum(size for size, _ in self.targets.values())
+
+    @property
+    def bytes_overwritten(self) -> int:
+        return sum(existing_size for _, existing_size in self.targets.values())
+
+    @property
+    def files_overwritten(self) -> int:
+        return sum(1 for _, existing_size in self.targets.values() if existing_size)
+
+    @property
+    def bytes_added(self) -> int:
+        '''Growth of used disk space'''
+        return sum(size - existing_size for size, existing_size in self.targets.values())
+
+    @property
+    def free_space(self) -> int | None:
+        free_space = None
+        for root in self.target_roots:
+            existing_root = Path(root)
+            while not existing_root.exists() and existing_root.parent != existing_root:
+                existing_root = existing_root.parent
+            try:
+                free = shutil.disk_usage(existing_root).free
+            except OSError:
+                continue
+            free_space = free if free_space is None else min(free_space, free)
+        return free_space
+
+    @property
+    def fits(self) -> bool:
+        free_space = self.free_space
+        return free_space is None or self.bytes_added + self.SPACE_MARGIN <= free_space
+
+    @property
+    def required_space(self) -> int:
+        return max(0, self.bytes_added) + self.SPACE_MARGIN
+
+    @property
+    def duration(self) -> float:
+        return copy_throughput.predict(self.bytes_to_write, self.files_count)
+
+    def __repr__(self) -> str:
+        return (f"CopyPlan(files={self.files_count}, write={self.bytes_to_write}, "
+                f"overwritten={self.bytes_overwritten}, new_dirs={len(self.new_dirs)}, "
+                f"free={self.free_space}, duration={self.duration:.1f}s)")
+
+
+class CopyThroughput:
+    '''Measured speed of copying mod files, kept between runs to predict install duration'''
+    # used until the first measurement
+    DEFAULT_SPEED = 40 * 1024 * 1024
+    FILE_OVERHEAD = 0.002
+    SAMPLES = 20
+    # small copies are dominated by overhead and don't tell much about the speed
+    MIN_SAMPLE_SIZE = 4 * 1024 * 1024
+
+    def __init__(self) -> None:
+        self.stats_path = None
+        self.samples = []
+
+    def set_location(self, stats_path: str) -> None:
+        self.stats_path = stats_path
+        self.samples = []
+        if os.path.exists(stats_path):
+            try:
+                samples = read_yaml(stats_path)
+            except (OSError, yaml.YAMLError):
+                samples = None
+            if isinstance(samples, list):
+                self.samples = [sample for sample in samples
+                                if isinstance(sample, list) and len(sample) == 3][-self.SAMPLES:]
+
+    def record(self, bytes_copied: int, files_count: int, seconds: float) -> None:
+        if bytes_copied < self.MIN_SAMPLE_SIZE or seconds <= 0:
+            return
+        self.samples.append([bytes_copied, files_count, round(seconds, 3)])
+        self.samples = self.samples[-self.SAMPLES:]
+        if self.stats_path is not None:
+            try:
+                os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+                dump_yaml(self.samples, self.stats_path)
+            except OSError as ex:
+                logger.warning(f"Couldn't save copy speed stats: {ex}")
+
+    @property
+    def speed(self) -> float:
+        '''Bytes per second, overhead of every file is subtracted from the measured time'''
+        total_bytes = sum(sample[0] for sample in self.samples)
+        total_seconds = sum(max(sample[2] - sample[1] * self.FILE_OVERHEAD, sample[2] / 2)
+                            for sample in self.samples)
+        if not total_bytes or total_seconds <= 0:
+            return self.DEFAULT_SPEED
+        return total_bytes / total_seconds
+
+    def predict(self, bytes_to_copy: int, files_count: int) -> float:
+        return bytes_to_copy / self.speed + files_count * self.FILE_OVERHEAD
+
+
+copy_throughput = CopyThroughput()
+
+
+class Checkpoint:
+    '''Progress of long copy or extraction saved on disk, so the interrupted operation can be resumed.
+    Operation is a dict describing what is being done, checkpoint is used only by the same operation.
+    Completed files are remembered with the size and modification time of the written file
+    and are skipped on resume only if they still match. When several files are written to the same path
+    in order, redoing one of them also redoes all the later ones'''
+    # seconds between periodic saves, checkpoint is also saved when the operation is interrupted
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, path: str, operation: dict) -> None:
+        self.path = path
+        # compared with the saved one, so it's normalised to what json gives back
+        self.operation = json.loads(json.dumps(operation))
+        # file key -> [written path, size, mtime_ns]
+        self.completed = {}
+        # written paths of the files completed by this run
+        self.rewritten = set()
+        # state which has to be kept from the first run, like the content replaced by the first writes
+        self.extra = {}
+        self.resumed = 0
+        self.saved_at = 0.0
+
+    @staticmethod
+    def read(path: str) -> dict | None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Checkpoint '{path}' is broken and will be ignored: {ex}")
+            return None
+
+    def load(self) -> set[str]:
+        '''Keys of the files completed by the previous run of the same operation which are still in place'''
+        saved = self.read(self.path)
+        if saved is None or saved.get("operation") != self.operation:
+            return set()
+        self.extra = saved.get("extra", {})
+        for key, (written_path, size, mtime_ns) in saved.get("completed", {}).items():
+            try:
+                stat = os.stat(written_path)
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                self.completed[key] = [written_path, size, mtime_ns]
+        self.resumed = len(self.completed)
+        if self.resumed:
+            logger.info(f"Resuming from checkpoint '{self.path}', {self.resumed} files are already done")
+        return set(self.completed)
+
+    def is_done(self, key: str) -> bool:
+        done = self.completed.get(key)
+        return done is not None and os.path.normcase(done[0]) not in self.rewritten
+
+    def complete(self, key: str, written_path: str) -> None:
+        try:
+            stat = os.stat(written_path)
+        except OSError:
+            return
+        self.completed[key] = [written_path, stat.st_size, stat.st_mtime_ns]
+        self.rewritten.add(os.path.normcase(written_path))
+        if time.monotonic() - self.saved_at > self.SAVE_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        self.saved_at = time.monotonic()
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"operation": self.operation, "completed": self.completed, "extra": self.extra},
+                          f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as ex:
+            logger.warning(f"Couldn't save checkpoint '{self.path}': {ex}")
+
+    def finish(self) -> None:
+        '''Operation is done and won't be resumed'''
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
 def copy_from_to(from_path_list: list[str], to_path: str, console: bool = False) -> None:
+    start = time.perf_counter()
     files_count = 0
+    total_size = 0
     for from_path in from_path_list:
         logger.debug(f"Copying files from '{from_path}' to '{to_path}'")
-        files_count += count_files(from_path)
+        dir_files, dir_size = get_files_stats(from_path)
+        files_count += dir_files
+        total_size += dir_size
     file_num = 1
     for from_path in from_path_list:
         for path, dirs, filenames in os.walk(from_path):
@@ -200,6 +509,171 @@ def copy_from_to(from_path_list: list[str], to_path: str, console: bool = False)
                 if console:
                     progbar.copy_progress(file_num, files_count)
                 file_num += 1
+    copy_throughput.record(total_size, files_count, time.perf_counter() - start)
+
+
+def copy_planned(plan: CopyPlan, console: bool = False, checkpoint: Checkpoint | None = None) -> None:
+    '''Copies only the final version of every planned target, files which would be
+    overwritten by the later sources of plan are skipped. Files completed according to the loaded
+    checkpoint are not copied again'''
+    start = time.perf_counter()
+    for new_dir in sorted(plan.new_dirs.values()):
+        os.makedirs(new_dir, exist_ok=True)
+    files_count = len(plan.sources)
+    for file_num, (source_path, dest_path) in enumerate(plan.sources.values(), start=1):
+        if checkpoint is not None and checkpoint.is_done(source_path):
+            continue
+        logger.debug(f" - [{file_num} of {files_count}] - {source_path} -> {dest_path}")
+        shutil.copy2(source_path, dest_path)
+        if checkpoint is not None:
+            checkpoint.complete(source_path, dest_path)
+        if console:
+            progbar.copy_progress(file_num, files_count)
+    copy_throughput.record(plan.bytes_final, files_count, time.perf_counter() - start)
+
+
+class FanOutCopy:
+    '''Copies the same plan to several game copies, every source file is read once and its chunks
+    are written to all the targets. Targets on the same device share one writer thread, so a disk is
+    never written by several threads at once, while targets on different devices are written concurrently.
+    Failure of one target doesn't stop the others'''
+    CHUNK_SIZE = 4 * 1024 * 1024
+    # chunks waiting for every device writer, bounds the memory used by the read ahead
+    QUEUE_CHUNKS = 8
+
+    class Target:
+        __slots__ = ("plan", "journal_path", "device", "files_done", "bytes_done", "written", "error")
+
+        def __init__(self, plan: CopyPlan, journal_path: str | None) -> None:
+            self.plan = plan
+            self.journal_path = journal_path
+            self.device = FanOutCopy.get_device(plan.target_roots[0]) if plan.target_roots else None
+            self.files_done = 0
+            self.bytes_done = 0
+            self.written = []
+            self.error = None
+
+    def __init__(self, plans: list[CopyPlan], journal_paths: list[str | None] | None = None) -> None:
+        if journal_paths is None:
+            journal_paths = [None] * len(plans)
+        self.targets = [FanOutCopy.Target(plan, journal_path)
+                        for plan, journal_path in zip(plans, journal_paths)]
+        self.files_count = len(plans[0].sources) if plans else 0
+        self.progress = None
+
+    @staticmethod
+    def get_device(path: str) -> int | None:
+        existing_path = Path(path)
+        while not existing_path.exists() and existing_path.parent != existing_path:
+            existing_path = existing_path.parent
+        try:
+            return os.stat(existing_path).st_dev
+        except OSError:
+            return None
+
+    def write_journal(self, target: Target, finished: bool) -> None:
+        '''Journal is kept in the target, so a failed or interrupted copy can be inspected later'''
+        if target.journal_path is None:
+            return
+        journal = {"finished": finished,
+                   "files_planned": self.files_count,
+                   "files_written": target.files_done,
+                   "bytes_written": target.bytes_done,
+                   "error": None if target.error is None else str(target.error),
+                   "written": target.written}
+        if not dump_yaml(journal, target.journal_path, sort_keys=False):
+            logger.warning(f"Couldn't write copy journal '{target.journal_path}'")
+
+    def write_loop(self, jobs: queue.Queue) -> None:
+        handles = {}
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            kind, index, payload = job
+            target = self.targets[index]
+            if target.error is not None:
+                continue
+            try:
+                if kind == "open":
+                    handles[index] = open(payload, "wb")
+                elif kind == "data":
+                    handles[index].write(payload)
+                    target.bytes_done += len(payload)
+                else:
+                    source_path, dest_path = payload
+                    handles.pop(index).close()
+                    shutil.copystat(source_path, dest_path)
+                    target.files_done += 1
+                    target.written.append(dest_path)
+                    if self.progress is not None:
+                        self.progress(index, target.files_done, self.files_count)
+            except Exception as ex:
+                # writer has to keep consuming the queue, otherwise the reader is blocked forever
+                logger.error(f"Copy to target {index} failed: {ex!r}")
+                target.error = ex
+                handle = handles.pop(index, None)
+                if handle is not None:
+                    handle.close()
+        for handle in handles.values():
+            handle.close()
+
+    def run(self, progress: callable = None) -> None:
+        '''Progress callback receives target index, files done and files count, it's called from
+        the writer threads'''
+        self.progress = progress
+        for target in self.targets:
+            try:
+                for new_dir in sorted(target.plan.new_dirs.values()):
+                    os.makedirs(new_dir, exist_ok=True)
+            except OSError as ex:
+                logger.error(f"Couldn't prepare directories of {target.plan.target_roots}: {ex!r}")
+                target.error = ex
+            self.write_journal(target, finished=False)
+
+        device_queues = {}
+        for target in self.targets:
+            if target.device not in device_queues:
+                device_queues[target.device] = queue.Queue(self.QUEUE_CHUNKS)
+        writers = [threading.Thread(target=self.write_loop, args=(jobs,), daemon=True)
+                   for jobs in device_queues.values()]
+        for writer in writers:
+            writer.start()
+
+        start = time.perf_counter()
+        try:
+            destinations = zip(*(target.plan.sources.values() for target in self.targets))
+            for file_num, entries in enumerate(destinations, start=1):
+                alive = [index for index, target in enumerate(self.targets) if target.error is None]
+                if not alive:
+                    break
+                source_path = entries[0][0]
+                logger.debug(f" - [{file_num} of {self.files_count}] - {source_path} -> {len(alive)} targets")
+                for index in alive:
+                    device_queues[self.targets[index].device].put(("open", index, entries[index][1]))
+                try:
+                    with open(source_path, "rb") as f:
+                        while chunk := f.read(self.CHUNK_SIZE):
+                            for index in alive:
+                                device_queues[self.targets[index].device].put(("data", index, chunk))
+                except OSError as ex:
+                    logger.error(f"Couldn't read '{source_path}': {ex!r}")
+                    for index in alive:
+                        self.targets[index].error = ex
+                    break
+                for index in alive:
+                    device_queues[self.targets[index].device].put(
+                        ("close", index, (source_path, entries[index][1])))
+        finally:
+            for jobs in device_queues.values():
+                jobs.put(None)
+            for writer in writers:
+                writer.join()
+            for target in self.targets:
+                self.write_journal(target, finished=target.error is None
+                                   and target.files_done == self.files_count)
+        logger.info(f"Copied {self.files_count} files to {len(self.targets)} targets "
+                    f"in {time.perf_counter() - start:.1f}s")
 
 
 async def copy_from_to_async(from_path_list: list[str], to_path: str, callback_progbar: callable) -> None:
@@ -222,10 +696,16 @@ async def copy_from_to_async(from_path_list: list[str], to_path: str, callback_p
                 file_num += 1
 
 
-async def copy_file_and_call_async(path, file_num, sfile, from_path, to_path, files_count, callback_progbar):
+async def copy_file_and_call_async(path, file_num, sfile, from_path, to_path, files_count, callback_progbar,
+                                   checkpoint: Checkpoint | None = None):
+    source_file = os.path.join(path, sfile)
     dest_file = os.path.join(path.replace(from_path, to_path), sfile)
-    file_size = round(Path(os.path.join(path, sfile)).stat().st_size / 1024, 2)
-    await aioshutil.copy2(os.path.join(path, sfile), dest_file)
+    file_size = round(Path(source_file).stat().st_size / 1024, 2)
+    # file is keyed by source, layers copied over the same target after a redone one are redone too
+    if checkpoint is None or not checkpoint.is_done(source_file):
+        await aioshutil.copy2(source_file, dest_file)
+        if checkpoint is not None:
+            checkpoint.complete(source_file, dest_file)
     await callback_progbar(file_num[0], files_count, sfile, file_size)
     await asyncio.sleep(0.001)
     file_num[0] += 1
@@ -233,11 +713,16 @@ async def copy_file_and_call_async(path, file_num, sfile, from_path, to_path, fi
 
 async def copy_from_to_async_fast(from_path_list: list[str],
                                   to_path: str,
-                                  callback_progbar: callable) -> None:
+                                  callback_progbar: callable,
+                                  checkpoint: Checkpoint | None = None) -> None:
+    start = time.perf_counter()
     files_count = 0
+    total_size = 0
     for from_path in from_path_list:
         logger.debug(f"Copying files from '{from_path}' to '{to_path}'")
-        files_count += count_files(from_path)
+        dir_files, dir_size = get_files_stats(from_path)
+        files_count += dir_files
+        total_size += dir_size
     file_num = []
     file_num.append(1)
     for from_path in from_path_list:
@@ -249,89 +734,542 @@ async def copy_from_to_async_fast(from_path_list: list[str],
             await asyncio.gather(*[
                 copy_file_and_call_async(path, file_num, sfile,
                                          from_path, to_path, files_count,
-                                         callback_progbar) for sfile in filenames])
+                                         callback_progbar, checkpoint) for sfile in filenames])
+    copy_throughput.record(total_size, files_count, time.perf_counter() - start)
 
 
-async def extract_files(archive, file_names, path, callback=None, files_num=1):
+def decode_zip_name(file_name: str) -> str:
+    '''Zip archives without unicode flag store names as cp437, but they are usually cp866'''
+    try:
+        file_name.encode('cp437').decode('ascii')
+    except UnicodeDecodeError:
+        file_name = file_name.encode('cp437').decode('cp866')
+    except UnicodeEncodeError:
+        pass
+    return file_name
+
+
+class ArchivePathIndex:
+    '''Hashed index of paths inside zip or 7z archive built once from the list of archive members.
+    Includes directories which are only implied by the paths of files, as many archives
+    don't have explicit entries for directories'''
+    def __init__(self, file_list: list[zipfile.ZipInfo] | py7zr.py7zr.ArchiveFileList,
+                 archive_path: Optional[str] = None) -> None:
+        # normalised path (without trailing slash) -> member name inside archive
+        self.files = {}
+        self.dirs = set()
+        self.total_size = 0
+        self.archive_path = str(archive_path) if archive_path is not None else None
+        self.archive_stat = self.get_archive_stat(self.archive_path)
+        self._sorted_files = None
+
+        for member in file_list:
+            if isinstance(member, zipfile.ZipInfo):
+                is_dir = member.is_dir()
+                size = member.file_size
+            else:
+                is_dir = member.is_directory
+                size = 0 if is_dir else (member.uncompressed or 0)
+            path = self.normalise(member.filename)
+            if not path:
+                continue
+            if is_dir:
+                self.dirs.add(path)
+            else:
+                self.files[path] = member.filename
+                self.total_size += size
+            self._add_parents(path)
+
+    @staticmethod
+    def normalise(path: str) -> str:
+        path = path.replace("\\", "/").strip("/")
+        while path.startswith("./"):
+            path = path[2:]
+        return path
+
+    @staticmethod
+    def get_archive_stat(archive_path: Optional[str]) -> Optional[tuple[int, int]]:
+        if archive_path is None:
+            return None
+        try:
+            stat = os.stat(archive_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def from_archive(cls, archive_path: str) -> "ArchivePathIndex":
+        match Path(archive_path).suffix.lower():
+            case ".7z":
+                with py7zr.SevenZipFile(str(archive_path), "r") as archive:
+                    return cls(archive.files, archive_path)
+            case ".zip":
+                with zipfile.ZipFile(archive_path, "r") as archive:
+                    return cls(archive.filelist, archive_path)
+            case _:
+                raise NotImplementedError(f"Unsupported archive type: {archive_path}")
+
+    def is_current(self) -> bool:
+        '''Checks that archive wasn't changed on disk since indexing'''
+        return self.archive_stat is not None and self.archive_stat == self.get_archive_stat(self.archive_path)
+
+    def _add_parents(self, path: str) -> None:
+        separator = path.rfind("/")
+        while separator > 0:
+            parent = path[:separator]
+            if parent in self.dirs:
+                break
+            self.dirs.add(parent)
+            separator = parent.rfind("/")
+
+    def has_dir(self, path: str) -> bool:
+        return self.normalise(path) in self.dirs
+
+    def has_file(self, path: str) -> bool:
+        return self.normalise(path) in self.files
+
+    def __contains__(self, path: str) -> bool:
+        '''Path with trailing slash is checked as directory, otherwise as file or directory'''
+        if path.endswith("/"):
+            return self.has_dir(path)
+        normalised = self.normalise(path)
+        return normalised in self.files or normalised in self.dirs
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def find_files(self, file_name: str) -> list[str]:
+        '''Member names of all files with the given name, in archive order'''
+        return [member_name for path, member_name in self.files.items()
+                if path == file_name or path.endswith(f"/{file_name}")]
+
+    def files_under(self, dir_path: str) -> list[str]:
+        '''Member names of all files inside directory, recursively'''
+        if self._sorted_files is None:
+            self._sorted_files = sorted(self.files)
+        prefix = self.normalise(dir_path) + "/"
+        start = bisect.bisect_left(self._sorted_files, prefix)
+        found = []
+        for path in self._sorted_files[start:]:
+            if not path.startswith(prefix):
+                break
+            found.append(self.files[path])
+        return found
+
+
+class BlobStore:
+    '''Directory of file contents named by their sha256, every content is stored once'''
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self.get_path(digest))
+
+    def get_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest)
+
+    def put(self, file_path: str) -> str:
+        '''Hashes file and adds its content to the store in the same pass, returns the hash'''
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = os.path.join(self.path, f"incoming_{os.getpid()}_{threading.get_ident()}.tmp")
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as source, open(temp_path, "wb") as temp:
+            while chunk := source.read(self.CHUNK_SIZE):
+                hasher.update(chunk)
+                temp.write(chunk)
+        digest = hasher.hexdigest()
+        blob_path = self.get_path(digest)
+        if os.path.exists(blob_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(temp_path, blob_path)
+        return digest
+
+    def restore(self, digest: str, dest_path: str, mtime_ns: int | None = None) -> None:
+        '''Writes a copy of the stored content to dest, never a link - game files are patched in place'''
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        temp_path = f"{dest_path}.commod_tmp"
+        with open(self.get_path(digest), "rb") as blob, open(temp_path, "wb") as temp:
+            while chunk := blob.read(self.CHUNK_SIZE):
+                temp.write(chunk)
+        os.replace(temp_path, dest_path)
+        if mtime_ns is not None:
+            os.utime(dest_path, ns=(mtime_ns, mtime_ns))
+
+    def collect_garbage(self, referenced: set[str]) -> int:
+        '''Removes contents which are not in the referenced hashes, returns freed bytes'''
+        freed = 0
+        if os.path.isdir(self.path):
+            for path, dirs, filenames in os.walk(self.path):
+                for sfile in filenames:
+                    if sfile not in referenced:
+                        blob_path = os.path.join(path, sfile)
+                        freed += os.path.getsize(blob_path)
+                        os.remove(blob_path)
+        return freed
+
+
+class DistributionStore:
+    '''Optional content addressed layout of extracted mods. Every file content is kept once
+    in the blob store and mod directories are hardlink farms pointing to the blobs, so versions
+    and variants of the same mod share the disk space. Install planner reads mod directories as usual.
+    Archive members which are already known by name, size and CRC are only hashed, not written,
+    and are linked instead of extracted if the content matches the stored one.
+    Layout is used only when the store directory exists in the distribution dir'''
+    STORE_DIR = "mods_store"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, distribution_dir: str) -> None:
+        self.distribution_dir = distribution_dir
+        self.store_path = os.path.join(distribution_dir, self.STORE_DIR)
+        self.blobs_path = os.path.join(self.store_path, "blobs")
+        self.index_path = os.path.join(self.store_path, "index.json")
+        # "name|size|crc32" -> sha256 of content, name is lowercased base name of file
+        self.index = None
+
+    @property
+    def enabled(self) -> bool:
+        return os.path.isdir(self.blobs_path)
+
+    def enable(self) -> None:
+        os.makedirs(self.blobs_path, exist_ok=True)
+
+    @staticmethod
+    def get_member_key(name: str, size: int, crc: int) -> str:
+        return f"{ArchivePathIndex.normalise(name).rsplit('/', 1)[-1].lower()}|{size}|{crc}"
+
+    def get_blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_path, digest[:2], digest)
+
+    def load_index(self) -> dict:
+        if self.index is None:
+            self.index = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        self.index = json.load(f)
+                except (OSError, ValueError) as ex:
+                    logger.warning(f"Mods store index is broken and will be rebuilt: {ex}")
+        return self.index
+
+    def save_index(self) -> None:
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, self.index_path)
+
+    @staticmethod
+    def link_or_copy(source_path: str, dest_path: str, copy_fallback: bool = True) -> bool:
+        '''Replaces dest with a hardlink to source, falls back to copy on volumes without hardlinks'''
+        temp_path = f"{dest_path}.commod_link"
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            if not copy_fallback:
+                return False
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, dest_path)
+            return False
+        os.replace(temp_path, dest_path)
+        return True
+
+    def ingest_file(self, file_path: str) -> str:
+        '''Moves file content to the blob store and leaves a hardlink to blob in its place'''
+        hasher = hashlib.sha256()
+        crc = 0
+        size = 0
+        with open(file_path, "rb") as f:
+            while chunk := f.read(self.CHUNK_SIZE):
+                hasher.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+        blob_path = self.get_blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.link(file_path, blob_path)
+            except OSError:
+                shutil.copyfile(file_path, blob_path)
+        elif not os.path.samefile(file_path, blob_path):
+            # file already has the same content, so it's only replaced by the link
+            self.link_or_copy(blob_path, file_path, copy_fallback=False)
+        self.load_index()[self.get_member_key(file_path, size, crc)] = digest
+        return digest
+
+    def ingest_tree(self, tree_path: str, linked_paths: set[str] | None = None) -> tuple[int, int]:
+        '''Deduplicates all files in directory, returns number of files and bytes which are shared
+        with other files of the store. Files linked from the store already are not hashed again'''
+        shared_files = 0
+        shared_bytes = 0
+        linked_paths = linked_paths or set()
+        for path, dirs, filenames in os.walk(tree_path):
+            for sfile in filenames:
+                file_path = os.path.join(path, sfile)
+                if os.path.islink(file_path) or os.path.normcase(file_path) in linked_paths:
+                    continue
+                self.ingest_file(file_path)
+                stat = os.stat(file_path)
+                if stat.st_nlink > 2:
+                    shared_files += 1
+                    shared_bytes += stat.st_size
+        self.save_index()
+        return shared_files, shared_bytes
+
+    def convert(self, mods_path: str) -> dict:
+        '''Enables the store and deduplicates all the extracted mods of the library'''
+        start = time.perf_counter()
+        self.enable()
+        shared_files = 0
+        for entry in os.scandir(mods_path):
+            if entry.is_dir():
+                files, _ = self.ingest_tree(entry.path)
+                shared_files += files
+        report = self.stats()
+        report["shared_files"] = shared_files
+        report["duration"] = round(time.perf_counter() - start, 2)
+        logger.info(f"Mods library converted to store: {report}")
+        return report
+
+    def get_archive_members(self, archive_path: str) -> list[tuple[str, int, int | None]]:
+        '''Member name, size and CRC of every file inside archive, only the headers are read'''
+        members = []
+        match Path(archive_path).suffix.lower():
+            case ".zip":
+                with zipfile.ZipFile(archive_path, "r") as archive:
+                    for member in archive.filelist:
+                        if not member.is_dir():
+                            members.append((member.filename, member.file_size, member.CRC))
+            case ".7z":
+                with py7zr.SevenZipFile(str(archive_path), "r") as archive:
+                    for member in archive.files:
+                        if not member.is_directory:
+                            members.append((member.filename, member.uncompressed or 0,
+                                            getattr(member, "crc32", None)))
+            case _:
+                raise NotImplementedError(f"Unsupported archive type: {archive_path}")
+        return members
+
+    def hash_members(self, archive_path: str, member_names: list[str]) -> dict[str, str]:
+        '''Sha256 of the content of archive members, members are read without writing them to disk'''
+        digests = {}
+        if not member_names:
+            return digests
+        match Path(archive_path).suffix.lower():
+            case ".zip":
+                with zipfile.ZipFile(archive_path, "r") as archive:
+                    for member_name in member_names:
+                        hasher = hashlib.sha256()
+                        with archive.open(member_name) as f:
+                            while chunk := f.read(self.CHUNK_SIZE):
+                                hasher.update(chunk)
+                        digests[member_name] = hasher.hexdigest()
+            case ".7z":
+                with py7zr.SevenZipFile(str(archive_path), "r") as archive:
+                    for member_name, content in archive.read(targets=member_names).items():
+                        digests[member_name] = hashlib.sha256(content.getbuffer()).hexdigest()
+        return digests
+
+    def link_known_members(self, archive_path: str, to_path: str) -> dict[str, str]:
+        '''Links archive members with known content to the target dir,
+        returns names of linked members with normalised target paths.
+        Name, size and CRC only select the candidates, member is linked when its sha256 is the one of blob.
+        Stored files which will be extracted over are unlinked first, as extraction writes in place
+        and would change the blob and every other mod linked to it'''
+        index = self.load_index()
+        decode = Path(archive_path).suffix.lower() == ".zip"
+        linked = {}
+        # member name -> target path and digest of the blob with the same name, size and CRC
+        candidates = {}
+        for member_name, size, crc in self.get_archive_members(archive_path):
+            dest_name = decode_zip_name(member_name) if decode else member_name
+            dest_path = os.path.join(to_path, *ArchivePathIndex.normalise(dest_name).split("/"))
+            digest = None
+            if crc is not None:
+                digest = index.get(self.get_member_key(member_name, size, crc))
+            if digest is not None:
+                blob_path = self.get_blob_path(digest)
+                if os.path.exists(blob_path) and os.path.getsize(blob_path) == size:
+                    candidates[member_name] = (dest_path, digest)
+                    continue
+            self.unlink_stored(dest_path)
+
+        member_digests = self.hash_members(archive_path, list(candidates))
+        for member_name, (dest_path, digest) in candidates.items():
+            if member_digests.get(member_name) != digest:
+                logger.debug(f"Content of '{member_name}' differs from the stored file, it will be extracted")
+                self.unlink_stored(dest_path)
+                continue
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            self.link_or_copy(self.get_blob_path(digest), dest_path)
+            linked[member_name] = os.path.normcase(dest_path)
+        logger.debug(f"Linked {len(linked)} known files of '{archive_path}' from mods store")
+        return linked
+
+    @staticmethod
+    def unlink_stored(dest_path: str) -> None:
+        if os.path.isfile(dest_path) and os.stat(dest_path).st_nlink > 1:
+            os.remove(dest_path)
+
+    def collect_garbage(self) -> int:
+        '''Removes blobs which are not linked from any mod directory anymore, returns freed bytes.
+        Mod directories always keep their own link or copy, so only the future deduplication is lost'''
+        freed = 0
+        if not self.links_supported:
+            return freed
+        for path, dirs, filenames in os.walk(self.blobs_path):
+            for sfile in filenames:
+                blob_path = os.path.join(path, sfile)
+                stat = os.stat(blob_path)
+                if stat.st_nlink == 1:
+                    freed += stat.st_size
+                    os.remove(blob_path)
+        index = self.load_index()
+        self.index = {key: digest for key, digest in index.items()
+                      if os.path.exists(self.get_blob_path(digest))}
+        self.save_index()
+        return freed
+
+    @property
+    def links_supported(self) -> bool:
+        '''Some blob has more than one link, otherwise the volume doesn't support hardlinks'''
+        for path, dirs, filenames in os.walk(self.blobs_path):
+            for sfile in filenames:
+                if os.stat(os.path.join(path, sfile)).st_nlink > 1:
+                    return True
+        return False
+
+    def stats(self) -> dict:
+        '''Size of stored content and the size which it would take without deduplication'''
+        blobs = 0
+        stored_bytes = 0
+        library_bytes = 0
+        for path, dirs, filenames in os.walk(self.blobs_path):
+            for sfile in filenames:
+                stat = os.stat(os.path.join(path, sfile))
+                blobs += 1
+                stored_bytes += stat.st_size
+                library_bytes += stat.st_size * max(1, stat.st_nlink - 1)
+        return {"blobs": blobs, "stored_bytes": stored_bytes, "library_bytes": library_bytes}
+
+
+async def extract_files(archive, file_names, path, callback=None, files_num=1,
+                        checkpoint: Optional[Checkpoint] = None):
     '''Extract and save to disk'''
     for file_name in file_names:
         data = archive.read(file_name)
-        try:
-            file_name.encode('cp437').decode('ascii')
-        except UnicodeDecodeError:
-            file_name = file_name.encode('cp437').decode('cp866')
-        except UnicodeEncodeError:
-            pass
-        filepath = Path(path, file_name)
+        filepath = Path(path, decode_zip_name(file_name))
         async with aiofiles.open(str(filepath), 'wb') as fd:
             await fd.write(data)
-        if callable is not None:
+        if checkpoint is not None:
+            checkpoint.complete(file_name, str(filepath))
+        if callback is not None:
             await callback(files_num)
 
 
 async def extract_7z_files(archive: py7zr.SevenZipFile, file_names, path,
-                           callback=None, files_num=1, chunksize=1):
+                           callback=None, files_num=1, chunksize=1,
+                           checkpoint: Optional[Checkpoint] = None):
     '''Extract and save to disk'''
     archive.reset()
     archive.extract(path, targets=file_names)
-    if callable is not None:
+    if checkpoint is not None:
+        for file_name in file_names:
+            checkpoint.complete(file_name, os.path.join(path, file_name))
+    if callback is not None:
         await callback(files_num, chunksize)
         await asyncio.sleep(0.01)
 
 
+def get_extract_checkpoint_path(to_path: str) -> str:
+    '''Checkpoint is kept next to the extracted dir, so it's never mistaken for mod file'''
+    return f"{os.path.normpath(to_path)}.checkpoint.json"
+
+
 async def extract_from_to(archive_path, to_path, callback=None,
-                          loading_text: Optional[Text] = None):
+                          loading_text: Optional[Text] = None,
+                          path_index: Optional[ArchivePathIndex] = None,
+                          store: Optional[DistributionStore] = None):
+    '''Extracts archive, reusing path index built on archive validation if it's still current.
+    With enabled distribution store only the files with unknown content are extracted.
+    Interrupted extraction of the same archive is resumed, files which are already extracted are skipped'''
+    if path_index is not None and not path_index.is_current():
+        path_index = None
+    if store is not None and not store.enabled:
+        store = None
+    archive_stat = os.stat(archive_path)
+    checkpoint = Checkpoint(get_extract_checkpoint_path(to_path),
+                            {"kind": "extract",
+                             "archive": str(archive_path),
+                             "size": archive_stat.st_size,
+                             "mtime_ns": archive_stat.st_mtime_ns})
+    skip = await asyncio.to_thread(checkpoint.load)
+    linked = {}
+    if store is not None:
+        os.makedirs(to_path, exist_ok=True)
+        linked = await asyncio.to_thread(store.link_known_members, archive_path, to_path)
+    skip.update(linked)
     extension = Path(archive_path).suffix
-    match extension:
-        case ".7z":
-            await extract_7z_from_to(archive_path, to_path, callback, loading_text)
-        case ".zip":
-            await extract_zip_from_to(archive_path, to_path, callback, loading_text)
-        case _:
-            raise NotImplementedError(f"Unsupported archive type: {archive_path}")
+    try:
+        match extension:
+            case ".7z":
+                await extract_7z_from_to(archive_path, to_path, callback, loading_text, path_index, skip,
+                                         checkpoint)
+            case ".zip":
+                await extract_zip_from_to(archive_path, to_path, callback, loading_text, path_index, skip,
+                                          checkpoint)
+            case _:
+                raise NotImplementedError(f"Unsupported archive type: {archive_path}")
+    except BaseException:
+        checkpoint.save()
+        raise
+    if store is not None:
+        await asyncio.to_thread(store.ingest_tree, to_path, set(linked.values()))
+    checkpoint.finish()
 
 
 async def extract_zip_from_to(archive_path, to_path,
                               callback: Optional[Coroutine] = None,
-                              loading_text: Optional[Text] = None):
-    '''Unzip archive to disk asynchronously'''
+                              loading_text: Optional[Text] = None,
+                              path_index: Optional[ArchivePathIndex] = None,
+                              skip: Optional[set[str]] = None,
+                              checkpoint: Optional[Checkpoint] = None):
+    '''Unzip archive to disk asynchronously, members from skip are already in place'''
     os.makedirs(to_path, exist_ok=True)
     with zipfile.ZipFile(archive_path, 'r') as archive:
-        only_files = []
+        if path_index is None:
+            path_index = ArchivePathIndex(archive.filelist, archive_path)
 
-        total_size = 0
+        total_size = path_index.total_size
         total_compressed_size = 0
         compression_label = "ZIP"
 
-        namelist = archive.namelist()
         workers = 100
-        chunksize = ceil(len(namelist) / workers)
+        chunksize = ceil(len(path_index) / workers)
         if chunksize == 0:
             chunksize = 1
         tasks = []
-        for file in archive.filelist:
-            file_path = file.filename
-            if file.is_dir():
-                try:
-                    file_path.encode('cp437').decode('ascii')
-                except UnicodeDecodeError:
-                    file_path = file_path.encode('cp437').decode('cp866')
-                os.makedirs(Path(to_path) / file_path, exist_ok=True)
-            else:
-                only_files.append(file_path)
-                if loading_text is not None:
-                    total_size += file.file_size
-                    total_compressed_size += file.compress_size
-                    if compression_label == "ZIP":
-                        match file.compress_type:
-                            case 8:
-                                compression_label = "DEFLATE"
-                            case 12:
-                                compression_label = "BZIP2"
-                            case 14:
-                                compression_label = "LZMA"
-                            case _:
-                                pass
+        # implicit dirs are created too, files are written in parallel and can't create them
+        for dir_path in path_index.dirs:
+            os.makedirs(Path(to_path) / decode_zip_name(dir_path), exist_ok=True)
+        only_files = [name for name in path_index.files.values() if not skip or name not in skip]
+
+        if loading_text is not None:
+            for file in archive.filelist:
+                total_compressed_size += file.compress_size
+                if compression_label == "ZIP":
+                    match file.compress_type:
+                        case 8:
+                            compression_label = "DEFLATE"
+                        case 12:
+                            compression_label = "BZIP2"
+                        case 14:
+                            compression_label = "LZMA"
+                        case _:
+                            pass
 
         if loading_text is not None:
             loading_text.value = (f'[{compression_label}] '
@@ -340,16 +1278,21 @@ async def extract_zip_from_to(archive_path, to_path,
             await loading_text.update_async()
             await asyncio.sleep(0.01)
 
-        files_num = len(only_files)
-        for i in range(0, files_num, chunksize):
+        files_num = len(path_index)
+        if skip and callback is not None:
+            await callback(files_num, len(skip))
+        for i in range(0, len(only_files), chunksize):
             file_names = only_files[i:(i + chunksize)]
-            tasks.append(extract_files(archive, file_names, to_path, callback, files_num))
+            tasks.append(extract_files(archive, file_names, to_path, callback, files_num, checkpoint))
         await asyncio.gather(*tasks)
 
 
 async def extract_7z_from_to(archive_path, to_path,
                              callback: Optional[Coroutine] = None,
-                             loading_text: Optional[Text] = None):
+                             loading_text: Optional[Text] = None,
+                             path_index: Optional[ArchivePathIndex] = None,
+                             skip: Optional[set[str]] = None,
+                             checkpoint: Optional[Checkpoint] = None):
     os.makedirs(to_path, exist_ok=True)
     with py7zr.SevenZipFile(str(archive_path), 'r') as archive:
         if loading_text is not None:
@@ -359,17 +1302,12 @@ async def extract_7z_from_to(archive_path, to_path,
                                   f'{info.uncompressed/1024/1024:.1f}MB')
             await loading_text.update_async()
             await asyncio.sleep(0.01)
-        all_files = archive.files
-        dirs = []
-        files = []
-        for file in all_files:
-            if file.emptystream:
-                dirs.append(file.filename)
-            else:
-                files.append(file.filename)
+        if path_index is None:
+            path_index = ArchivePathIndex(archive.files, archive_path)
+        files = [name for name in path_index.files.values() if not skip or name not in skip]
 
-        for dir in dirs:
-            os.makedirs(Path(to_path) / dir, exist_ok=True)
+        for dir_path in path_index.dirs:
+            os.makedirs(Path(to_path) / dir_path, exist_ok=True)
 
         archive_size = archive.archiveinfo().uncompressed
         # chunk extraction for every 32MB of internal data to show some kind of progress
@@ -389,10 +1327,12 @@ async def extract_7z_from_to(archive_path, to_path,
         if chunksize == 0:
             chunksize = 1
 
-        files_num = len(files)
-        for i in range(0, files_num, chunksize):
+        files_num = len(path_index)
+        if skip and callback is not None:
+            await callback(files_num, len(skip))
+        for i in range(0, len(files), chunksize):
             file_names = files[i:(i + chunksize)]
-            await extract_7z_files(archive, file_names, to_path, callback, files_num, chunksize)
+            await extract_7z_files(archive, file_names, to_path, callback, files_num, chunksize, checkpoint)
 
 
 def load_yaml(stream) -> Any:
@@ -410,6 +1350,64 @@ def read_yaml(yaml_path: str) -> Any:
         return yaml_loaded
 
 
+def resolve_yaml_scalar(event: yaml.ScalarEvent) -> Any:
+    if event.style is None and event.implicit[0]:
+        try:
+            return yaml.safe_load(event.value)
+        except yaml.YAMLError:
+            pass
+    return event.value
+
+
+def read_yaml_header(yaml_path: str, keys: set[str]) -> dict | None:
+    '''Reads only the given top level keys of yaml mapping without loading the whole document,
+       parsing stops as soon as all the keys are found. Supports scalar and flat list values'''
+    header = {}
+    keys_left = set(keys)
+    depth = 0
+    current_key = None
+    collected = None
+    with open(yaml_path, 'r', encoding="utf-8") as stream:
+        try:
+            for event in yaml.parse(stream, Loader=yaml.SafeLoader):
+                if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                    depth += 1
+                    if depth == 1 and isinstance(event, yaml.SequenceStartEvent):
+                        return None
+                    if depth == 2 and current_key in keys_left and isinstance(event, yaml.SequenceStartEvent):
+                        collected = []
+                elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                    depth -= 1
+                    if depth == 1:
+                        if collected is not None:
+                            header[current_key] = collected
+                            keys_left.discard(current_key)
+                            collected = None
+                        current_key = None
+                        if not keys_left:
+                            break
+                elif isinstance(event, yaml.ScalarEvent):
+                    if depth == 1:
+                        if current_key is None:
+                            current_key = event.value
+                            continue
+                        if current_key in keys_left:
+                            header[current_key] = resolve_yaml_scalar(event)
+                            keys_left.discard(current_key)
+                        current_key = None
+                        if not keys_left:
+                            break
+                    elif depth == 2 and collected is not None:
+                        collected.append(resolve_yaml_scalar(event))
+                elif isinstance(event, yaml.AliasEvent) and depth == 1:
+                    # aliased values are not resolved in header
+                    current_key = None
+        except yaml.YAMLError as exc:
+            logger.error(exc)
+            return None
+    return header
+
+
 def dump_yaml(data, path, sort_keys=True) -> bool:
     with open(path, 'w', encoding="utf-8") as stream:
         try:
@@ -431,30 +1429,393 @@ def process_markdown(md_raw):
     return md_result
 
 
-def patch_offsets(f, offsets_dict: dict, enlarge_coeff: float = 1.0, raw_strings=False) -> None:
-    for offset in offsets_dict.keys():
-        f.seek(offset)
-        if type(offsets_dict[offset]) == int:
+class DiskCache:
+    '''Directory of cache entries with the total size limit, least recently used entries are evicted first.
+    File modification time is used as the last access time between runs'''
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.cache_dir = None
+        # file name -> size of entry, ordered from least to most recently used
+        self.entries = None
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def set_location(self, cache_dir: str | Path) -> None:
+        with self.lock:
+            self.cache_dir = Path(cache_dir)
+            self.entries = None
+            self.total_size = 0
+
+    def is_available(self) -> bool:
+        '''Loads index on first use, must be called under lock'''
+        if self.cache_dir is not None and self.entries is None:
+            self.load_index()
+        return self.cache_dir is not None
+
+    def load_index(self) -> None:
+        self.entries = OrderedDict()
+        self.total_size = 0
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            found = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        except OSError as ex:
+            logger.warning(f"Cache at '{self.cache_dir}' is unavailable: {ex}")
+            self.cache_dir = None
+            return
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_size += size
+        self.evict()
+
+    def evict(self) -> None:
+        while self.total_size > self.max_size and self.entries:
+            name, size = self.entries.popitem(last=False)
+            self.total_size -= size
+            try:
+                os.remove(self.cache_dir / name)
+            except OSError:
+                pass
+
+    def touch(self, name: str) -> Path | None:
+        '''Marks entry as recently used, returns its path if it's still present'''
+        if name not in self.entries:
+            return None
+        entry_path = self.cache_dir / name
+        try:
+            os.utime(entry_path)
+        except OSError:
+            self.total_size -= self.entries.pop(name)
+            return None
+        self.entries.move_to_end(name)
+        return entry_path
+
+    def record(self, name: str) -> None:
+        '''Adds entry which was written to cache dir'''
+        try:
+            size = (self.cache_dir / name).stat().st_size
+        except OSError:
+            return
+        self.total_size += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        self.evict()
+
+
+class MarkdownCache(DiskCache):
+    '''On-disk cache of processed markdown keyed by the hash of raw input.
+    Works as a plain process_markdown call until the location of cache is set'''
+    # bump when process_markdown output changes to ignore entries made by the previous versions
+    FORMAT_VERSION = 1
+
+    def __init__(self, max_size: int = 16 * 1024 * 1024) -> None:
+        super().__init__(max_size)
+
+    @classmethod
+    def get_key(cls, md_raw: str) -> str:
+        salt = f"{cls.FORMAT_VERSION}:{getattr(markdownify, '__version__', '')}:"
+        return hashlib.sha256((salt + md_raw).encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def get(self, name: str) -> str | None:
+        entry_path = self.touch(name)
+        if entry_path is None:
+            return None
+        try:
+            with open(entry_path, "r", encoding="utf-8") as fh:
+                return fh.read()
+        except OSError:
+            self.total_size -= self.entries.pop(name)
+            return None
+
+    def put(self, name: str, content: str) -> None:
+        entry_path = self.cache_dir / name
+        tmp_path = entry_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(content)
+            os.replace(tmp_path, entry_path)
+        except OSError as ex:
+            logger.warning(f"Couldn't write markdown cache entry: {ex}")
+            return
+        self.record(name)
+
+    def process(self, md_raw: str) -> str:
+        '''Same as process_markdown, but markdownify runs only for the input which wasn't seen before'''
+        if self.cache_dir is None:
+            return process_markdown(md_raw)
+        name = self.get_key(md_raw) + ".md"
+        with self.lock:
+            if self.is_available():
+                content = self.get(name)
+                if content is not None:
+                    self.hits += 1
+                    return content
+        self.misses += 1
+        content = process_markdown(md_raw)
+        with self.lock:
+            if self.is_available():
+                self.put(name, content)
+        return content
+
+
+markdown_cache = MarkdownCache()
+
+
+class ThumbnailCache(DiskCache):
+    '''Resized and recompressed copies of mod images for the size they are displayed at.
+    Derivatives are made by a small pool of background workers and are keyed by the hash
+    of source file, so the same image shipped by several mods or translations is processed once.
+    Source path is used as is when Pillow is not available or image can't be processed'''
+    # name -> max width and height of displayed image
+    SIZES = {
+        "logo": (640, 320),
+        "banner": (1280, 480),
+        "screenshot": (1600, 900)
+        }
+    RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+    FORMAT_VERSION = 1
+
+    def __init__(self, max_size: int = 256 * 1024 * 1024, workers: int = 2) -> None:
+        super().__init__(max_size)
+        self.workers = workers
+        self.executor = None
+        # (source path, size, mtime) -> hash of source content
+        self.source_hashes = {}
+        # (source path, size name) -> future of the job making the derivative
+        self.pending = {}
+        # derivatives which wouldn't be smaller than the source
+        self.not_needed = set()
+
+    @staticmethod
+    def get_source_stat(src: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(src)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def get_source_hash(self, src: str) -> str | None:
+        stat = self.get_source_stat(src)
+        if stat is None:
+            return None
+        source_key = (src, *stat)
+        source_hash = self.source_hashes.get(source_key)
+        if source_hash is None:
+            hasher = hashlib.sha256(f"{self.FORMAT_VERSION}:".encode())
+            try:
+                with open(src, "rb") as fh:
+                    while chunk := fh.read(1024 * 1024):
+                        hasher.update(chunk)
+            except OSError:
+                return None
+            source_hash = hasher.hexdigest()
+            self.source_hashes[source_key] = source_hash
+        return source_hash
+
+    def can_process(self, src: str | None) -> bool:
+        return (PILImage is not None and self.cache_dir is not None
+                and isinstance(src, str) and Path(src).suffix.lower() in self.RASTER_EXTENSIONS)
+
+    def find_existing(self, src: str, size_name: str) -> str | None:
+        '''Returns path to the derivative made before, never processes the image'''
+        stat = self.get_source_stat(src)
+        source_hash = self.source_hashes.get((src, *stat)) if stat is not None else None
+        if source_hash is None:
+            return None
+        width, height = self.SIZES[size_name]
+        with self.lock:
+            if not self.is_available():
+                return None
+            for suffix in (".jpg", ".png"):
+                entry_path = self.touch(f"{source_hash}_{width}x{height}{suffix}")
+                if entry_path is not None:
+                    return str(entry_path)
+        return None
+
+    def make_derivative(self, src: str, size_name: str) -> str:
+        '''Blocking, returns path to the derivative or to the source if it can't be made'''
+        source_hash = self.get_source_hash(src)
+        if source_hash is None:
+            return src
+        width, height = self.SIZES[size_name]
+        stem = f"{source_hash}_{width}x{height}"
+        if stem in self.not_needed:
+            return src
+        with self.lock:
+            if not self.is_available():
+                return src
+            for suffix in (".jpg", ".png"):
+                entry_path = self.touch(stem + suffix)
+                if entry_path is not None:
+                    self.hits += 1
+                    return str(entry_path)
+        self.misses += 1
+        tmp_path = self.cache_dir / f"{stem}.{threading.get_ident()}.tmp"
+        try:
+            with PILImage.open(src) as image:
+                image.load()
+                has_alpha = (image.mode in ("RGBA", "LA")
+                             or (image.mode == "P" and "transparency" in image.info))
+                image.thumbnail((width, height), PILImage.LANCZOS)
+                if has_alpha:
+                    name = stem + ".png"
+                    image.save(tmp_path, "PNG", optimize=True)
+                else:
+                    name = stem + ".jpg"
+                    image.convert("RGB").save(tmp_path, "JPEG", quality=85, optimize=True)
+            if os.path.getsize(tmp_path) >= os.path.getsize(src):
+                # already small enough, nothing to gain
+                os.remove(tmp_path)
+                self.not_needed.add(stem)
+                return src
+            os.replace(tmp_path, self.cache_dir / name)
+        except Exception as ex:
+            logger.warning(f"Couldn't make {size_name} thumbnail for '{src}': {ex}")
+            if tmp_path.exists():
+                os.remove(tmp_path)
+            return src
+        with self.lock:
+            if self.is_available():
+                self.record(name)
+        return str(self.cache_dir / name)
+
+    def submit(self, src: str, size_name: str) -> concurrent.futures.Future:
+        key = (src, size_name)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                                          thread_name_prefix="thumbnails")
+                future = self.executor.submit(self.make_derivative, src, size_name)
+                self.pending[key] = future
+                future.add_done_callback(lambda _: self.pending.pop(key, None))
+        return future
+
+    def get_cached(self, src: str | None, size_name: str) -> str | None:
+        '''Path to show right away: the derivative if it's ready, otherwise the source'''
+        if not self.can_process(src):
+            return src
+        return self.find_existing(src, size_name) or src
+
+    async def get_async(self, src: str | None, size_name: str) -> str | None:
+        '''Path to show, waits for the derivative to be made by background workers'''
+        if not self.can_process(src):
+            return src
+        return await asyncio.wrap_future(self.submit(src, size_name))
+
+    def prefetch(self, src: str | None, size_name: str) -> None:
+        if self.can_process(src):
+            self.submit(src, size_name)
+
+
+thumbnail_cache = ThumbnailCache()
+
+
+class ExePatchSession:
+    '''Binary patches of exe or dll applied through a single memory mapping of the file.
+    Offset tables are encoded when they are added and written in offset order,
+    file is flushed once when the session is closed. Direct reads and writes, used by the patches
+    which depend on the file content, first apply everything added before them, so the order is kept'''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = None
+        self.mapped = None
+        self.position = 0
+        # (offset, encoded value) in the order they were added
+        self.pending = []
+
+    def __enter__(self) -> "ExePatchSession":
+        self.file = open(self.path, "r+b")
+        self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        try:
+            if exc_type is None:
+                self.apply()
+                self.mapped.flush()
+        finally:
+            self.mapped.close()
+            self.file.close()
+
+    @staticmethod
+    def encode(value: Any, enlarge_coeff: float = 1.0, raw_strings: bool = False) -> bytes | None:
+        value_type = type(value)
+        if value_type is int or value_type is float:
             if not math.isclose(enlarge_coeff, 1.0):
-                new_value = round(offsets_dict[offset] * enlarge_coeff)
-            else:
-                new_value = offsets_dict[offset]
-            f.write(struct.pack("i", new_value))
-        elif type(offsets_dict[offset]) == str:
+                value = round(value * enlarge_coeff)
+            return struct.pack("i" if value_type is int else "f", value)
+        if value_type is str:
             if raw_strings:  # write as is, binary insert strings
-                f.write(bytes.fromhex(offsets_dict[offset]))
-            else:  # hex address to convert to pointer
-                f.write(struct.pack('<L', int(offsets_dict[offset], base=16)))
-        elif type(offsets_dict[offset]) == float:
-            if not math.isclose(enlarge_coeff, 1.0):
-                new_value = round(offsets_dict[offset] * enlarge_coeff)
-            else:
-                new_value = offsets_dict[offset]
-            f.write(struct.pack("f", new_value))
-        elif type(offsets_dict[offset]) == bool:
-            f.write(struct.pack("b", offsets_dict[offset]))
-        elif type(offsets_dict[offset]) == tuple:
-            f.write(struct.pack("b", offsets_dict[offset][0]))
+                return bytes.fromhex(value)
+            # hex address to convert to pointer
+            return struct.pack('<L', int(value, base=16))
+        if value_type is bool:
+            return struct.pack("b", value)
+        if value_type is tuple:
+            return struct.pack("b", value[0])
+        return None
+
+    def add(self, offset: int, payload: bytes) -> None:
+        self.pending.append((offset, payload))
+
+    def add_offsets(self, offsets_dict: dict, enlarge_coeff: float = 1.0, raw_strings: bool = False) -> None:
+        for offset, value in offsets_dict.items():
+            payload = self.encode(value, enlarge_coeff, raw_strings)
+            if payload is not None:
+                self.pending.append((offset, payload))
+
+    def add_text(self, offset: int, text: str, allowed_len: int) -> None:
+        self.pending.append((offset, struct.pack(f'{allowed_len}s', bytes(text, 'utf-8'))))
+
+    def grow(self, size: int) -> None:
+        self.mapped.flush()
+        self.mapped.close()
+        self.file.truncate(size)
+        self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE)
+
+    def apply(self) -> None:
+        '''Writes the added patches in offset order'''
+        if not self.pending:
+            return
+        ordered = sorted(self.pending, key=lambda patch: patch[0])
+        if any(offset + len(payload) > next_offset
+               for (offset, payload), (next_offset, _) in zip(ordered, ordered[1:])):
+            # overlapping patches are written in the order they were added, so the later one wins
+            ordered = self.pending
+        for offset, payload in ordered:
+            end = offset + len(payload)
+            if end > len(self.mapped):
+                self.grow(end)
+            self.mapped[offset:end] = payload
+        self.pending = []
+
+    def seek(self, offset: int) -> None:
+        self.position = offset
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size: int) -> bytes:
+        self.apply()
+        data_read = self.mapped[self.position:self.position + size]
+        self.position += len(data_read)
+        return data_read
+
+    def write(self, payload: bytes) -> None:
+        self.apply()
+        end = self.position + len(payload)
+        if end > len(self.mapped):
+            self.grow(end)
+        self.mapped[self.position:end] = payload
+        self.position = end
 
 
 def patch_remaster_icon(f):
@@ -572,18 +1933,16 @@ def get_proc_by_names(proc_names):
     return None
 
 
-def patch_memory(target_exe: str):
-    '''Applies only two memory related binary exe fixes'''
-    with open(target_exe, 'rb+') as f:
-        patch_offsets(f, data.minimal_mm_inserts, raw_strings=True)
+def patch_memory(target_exe: str, session: ExePatchSession | None = None):
+    '''Applies only two memory related binary exe fixes, to the given patch session if it's open'''
+    if session is None:
+        with ExePatchSession(target_exe) as session:
+            return patch_memory(target_exe, session)
 
-        offsets_text = data.get_text_offsets("minimal")
-        for offset in offsets_text.keys():
-            text_fin = offsets_text[offset][0]
-            text_str = bytes(text_fin, 'utf-8')
-            allowed_len = offsets_text[offset][1]
-            f.seek(offset)
-            f.write(struct.pack(f'{allowed_len}s', text_str))
+    session.add_offsets(data.minimal_mm_inserts, raw_strings=True)
+    offsets_text = data.get_text_offsets("minimal")
+    for offset in offsets_text.keys():
+        session.add_text(offset, offsets_text[offset][0], offsets_text[offset][1])
 
     return ["mm_inserts_patched"]
 
@@ -594,33 +1953,34 @@ def patch_game_exe(target_exe: str, version_choice: str, build_id: str,
     '''Applies binary exe fixes, makes related changes to config and global properties
        and returns list with a localised description of applied changes'''
     changes_description = []
-    with open(target_exe, 'rb+') as f:
+    # exe is opened once, offset tables are written in one pass when the session is closed
+    with ExePatchSession(target_exe) as f:
         game_root_path = Path(target_exe).parent
         width, height = monitor_res
 
         if version_choice == "remaster":
-            patch_offsets(f, data.offsets_comrem_relative, data.ENLARGE_UI_COEF)
-            patch_offsets(f, data.offsets_comrem_absolute)
+            f.add_offsets(data.offsets_comrem_relative, data.ENLARGE_UI_COEF)
+            f.add_offsets(data.offsets_comrem_absolute)
 
             hd_ui.toggle_16_9_UI_xmls(game_root_path, width, height, enable=True)
             hd_ui.toggle_16_9_glob_prop(game_root_path, enable=True)
             changes_description.append("widescreen_interface_patched")
 
-        patch_offsets(f, data.binary_inserts, raw_strings=True)
+        f.add_offsets(data.binary_inserts, raw_strings=True)
         changes_description.append("binary_inserts_patched")
         changes_description.append("spawn_freezes_fix")
         changes_description.append("camera_patched")
 
-        patch_offsets(f, data.minimal_mm_inserts, raw_strings=True)
-        patch_offsets(f, data.additional_mm_inserts, raw_strings=True)
+        f.add_offsets(data.minimal_mm_inserts, raw_strings=True)
+        f.add_offsets(data.additional_mm_inserts, raw_strings=True)
         changes_description.append("mm_inserts_patched")
 
-        patch_offsets(f, data.offsets_exe_fixes)
+        f.add_offsets(data.offsets_exe_fixes)
 
         changes_description.append("numeric_fixes_patched")
 
-        patch_offsets(f, data.offsets_draw_dist, raw_strings=True)
-        patch_offsets(f, data.offset_draw_dist_numerics)
+        f.add_offsets(data.offsets_draw_dist, raw_strings=True)
+        f.add_offsets(data.offset_draw_dist_numerics)
         changes_description.append("draw_distance_patched")
 
         if version_choice == "remaster":
@@ -659,10 +2019,8 @@ def patch_game_exe(target_exe: str, version_choice: str, build_id: str,
             for i in range(5):
                 width_to_change = data.offsets_resolution_list[i][0]
                 height_to_change = data.offsets_resolution_list[i][1]
-                f.seek(width_to_change)
-                f.write(struct.pack("i", width_list[i]))
-                f.seek(height_to_change)
-                f.write(struct.pack("i", data.possible_resolutions[width_list[i]]))
+                f.add(width_to_change, struct.pack("i", width_list[i]))
+                f.add(height_to_change, struct.pack("i", data.possible_resolutions[width_list[i]]))
             logger.info("ui fixes patched")
 
         offsets_text = data.get_text_offsets(version_choice)
@@ -670,67 +2028,64 @@ def patch_game_exe(target_exe: str, version_choice: str, build_id: str,
             text_fin = offsets_text[offset][0]
             if "ExMachina - " in offsets_text[offset][0]:
                 text_fin += f' [{build_id}]'
-            text_str = bytes(text_fin, 'utf-8')
-            allowed_len = offsets_text[offset][1]
-            f.seek(offset)
-            f.write(struct.pack(f'{allowed_len}s', text_str))
+            f.add_text(offset, text_fin, offsets_text[offset][1])
 
         correct_damage_coeffs(game_root_path, data.DEFAULT_COMREM_GRAVITY)
         # increase_phys_step might not have an intended effect, need to verify
         # increase_phys_step(game_root_path)
         logger.info("damage coeff patched")
 
-    patch_configurables(target_exe, exe_options)
+        patch_configurables(target_exe, exe_options, f)
     return changes_description
 
 
-def patch_configurables(target_exe: str, exe_options: dict = {}) -> None:
-    '''Applies binary exe fixes which support configuration'''
-    with open(target_exe, 'rb+') as f:
-        configurable_values = {"gravity": data.DEFAULT_COMREM_GRAVITY,
-                               "skins_in_shop_0": (8,),
-                               "skins_in_shop_1": (8,),
-                               "skins_in_shop_2": (8,),
-                               "blast_damage_friendly_fire": False
-                               }
-
-        if exe_options.get("gravity") is not None:
-            configurable_values["gravity"] = float(exe_options.get("gravity"))
-
-        if exe_options.get("skins_in_shop") is not None:
-            configurable_values["skins_in_shop_0"] = (int(exe_options.get("skins_in_shop")),)
-            configurable_values["skins_in_shop_1"] = (int(exe_options.get("skins_in_shop")),)
-            configurable_values["skins_in_shop_2"] = (int(exe_options.get("skins_in_shop")),)
-
-        if exe_options.get("blast_damage_friendly_fire") is not None:
-            blast_config = exe_options.get("blast_damage_friendly_fire")
-            if not isinstance(blast_config, bool):
-                blast_config = str(blast_config)
-                if blast_config.lower() == "true":
-                    blast_config = True
-                else:
-                    blast_config = False
-            configurable_values["blast_damage_friendly_fire"] = blast_config
+def patch_configurables(target_exe: str, exe_options: dict = {},
+                        session: ExePatchSession | None = None) -> None:
+    '''Applies binary exe fixes which support configuration, to the given patch session if it's open'''
+    if session is None:
+        with ExePatchSession(target_exe) as session:
+            return patch_configurables(target_exe, exe_options, session)
+
+    configurable_values = {"gravity": data.DEFAULT_COMREM_GRAVITY,
+                           "skins_in_shop_0": (8,),
+                           "skins_in_shop_1": (8,),
+                           "skins_in_shop_2": (8,),
+                           "blast_damage_friendly_fire": False
+                           }
+
+    if exe_options.get("gravity") is not None:
+        configurable_values["gravity"] = float(exe_options.get("gravity"))
+
+    if exe_options.get("skins_in_shop") is not None:
+        configurable_values["skins_in_shop_0"] = (int(exe_options.get("skins_in_shop")),)
+        configurable_values["skins_in_shop_1"] = (int(exe_options.get("skins_in_shop")),)
+        configurable_values["skins_in_shop_2"] = (int(exe_options.get("skins_in_shop")),)
+
+    if exe_options.get("blast_damage_friendly_fire") is not None:
+        blast_config = exe_options.get("blast_damage_friendly_fire")
+        if not isinstance(blast_config, bool):
+            blast_config = str(blast_config)
+            if blast_config.lower() == "true":
+                blast_config = True
+            else:
+                blast_config = False
+        configurable_values["blast_damage_friendly_fire"] = blast_config
 
-        configured_offesets = {}
-        for key in data.configurable_offsets.keys():
-            configured_offesets[data.configurable_offsets.get(key)] = configurable_values[key]
+    configured_offesets = {}
+    for key in data.configurable_offsets.keys():
+        configured_offesets[data.configurable_offsets.get(key)] = configurable_values[key]
 
-        if exe_options.get("game_font") is not None:
-            font_alias = exe_options.get("game_font")
-            hd_ui.scale_fonts(Path(target_exe).parent, data.OS_SCALE_FACTOR, font_alias)
+    if exe_options.get("game_font") is not None:
+        font_alias = exe_options.get("game_font")
+        hd_ui.scale_fonts(Path(target_exe).parent, data.OS_SCALE_FACTOR, font_alias)
 
-        patch_offsets(f, configured_offesets)
+    session.add_offsets(configured_offesets)
 
 
 def patch_render_dll(target_dll: str) -> None:
-    with open(target_dll, 'rb+') as f:
-        for offset in data.offsets_dll.keys():
-            f.seek(offset)
-            if type(data.offsets_dll[offset]) == str:  # hex address
-                f.write(struct.pack('<Q', int(data.offsets_dll[offset], base=16))[:4])
-            elif type(data.offsets_dll[offset]) == float:
-                f.write(struct.pack("f", data.offsets_dll[offset]))
+    '''Hex strings of dll table are 32 bit addresses, the rest are float values'''
+    with ExePatchSession(target_dll) as session:
+        session.add_offsets(data.offsets_dll)
 
 
 def rename_effects_bps(game_root_path: str) -> None: